@@ -1,9 +1,10 @@
 """
 Hint Generator Agent for progressive exercise hints
 """
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from datetime import datetime
 
 from app.ai.chat_service import ChatService
 from app.ai.prompts.system_prompts import get_system_prompt
@@ -15,21 +16,26 @@ class HintAgent:
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.chat_service = ChatService(db)
+        self.chat_service = ChatService(db, agent="hint")
 
-    async def _get_enhanced_system_prompt(self, user_id: str) -> str:
-        """Get system prompt enhanced with user context"""
+    async def _get_enhanced_system_prompt(self, user_id: str) -> Tuple[str, str]:
+        """
+        Get system prompt and user context
+
+        Returns (system_prompt, system_context): the static prompt is cacheable,
+        the user context is sent after it.
+        """
         base_prompt = get_system_prompt("hint")
         user_context = await get_user_context_for_ai(self.db, user_id)
 
-        enhanced_prompt = f"""{base_prompt}
+        system_prompt = f"""{base_prompt}
 
-USER CONTEXT:
-{user_context}
+Tailor your hints to match the user's experience level and learning style given in the USER CONTEXT that follows. If they have specific learning challenges, adjust your language and pacing accordingly."""
 
-Tailor your hints to match the user's experience level and learning style. If they have specific learning challenges, adjust your language and pacing accordingly."""
+        system_context = f"""USER CONTEXT:
+{user_context}"""
 
-        return enhanced_prompt
+        return system_prompt, system_context
 
     async def generate_hint(
         self,
@@ -77,12 +83,13 @@ Tailor your hints to match the user's experience level and learning style. If th
         }
 
         # Get hint from AI with enhanced prompt
-        system_prompt = await self._get_enhanced_system_prompt(user_id)
+        system_prompt, system_context = await self._get_enhanced_system_prompt(user_id)
         response = await self.chat_service.send_message(
             user_id=user_id,
             session_id=session_id,
             message=hint_request,
             system_prompt=system_prompt,
+            system_context=system_context,
             context_data=context_data,
         )
 
@@ -8,16 +8,19 @@ from bson import ObjectId
 
 from app.ai.chat_service import ChatService
 from app.ai.tool_registry import ToolRegistry
-from app.ai.prompts.system_prompts import get_system_prompt, EXERCISE_FEEDBACK_PROMPT
+from app.ai.prompts.system_prompts import get_system_prompt, POST_SUBMISSION_TASK_PROMPT
 from app.api.v1.user_context import get_user_context_for_ai
 
 
+TOOL_USAGE_REMINDER = "Remember: Use your tools to make things happen! Don't just talk about teaching - use `display_learning_content` to actually create content, `generate_exercise` to create practice problems, and `navigate_to_next_step` to move them forward."
+
+
 class LearningOrchestrator:
     """AI agent that orchestrates the dynamic learning experience"""
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.chat_service = ChatService(db)
+        self.chat_service = ChatService(db, agent="orchestrator")
 
     async def start_learning_session(
         self,
@@ -61,8 +64,9 @@ class LearningOrchestrator:
         # Initialize tool registry for this user
         tool_registry = ToolRegistry(self.db, user_id)
 
-        # Build orchestrator system prompt
-        system_prompt = self._build_orchestrator_prompt(node, user_context, progress)
+        # Build orchestrator system prompt (static, cacheable) and session context
+        system_prompt = f"{get_system_prompt('learning_orchestrator')}\n\n{TOOL_USAGE_REMINDER}"
+        system_context = self._build_orchestrator_context(node, user_context, progress)
 
         # Initial message to AI
         if progress and progress.get("status") == "in_progress":
@@ -78,9 +82,11 @@ class LearningOrchestrator:
             session_id=session_id,
             message=initial_message,
             system_prompt=system_prompt,
+            system_context=system_context,
             context_data={"node": node},
             tools=tool_registry.get_tool_definitions(),
-            tool_executor=tool_registry.execute_tool
+            tool_executor=tool_registry.execute_tool,
+            ordered_tools=tool_registry.get_ordered_tools()
         )
 
         return response
@@ -130,7 +136,8 @@ class LearningOrchestrator:
         }
 
         # Build prompt for post-submission analysis
-        system_prompt = await self._build_post_submission_prompt(user_id)
+        system_prompt = f"{get_system_prompt('learning_orchestrator')}\n\n{POST_SUBMISSION_TASK_PROMPT}"
+        system_context = await self._build_post_submission_context(user_id)
 
         # Message to AI
         status = "PASSED ✅" if test_results["passed"] else "NEEDS WORK 📝"
@@ -154,9 +161,11 @@ IMPORTANT: Analyze their submission and provide feedback in chat:
             session_id=session_id,
             message=message,
             system_prompt=system_prompt,
+            system_context=system_context,
             context_data=context_data,
             tools=tool_registry.get_tool_definitions(),
-            tool_executor=tool_registry.execute_tool
+            tool_executor=tool_registry.execute_tool,
+            ordered_tools=tool_registry.get_ordered_tools()
         )
 
         return response
@@ -196,23 +205,21 @@ IMPORTANT: Analyze their submission and provide feedback in chat:
             message=message,
             system_prompt=system_prompt,
             tools=tool_registry.get_tool_definitions(),
-            tool_executor=tool_registry.execute_tool
+            tool_executor=tool_registry.execute_tool,
+            ordered_tools=tool_registry.get_ordered_tools()
         )
 
         return response
 
-    def _build_orchestrator_prompt(
+    def _build_orchestrator_context(
         self,
         node: Dict,
         user_context: str,
         progress: Optional[Dict]
     ) -> str:
-        """Build system prompt for learning orchestrator"""
-
-        base_prompt = get_system_prompt("learning_orchestrator")
+        """Build per-session context for the learning orchestrator"""
 
-        node_info = f"""
-CURRENT LEARNING MODULE:
+        node_info = f"""CURRENT LEARNING MODULE:
 Title: {node['title']}
 Description: {node['description']}
 Difficulty: {node['difficulty']}
@@ -225,21 +232,15 @@ CURRENT PROGRESS:
 Status: {progress.get('status', 'not_started')}
 Completion: {progress.get('completion_percentage', 0)}%"""
 
-        enhanced_prompt = f"""{base_prompt}
-
-{node_info}
+        return f"""{node_info}
 
 {progress_info}
 
 USER CONTEXT:
-{user_context}
+{user_context}"""
 
-Remember: Use your tools to make things happen! Don't just talk about teaching - use `display_learning_content` to actually create content, `generate_exercise` to create practice problems, and `navigate_to_next_step` to move them forward."""
-
-        return enhanced_prompt
-
-    async def _build_post_submission_prompt(self, user_id: str) -> str:
-        """Build prompt for post-exercise submission analysis"""
+    async def _build_post_submission_context(self, user_id: str) -> str:
+        """Build per-user context for post-exercise submission analysis"""
 
         user_context = await get_user_context_for_ai(self.db, user_id)
 
@@ -251,38 +252,6 @@ Remember: Use your tools to make things happen! Don't just talk about teaching -
             if weak_topics:
                 weak_points_info = f"\n\nUSER'S WEAK POINTS (target these in exercises):\n- " + "\n- ".join(weak_topics)
 
-        return f"""{get_system_prompt("learning_orchestrator")}
-
-USER CONTEXT:
+        return f"""USER CONTEXT:
 {user_context}
-{weak_points_info}
-
-CURRENT TASK: Analyze exercise submission and provide feedback
-
-{EXERCISE_FEEDBACK_PROMPT}
-
-Use your tools:
-1. `provide_feedback` - Give specific, constructive feedback
-2. `display_learning_content` - Create next lecture content (when user wants to continue to next lecture)
-3. `navigate_to_next_step` - Navigate user to content/exercise (after creating it)
-4. `generate_exercise` - Create another exercise (when user requests more practice)
-
-INTERACTIVE FLOW:
-1. **Give Feedback First** - Always start with detailed feedback about their submission
-2. **Ask User What They Want** - After feedback, ask them to choose:
-   - "Would you like to continue to the next lecture, or would you prefer another exercise to practice more?"
-3. **Wait for User Response** - DO NOT navigate or create anything until user responds
-4. **Act Based on User Choice**:
-   - If user says "next lecture" or "continue":
-     a. Use `display_learning_content` to create the next lecture content
-     b. Use `navigate_to_next_step` with target_type="content" and the content_id to navigate
-   - If user says "another exercise" or "more practice":
-     a. Use `generate_exercise` to create a new exercise
-     b. Use `navigate_to_next_step` with target_type="exercise" and the exercise_id to navigate
-   - If user wants to retry same exercise → Encourage them to try again (no navigation needed)
-
-CRITICAL RULES:
-- If they PASSED (score >= 70%): Give applause and congratulations! 🎉 Then ask what they want to do next
-- If they FAILED (score < 70%): Give encouragement and specific tips, then ask if they want to retry or need help
-- ALWAYS wait for user's explicit choice before navigating or generating new content
-- Be conversational and supportive in chat"""
+{weak_points_info}"""
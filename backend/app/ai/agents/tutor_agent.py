@@ -1,7 +1,7 @@
 """
 AI Tutor Agent for personalized learning assistance
 """
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.ai.chat_service import ChatService
@@ -14,22 +14,28 @@ class TutorAgent:
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.chat_service = ChatService(db)
+        self.chat_service = ChatService(db, agent="tutor")
 
-    async def _get_enhanced_system_prompt(self, user_id: str, base_prompt_type: str = "tutor") -> str:
-        """Get system prompt enhanced with user context"""
+    async def _get_enhanced_system_prompt(
+        self, user_id: str, base_prompt_type: str = "tutor"
+    ) -> Tuple[str, str]:
+        """
+        Get system prompt and user context
+
+        Returns (system_prompt, system_context): the static prompt is cacheable,
+        the user context is sent after it.
+        """
         base_prompt = get_system_prompt(base_prompt_type)
         user_context = await get_user_context_for_ai(self.db, user_id)
 
-        # Enhance prompt with user context
-        enhanced_prompt = f"""{base_prompt}
+        system_prompt = f"""{base_prompt}
 
-USER CONTEXT:
-{user_context}
+Use the USER CONTEXT that follows to personalize your responses, examples, and teaching approach. Reference their background, goals, and learning preferences when appropriate. If they have mentioned specific challenges (e.g., ADHD), adapt your communication style accordingly."""
 
-Use this context to personalize your responses, examples, and teaching approach. Reference their background, goals, and learning preferences when appropriate. If they have mentioned specific challenges (e.g., ADHD), adapt your communication style accordingly."""
+        system_context = f"""USER CONTEXT:
+{user_context}"""
 
-        return enhanced_prompt
+        return system_prompt, system_context
 
     async def ask_question(
         self,
@@ -55,7 +61,7 @@ Use this context to personalize your responses, examples, and teaching approach.
         )
 
         # Get enhanced system prompt with user context
-        system_prompt = await self._get_enhanced_system_prompt(user_id, "tutor")
+        system_prompt, system_context = await self._get_enhanced_system_prompt(user_id, "tutor")
 
         # Send message and get response
         response = await self.chat_service.send_message(
@@ -63,11 +69,41 @@ Use this context to personalize your responses, examples, and teaching approach.
             session_id=session_id,
             message=question,
             system_prompt=system_prompt,
+            system_context=system_context,
             context_data=context_data,
         )
 
         return response
 
+    async def stream_question(
+        self,
+        user_id: str,
+        question: str,
+        context_type: str = "general",
+        context_id: Optional[str] = None,
+        context_data: Optional[Dict] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming version of ask_question
+
+        Yields the ChatService.stream_message events (text_delta ... done)
+        """
+        session_id = await self.chat_service.get_or_create_session(
+            user_id=user_id, context_type=context_type, context_id=context_id
+        )
+
+        system_prompt, system_context = await self._get_enhanced_system_prompt(user_id, "tutor")
+
+        async for event in self.chat_service.stream_message(
+            user_id=user_id,
+            session_id=session_id,
+            message=question,
+            system_prompt=system_prompt,
+            system_context=system_context,
+            context_data=context_data,
+        ):
+            yield event
+
     async def explain_concept(
         self, user_id: str, concept: str, difficulty_level: str = "beginner"
     ) -> Dict:
@@ -85,13 +121,14 @@ Use this context to personalize your responses, examples, and teaching approach.
             user_id=user_id, context_type="concept", context_id=concept
         )
 
-        system_prompt = await self._get_enhanced_system_prompt(user_id, "tutor")
+        system_prompt, system_context = await self._get_enhanced_system_prompt(user_id, "tutor")
 
         response = await self.chat_service.send_message(
             user_id=user_id,
             session_id=session_id,
             message=prompt,
             system_prompt=system_prompt,
+            system_context=system_context,
         )
 
         return response
@@ -116,13 +153,14 @@ Use this context to personalize your responses, examples, and teaching approach.
             user_id=user_id, context_type="exercise", context_id=exercise_id
         )
 
-        system_prompt = await self._get_enhanced_system_prompt(user_id, "tutor")
+        system_prompt, system_context = await self._get_enhanced_system_prompt(user_id, "tutor")
 
         response = await self.chat_service.send_message(
             user_id=user_id,
             session_id=session_id,
             message=prompt,
             system_prompt=system_prompt,
+            system_context=system_context,
             context_data=context_data,
         )
 
@@ -142,13 +180,14 @@ Use this context to personalize your responses, examples, and teaching approach.
             user_id=user_id, context_type="encouragement"
         )
 
-        system_prompt = await self._get_enhanced_system_prompt(user_id, "tutor")
+        system_prompt, system_context = await self._get_enhanced_system_prompt(user_id, "tutor")
 
         response = await self.chat_service.send_message(
             user_id=user_id,
             session_id=session_id,
             message=prompt,
             system_prompt=system_prompt,
+            system_context=system_context,
         )
 
         return response
@@ -0,0 +1,67 @@
+"""
+Shared Anthropic client with a pooled HTTP connection
+"""
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class AnthropicClient:
+    """Anthropic client manager"""
+
+    client: AsyncAnthropic = None
+
+
+anthropic_client = AnthropicClient()
+
+
+def _create_client() -> AsyncAnthropic:
+    http_client = DefaultAsyncHttpxClient(
+        http2=settings.ANTHROPIC_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.ANTHROPIC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.ANTHROPIC_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            settings.ANTHROPIC_TIMEOUT,
+            connect=settings.ANTHROPIC_CONNECT_TIMEOUT,
+        ),
+    )
+    return AsyncAnthropic(
+        api_key=settings.ANTHROPIC_API_KEY,
+        base_url=settings.ANTHROPIC_BASE_URL or None,
+        http_client=http_client,
+        max_retries=settings.ANTHROPIC_MAX_RETRIES,
+    )
+
+
+async def connect_to_anthropic():
+    """Create the shared Anthropic client"""
+    if anthropic_client.client is None:
+        anthropic_client.client = _create_client()
+    print(
+        f"✅ Anthropic client ready (pool={settings.ANTHROPIC_MAX_CONNECTIONS}, "
+        f"keepalive={settings.ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS}, http2={settings.ANTHROPIC_HTTP2})"
+    )
+
+
+async def close_anthropic_client():
+    """Close the shared Anthropic client and its connection pool"""
+    if anthropic_client.client:
+        await anthropic_client.client.close()
+        anthropic_client.client = None
+        print("✅ Closed Anthropic client")
+
+
+def get_anthropic_client() -> AsyncAnthropic:
+    """
+    Get the shared Anthropic client
+
+    Created on first use outside the app lifespan (scripts, workers).
+    """
+    if anthropic_client.client is None:
+        anthropic_client.client = _create_client()
+    return anthropic_client.client
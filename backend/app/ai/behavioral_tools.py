@@ -6,7 +6,9 @@ engagement metrics, and error patterns for adaptive personalization.
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 from typing import Dict, Optional
-from anthropic import AsyncAnthropic
+from app.ai.anthropic_client import get_anthropic_client
+from app.ai.instrumentation import create_message
+from app.ai.scheduler import Priority
 from app.config import get_settings
 import json
 
@@ -19,7 +21,7 @@ class BehavioralTools:
     def __init__(self, db: AsyncIOMotorDatabase, user_id: str):
         self.db = db
         self.user_id = user_id
-        self.client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.client = get_anthropic_client()
 
     async def record_struggle_indicator(
         self,
@@ -188,7 +190,11 @@ Respond with ONLY valid JSON in this exact format:
   "suggested_intervention": "what to do next (hint, tutorial, simpler exercise, etc.)"
 }}"""
 
-            response = await self.client.messages.create(
+            response = await create_message(
+                self.client,
+                agent="error_analysis",
+                user_id=self.user_id,
+                priority=Priority.BACKGROUND,
                 model="claude-3-haiku-20240307",
                 max_tokens=300,
                 messages=[{"role": "user", "content": prompt}]
@@ -1,14 +1,17 @@
 """
 Chat service for managing AI conversations with Claude
 """
-from typing import List, Dict, Optional, Callable
-from anthropic import AsyncAnthropic
+from typing import AsyncIterator, Collection, List, Dict, Optional, Callable, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
+import asyncio
 import json
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+from app.ai.anthropic_client import get_anthropic_client
+from app.ai.history import HistoryBuilder, count_tokens
+from app.ai.instrumentation import USAGE_FIELDS, create_message, stream_message
 from app.config import get_settings
 
 settings = get_settings()
@@ -17,10 +20,17 @@ settings = get_settings()
 class ChatService:
     """Service for handling AI chat interactions"""
 
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, agent: str = "chat"):
+        """
+        Args:
+            db: Database
+            agent: Name of the calling agent, used to label Claude API call metrics
+        """
         self.db = db
-        self.client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.client = get_anthropic_client()
+        self.history = HistoryBuilder(db)
         self.model = "claude-3-haiku-20240307"
+        self.agent = agent
 
     @retry(
         stop=stop_after_attempt(3),
@@ -94,6 +104,8 @@ class ChatService:
         context_data: Optional[Dict] = None,
         tools: Optional[List[Dict]] = None,
         tool_executor: Optional[Callable] = None,
+        system_context: Optional[str] = None,
+        ordered_tools: Optional[Collection[str]] = None,
     ) -> Dict:
         """
         Send message and get AI response with optional tool calling support
@@ -102,36 +114,22 @@ class ChatService:
             user_id: User ID
             session_id: Chat session ID
             message: User message
-            system_prompt: System prompt for Claude
+            system_prompt: Static system prompt for Claude (cached across calls)
             context_data: Additional context data
             tools: List of tool definitions for Claude to use
             tool_executor: Async function to execute tools: async (tool_name, tool_input) -> str
+            system_context: Per-user/per-request system text (user context, weak
+                points), sent after the cached prefix
+            ordered_tools: Tool names with ordering dependencies; these are not run
+                concurrently with other tool calls of the same turn
 
         Returns:
             Dict with message, session_id, timestamp, and any tool-generated IDs
         """
-        # Save user message
-        user_msg = {
-            "session_id": session_id,
-            "role": "user",
-            "content": message,
-            "created_at": datetime.utcnow(),
-        }
-        await self.db.chat_messages.insert_one(user_msg)
-
-        # Get conversation history
-        history = await self.get_session_history(session_id, limit=20)
-
-        # Build messages for Claude
-        messages = []
-        for msg in history:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-
-        # Add context to system prompt if provided
-        enhanced_system = system_prompt
-        if context_data:
-            context_str = self._format_context(context_data)
-            enhanced_system = f"{system_prompt}\n\n{context_str}"
+        messages, history_summary = await self._prepare_messages(session_id, message)
+        enhanced_system = self._build_system(
+            system_prompt, system_context, context_data, history_summary
+        )
 
         # Track tool results for return
         tool_results = {
@@ -139,6 +137,7 @@ class ChatService:
             "exercise_id": None,
             "actions": [],
         }
+        usage = dict.fromkeys(USAGE_FIELDS, 0)
 
         # Tool calling loop
         max_iterations = 5  # Prevent infinite loops
@@ -149,26 +148,15 @@ class ChatService:
             iteration += 1
 
             # Call Claude API
-            api_params = {
-                "model": self.model,
-                "max_tokens": 4096,
-                "system": enhanced_system,
-                "messages": messages,
-            }
-
-            # Add tools if provided
-            if tools:
-                api_params["tools"] = tools
-
-            response = await self.client.messages.create(**api_params)
+            api_params = self._build_api_params(enhanced_system, messages, tools)
+            response = await create_message(
+                self.client, agent=self.agent, iteration=iteration, user_id=user_id,
+                **api_params
+            )
+            self._accumulate_usage(usage, response.usage)
 
             # Handle different stop reasons
-            if response.stop_reason == "end_turn":
-                # Normal completion - extract final text
-                assistant_content = self._extract_text_content(response.content)
-                break
-
-            elif response.stop_reason == "tool_use" and tool_executor:
+            if response.stop_reason == "tool_use" and tool_executor:
                 # Claude wants to use tools
                 # Add assistant's response (including tool calls) to conversation
                 messages.append({
@@ -178,57 +166,11 @@ class ChatService:
 
                 # Execute tools and collect results
                 tool_use_results = []
-
-                for block in response.content:
-                    if block.type == "tool_use":
-                        # Execute the tool
-                        tool_name = block.name
-                        tool_input = block.input
-
-                        print(f"🔧 AI invoking tool: {tool_name}")
-                        print(f"   Input: {json.dumps(tool_input, indent=2)}")
-
-                        try:
-                            # Use retry wrapper for automatic retry with exponential backoff
-                            result = await self._execute_tool_with_retry(
-                                tool_executor, tool_name, tool_input
-                            )
-                            result_dict = json.loads(result) if isinstance(result, str) else result
-
-                            # Track important IDs from tool execution
-                            if "content_id" in result_dict:
-                                tool_results["content_id"] = result_dict["content_id"]
-                            if "exercise_id" in result_dict:
-                                tool_results["exercise_id"] = result_dict["exercise_id"]
-                            if "navigation" in result_dict:
-                                tool_results["actions"].append({
-                                    "type": "navigate",
-                                    "data": result_dict["navigation"]
-                                })
-
-                            print(f"   ✅ Tool result: {result}")
-
-                            tool_use_results.append({
-                                "type": "tool_result",
-                                "tool_use_id": block.id,
-                                "content": result
-                            })
-                        except Exception as e:
-                            # Surface detailed error to AI so it can respond appropriately
-                            error_detail = {
-                                "error": str(e),
-                                "tool_name": tool_name,
-                                "suggestion": "Tool failed after 3 retry attempts. Please try alternative approach or inform user.",
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                            print(f"   ❌ Tool execution error (after retries): {error_detail}")
-
-                            tool_use_results.append({
-                                "type": "tool_result",
-                                "tool_use_id": block.id,
-                                "content": json.dumps(error_detail),
-                                "is_error": True
-                            })
+                async for _ in self._run_tool_calls(
+                    response.content, tool_executor, tool_results, tool_use_results,
+                    ordered_tools,
+                ):
+                    pass
 
                 # Add tool results to conversation
                 messages.append({
@@ -239,25 +181,339 @@ class ChatService:
                 # Continue loop to get Claude's next response
                 continue
 
-            elif response.stop_reason == "max_tokens":
-                # Hit token limit
-                assistant_content = self._extract_text_content(response.content)
-                assistant_content += "\n\n[Response truncated due to length]"
-                break
-            else:
-                # Unexpected stop reason
-                assistant_content = self._extract_text_content(response.content)
-                break
+            assistant_content = self._final_text(response)
+            break
 
         # If max iterations reached without setting content
         if iteration >= max_iterations and not assistant_content:
             assistant_content = "I've completed the setup for your learning session. Let's begin!"
 
-        # Save assistant response
+        return await self._save_assistant_message(
+            session_id, assistant_content, tool_results, usage
+        )
+
+    async def stream_message(
+        self,
+        user_id: str,
+        session_id: str,
+        message: str,
+        system_prompt: str,
+        context_data: Optional[Dict] = None,
+        tools: Optional[List[Dict]] = None,
+        tool_executor: Optional[Callable] = None,
+        system_context: Optional[str] = None,
+        ordered_tools: Optional[Collection[str]] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of send_message.
+
+        Runs the same tool calling loop, but yields events as they happen
+        instead of returning once the loop is done:
+
+            {"event": "text_delta", "data": {"text": ...}}
+            {"event": "tool_started", "data": {"tool_use_id", "tool_name"}}
+            {"event": "tool_finished", "data": {"tool_use_id", "tool_name", "is_error"}}
+            {"event": "done", "data": <same dict send_message returns>}
+
+        The assistant message is persisted once the stream ends, right before
+        the "done" event.
+        """
+        messages, history_summary = await self._prepare_messages(session_id, message)
+        enhanced_system = self._build_system(
+            system_prompt, system_context, context_data, history_summary
+        )
+
+        tool_results = {
+            "content_id": None,
+            "exercise_id": None,
+            "actions": [],
+        }
+        usage = dict.fromkeys(USAGE_FIELDS, 0)
+
+        max_iterations = 5
+        iteration = 0
+        assistant_content = ""
+
+        while iteration < max_iterations:
+            iteration += 1
+
+            api_params = self._build_api_params(enhanced_system, messages, tools)
+            async with stream_message(
+                self.client, agent=self.agent, iteration=iteration, user_id=user_id,
+                **api_params
+            ) as stream:
+                async for event in stream:
+                    if event.type == "text":
+                        yield {"event": "text_delta", "data": {"text": event.text}}
+                response = await stream.get_final_message()
+            self._accumulate_usage(usage, response.usage)
+
+            if response.stop_reason == "tool_use" and tool_executor:
+                messages.append({
+                    "role": "assistant",
+                    "content": response.content
+                })
+
+                tool_use_results = []
+                async for event in self._run_tool_calls(
+                    response.content, tool_executor, tool_results, tool_use_results,
+                    ordered_tools,
+                ):
+                    yield event
+
+                messages.append({
+                    "role": "user",
+                    "content": tool_use_results
+                })
+                continue
+
+            assistant_content = self._final_text(response)
+            break
+
+        if iteration >= max_iterations and not assistant_content:
+            assistant_content = "I've completed the setup for your learning session. Let's begin!"
+
+        result = await self._save_assistant_message(
+            session_id, assistant_content, tool_results, usage
+        )
+        yield {"event": "done", "data": result}
+
+    async def _prepare_messages(
+        self, session_id: str, message: str
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Save the user message and build the Claude message list from history
+
+        Returns:
+            (messages, history_summary): the newest messages within the token
+            budget, and the rolling summary of everything older
+        """
+        user_msg = {
+            "session_id": session_id,
+            "role": "user",
+            "content": message,
+            "token_count": count_tokens(message),
+            "created_at": datetime.utcnow(),
+        }
+        await self.db.chat_messages.insert_one(user_msg)
+
+        # Get token-budgeted conversation history
+        return await self.history.build(session_id)
+
+    def _build_system(
+        self,
+        system_prompt: str,
+        system_context: Optional[str],
+        context_data: Optional[Dict],
+        history_summary: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Build system blocks for Claude.
+
+        The static prompt comes first and is marked cacheable, so repeated
+        calls (every tool loop iteration, every user) reuse the cached prefix.
+        Per-user context, request context and the summary of older
+        conversation turns go in a second, uncached block.
+        """
+        system = [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"},
+        }]
+
+        dynamic_parts = []
+        if system_context:
+            dynamic_parts.append(system_context)
+        if context_data:
+            dynamic_parts.append(self._format_context(context_data))
+        if history_summary:
+            dynamic_parts.append(
+                f"CONVERSATION SUMMARY (earlier messages in this session):\n{history_summary}"
+            )
+        if dynamic_parts:
+            system.append({"type": "text", "text": "\n\n".join(dynamic_parts)})
+
+        return system
+
+    def _build_api_params(
+        self, system: List[Dict], messages: List[Dict], tools: Optional[List[Dict]]
+    ) -> Dict:
+        """Build the keyword arguments for a Messages API call"""
+        api_params = {
+            "model": self.model,
+            "max_tokens": 4096,
+            "system": system,
+            "messages": messages,
+        }
+
+        # Add tools if provided. Tools are rendered before the system prompt,
+        # so a breakpoint on the last tool caches all tool schemas.
+        if tools:
+            api_params["tools"] = [
+                *tools[:-1],
+                {**tools[-1], "cache_control": {"type": "ephemeral"}},
+            ]
+
+        return api_params
+
+    def _accumulate_usage(self, totals: Dict, response_usage) -> None:
+        """Add token counts (including prompt cache reads/writes) from a response"""
+        for field in USAGE_FIELDS:
+            totals[field] += getattr(response_usage, field, 0) or 0
+
+    def _final_text(self, response) -> str:
+        """Extract the final assistant text for a non tool_use stop reason"""
+        assistant_content = self._extract_text_content(response.content)
+        if response.stop_reason == "max_tokens":
+            # Hit token limit
+            assistant_content += "\n\n[Response truncated due to length]"
+        return assistant_content
+
+    async def _run_tool_calls(
+        self,
+        content_blocks,
+        tool_executor: Callable,
+        tool_results: Dict,
+        tool_use_results: List[Dict],
+        ordered_tools: Optional[Collection[str]] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Execute every tool_use block of an assistant turn.
+
+        Independent tool calls run concurrently. A tool listed in ordered_tools
+        acts as a barrier: it starts after all earlier calls have finished and
+        later calls wait for it. Results are appended to tool_use_results in
+        the order of the tool_use blocks, regardless of completion order.
+
+        Records content/exercise IDs and navigation actions in tool_results,
+        and yields tool_started/tool_finished events for streaming callers.
+        """
+        tool_blocks = [block for block in content_blocks if block.type == "tool_use"]
+        ordered_tools = ordered_tools or ()
+        events: asyncio.Queue = asyncio.Queue()
+        outcomes: Dict[str, tuple] = {}
+
+        async def run_one(block):
+            events.put_nowait({
+                "event": "tool_started",
+                "data": {"tool_use_id": block.id, "tool_name": block.name},
+            })
+            outcomes[block.id] = await self._execute_tool_block(block, tool_executor)
+            events.put_nowait({
+                "event": "tool_finished",
+                "data": {
+                    "tool_use_id": block.id,
+                    "tool_name": block.name,
+                    "is_error": outcomes[block.id][1],
+                },
+            })
+
+        async def run_all():
+            batch = []
+            for block in tool_blocks:
+                if block.name in ordered_tools:
+                    if batch:
+                        await asyncio.gather(*(run_one(b) for b in batch))
+                        batch = []
+                    await run_one(block)
+                else:
+                    batch.append(block)
+            if batch:
+                await asyncio.gather(*(run_one(b) for b in batch))
+
+        runner = asyncio.create_task(run_all())
+        try:
+            # Forward events while tools are running
+            while True:
+                getter = asyncio.create_task(events.get())
+                await asyncio.wait({getter, runner}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                break
+            while not events.empty():
+                yield events.get_nowait()
+            await runner
+        finally:
+            if not runner.done():
+                runner.cancel()
+
+        # Collect results in tool_use order
+        for block in tool_blocks:
+            content, is_error, result_dict = outcomes[block.id]
+
+            if result_dict:
+                # Track important IDs from tool execution
+                if "content_id" in result_dict:
+                    tool_results["content_id"] = result_dict["content_id"]
+                if "exercise_id" in result_dict:
+                    tool_results["exercise_id"] = result_dict["exercise_id"]
+                if "navigation" in result_dict:
+                    tool_results["actions"].append({
+                        "type": "navigate",
+                        "data": result_dict["navigation"]
+                    })
+
+            tool_result = {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": content
+            }
+            if is_error:
+                tool_result["is_error"] = True
+            tool_use_results.append(tool_result)
+
+    async def _execute_tool_block(self, block, tool_executor: Callable) -> tuple:
+        """
+        Execute a single tool_use block
+
+        Returns:
+            (content, is_error, result_dict) where content is the tool_result
+            content sent back to Claude
+        """
+        tool_name = block.name
+        tool_input = block.input
+
+        print(f"🔧 AI invoking tool: {tool_name}")
+        print(f"   Input: {json.dumps(tool_input, indent=2)}")
+
+        try:
+            # Use retry wrapper for automatic retry with exponential backoff
+            result = await self._execute_tool_with_retry(
+                tool_executor, tool_name, tool_input
+            )
+            result_dict = json.loads(result) if isinstance(result, str) else result
+
+            print(f"   ✅ Tool result: {result}")
+            return result, False, result_dict
+        except Exception as e:
+            # Surface detailed error to AI so it can respond appropriately
+            error_detail = {
+                "error": str(e),
+                "tool_name": tool_name,
+                "suggestion": "Tool failed after 3 retry attempts. Please try alternative approach or inform user.",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            print(f"   ❌ Tool execution error (after retries): {error_detail}")
+            return json.dumps(error_detail), True, None
+
+    async def _save_assistant_message(
+        self, session_id: str, assistant_content: str, tool_results: Dict, usage: Dict
+    ) -> Dict:
+        """Persist the assistant response and build the response payload"""
+        print(
+            f"💾 Prompt cache: read={usage['cache_read_input_tokens']} "
+            f"written={usage['cache_creation_input_tokens']} "
+            f"uncached_input={usage['input_tokens']} output={usage['output_tokens']}"
+        )
+
         assistant_msg = {
             "session_id": session_id,
             "role": "assistant",
             "content": assistant_content,
+            "token_count": count_tokens(assistant_content),
+            "usage": usage,
             "created_at": datetime.utcnow(),
         }
         await self.db.chat_messages.insert_one(assistant_msg)
@@ -267,10 +523,15 @@ class ChatService:
             {"_id": ObjectId(session_id)}, {"$set": {"updated_at": datetime.utcnow()}}
         )
 
+        # Fold messages that no longer fit the token budget into the session
+        # summary, off the request path
+        self.history.schedule_refresh(session_id)
+
         return {
             "message": assistant_content,
             "session_id": session_id,
             "timestamp": datetime.utcnow().isoformat(),
+            "usage": usage,
             **tool_results  # Include content_id, exercise_id, actions
         }
 
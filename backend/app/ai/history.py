@@ -0,0 +1,223 @@
+"""
+Token-budgeted conversation history for chat sessions
+
+The newest messages are sent verbatim up to CHAT_HISTORY_TOKEN_BUDGET. Older
+messages are folded into a rolling summary stored on the chat_sessions
+document (history_summary, summarized_until), which is refreshed in the
+background after a response has been saved, and never on the request path.
+If the refresh has fallen behind, the oldest unsummarized messages are left
+out of that request only; they stay stored and are folded by the next
+refresh.
+"""
+from typing import Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from datetime import datetime
+import asyncio
+
+from app.ai.anthropic_client import get_anthropic_client
+from app.ai.instrumentation import create_message
+from app.ai.scheduler import Priority
+from app.config import get_settings
+
+settings = get_settings()
+
+# Per-message overhead (role, separators) on top of the content tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Messages per summarization call when folding a long backlog
+SUMMARY_BATCH_MESSAGES = 50
+
+_encoding = None
+_encoding_failed = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens locally with tiktoken
+
+    cl100k_base is not Claude's tokenizer, but it is close enough for
+    budgeting. Falls back to ~4 characters per token if the encoding
+    cannot be loaded.
+    """
+    global _encoding, _encoding_failed
+
+    if not text:
+        return 0
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable, estimating tokens: {e}")
+            _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def message_tokens(msg: Dict) -> int:
+    """Token count of a stored chat message (cached on the document when available)"""
+    tokens = msg.get("token_count")
+    if tokens is None:
+        tokens = count_tokens(msg.get("content", ""))
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+def _select_window(messages: List[Dict], budget: int) -> int:
+    """
+    Pick the newest messages that fit in the budget
+
+    Args:
+        messages: Messages in chronological order
+
+    Returns:
+        Index of the first message kept verbatim. The newest message is always
+        kept, and the window starts with a user message as Claude requires.
+    """
+    used = 0
+    start = len(messages)
+    while start > 0:
+        tokens = message_tokens(messages[start - 1])
+        if start < len(messages) and used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+
+    while start < len(messages) - 1 and messages[start]["role"] != "user":
+        start += 1
+    return start
+
+
+class HistoryBuilder:
+    """Builds the message list for Claude within a token budget"""
+
+    # Summary refreshes in flight, by session (per process)
+    _refreshing: Dict[str, asyncio.Task] = {}
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.budget = settings.CHAT_HISTORY_TOKEN_BUDGET
+
+    async def _load_unsummarized(self, session_id: str) -> Tuple[Optional[Dict], List[Dict]]:
+        """Load the session and all its messages newer than the summary, oldest first"""
+        session = await self.db.chat_sessions.find_one({"_id": ObjectId(session_id)})
+
+        query = {"session_id": session_id}
+        if session and session.get("summarized_until"):
+            query["created_at"] = {"$gt": session["summarized_until"]}
+
+        messages = await self.db.chat_messages.find(query).sort("created_at", 1).to_list(length=None)
+        return session, messages
+
+    async def build(self, session_id: str) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Build history for a Claude request: the stored summary and the newest
+        messages that fit the budget
+
+        Never waits for a summary refresh or calls the model. Unsummarized
+        messages that do not fit are left out and a refresh is scheduled to
+        fold them.
+
+        Returns:
+            (messages, summary) where messages are {role, content} dicts and
+            summary covers everything up to summarized_until
+        """
+        session, messages = await self._load_unsummarized(session_id)
+        summary = session.get("history_summary") if session else None
+
+        start = _select_window(messages, self.budget - count_tokens(summary or ""))
+        if start > 0 and session is not None:
+            print(f"⚠️ History summary behind for session {session_id}, leaving out {start} older messages")
+            self.schedule_refresh(session_id)
+
+        return (
+            [{"role": msg["role"], "content": msg["content"]} for msg in messages[start:]],
+            summary,
+        )
+
+    def schedule_refresh(self, session_id: str) -> Optional[asyncio.Task]:
+        """Refresh the rolling summary in the background (at most one per session)"""
+        if session_id in self._refreshing:
+            return None
+
+        task = asyncio.create_task(self._refresh_summary(session_id))
+        self._refreshing[session_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(session_id, None))
+        return task
+
+    async def _refresh_summary(self, session_id: str):
+        """
+        Fold older messages into the summary ahead of the next request
+
+        Folds down to a window with CHAT_HISTORY_REFRESH_HEADROOM of the budget
+        left free, so the next few messages fit without build() leaving any out.
+        """
+        try:
+            session, messages = await self._load_unsummarized(session_id)
+            if not session:
+                return
+
+            summary = session.get("history_summary")
+            budget = int(self.budget * (1 - settings.CHAT_HISTORY_REFRESH_HEADROOM))
+            start = _select_window(messages, budget - count_tokens(summary or ""))
+            if start == 0:
+                return
+
+            await self._fold(session, summary, messages[:start])
+            print(f"🗜️ Summarized {start} older messages for session {session_id}")
+
+        except Exception as e:
+            print(f"⚠️ History summary refresh failed for session {session_id}: {e}")
+
+    async def _fold(self, session: Dict, summary: Optional[str], folded: List[Dict]) -> str:
+        """
+        Fold messages (oldest first) into the session summary and save it
+
+        Long backlogs are summarized SUMMARY_BATCH_MESSAGES at a time. The
+        save only applies if no other refresh moved summarized_until meanwhile.
+
+        Returns:
+            The new summary
+        """
+        for i in range(0, len(folded), SUMMARY_BATCH_MESSAGES):
+            summary = await self._summarize(summary, folded[i:i + SUMMARY_BATCH_MESSAGES])
+
+        await self.db.chat_sessions.update_one(
+            {"_id": session["_id"], "summarized_until": session.get("summarized_until")},
+            {
+                "$set": {
+                    "history_summary": summary,
+                    "summarized_until": folded[-1]["created_at"],
+                    "summary_updated_at": datetime.utcnow(),
+                }
+            }
+        )
+        return summary
+
+    async def _summarize(self, previous_summary: Optional[str], messages: List[Dict]) -> str:
+        """Incrementally update the summary with Claude Haiku"""
+        transcript = "\n\n".join(
+            f"{msg['role'].upper()}: {msg['content'][:settings.CHAT_HISTORY_SUMMARY_MESSAGE_CHARS]}"
+            for msg in messages
+        )
+
+        prompt = f"""You maintain a running summary of a tutoring conversation between a student and an AI programming tutor.
+
+Current summary:
+{previous_summary or "(none yet)"}
+
+New messages to fold into the summary:
+{transcript}
+
+Write the updated summary in under 300 words. Keep: topics covered, exercises attempted and their outcomes, the student's misconceptions and struggles, preferences they stated, and any open questions or promised next steps. Drop code listings unless a specific line matters. Respond with the summary text only."""
+
+        response = await create_message(
+            get_anthropic_client(),
+            agent="history_summary",
+            priority=Priority.BACKGROUND,
+            model="claude-3-haiku-20240307",
+            max_tokens=600,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text.strip()
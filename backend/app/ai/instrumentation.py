@@ -0,0 +1,234 @@
+"""
+Instrumentation for Claude API calls
+
+Every Messages API call goes through create_message() or stream_message(),
+which wait for a slot in the model call scheduler and record per call:
+calling agent, model, queue time, wall time, stop_reason, token usage
+(including prompt cache reads/writes) and the tool loop iteration.
+
+Calls are exported as histograms on /metrics and collected per HTTP request
+(see track_request_calls), so the API can return an aggregated summary in
+the response headers.
+"""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional
+import time
+
+from anthropic import AsyncAnthropic
+
+from app.ai.scheduler import Priority, model_scheduler
+from app.utils.metrics import metrics
+
+# Token counters reported in Messages API usage. input_tokens only counts the
+# uncached part of the prompt; cache reads/writes are reported separately.
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+LLM_CALL_SECONDS = metrics.histogram(
+    "llm_call_duration_seconds",
+    "Wall time of Claude API calls",
+    ("agent", "model"),
+)
+LLM_CALL_TOKENS = metrics.histogram(
+    "llm_call_tokens",
+    "Tokens per Claude API call by usage type",
+    ("agent", "model", "type"),
+    buckets=TOKEN_BUCKETS,
+)
+LLM_CALL_ITERATION = metrics.histogram(
+    "llm_call_tool_iteration",
+    "Tool loop iteration a Claude API call was made in (1 = first call)",
+    ("agent",),
+    buckets=(1, 2, 3, 4, 5),
+)
+LLM_CALLS = metrics.counter(
+    "llm_calls_total",
+    "Claude API calls by stop reason",
+    ("agent", "model", "stop_reason"),
+)
+LLM_CALL_ERRORS = metrics.counter(
+    "llm_call_errors_total",
+    "Failed Claude API calls by exception type",
+    ("agent", "model", "error"),
+)
+
+# Calls made while handling the current HTTP request (None outside requests)
+_request_calls: ContextVar[Optional[List[Dict]]] = ContextVar("llm_request_calls", default=None)
+
+
+def track_request_calls() -> List[Dict]:
+    """
+    Start collecting calls for the current request
+
+    The returned list is shared with every task spawned from this context, so
+    calls made by the endpoint are visible to the middleware that created it.
+    """
+    calls: List[Dict] = []
+    _request_calls.set(calls)
+    return calls
+
+
+def record_call(
+    agent: str,
+    model: str,
+    duration: float,
+    response=None,
+    iteration: int = 1,
+    error: Optional[BaseException] = None,
+    queued: float = 0.0,
+) -> Dict:
+    """
+    Record one Claude API call in the metrics and the current request
+
+    Args:
+        agent: Calling agent (chat, tutor, orchestrator, grading...)
+        model: Model name sent to the API
+        duration: Wall time in seconds, excluding the scheduler queue
+        response: Message returned by the API (None on error)
+        iteration: Tool loop iteration, 1 for single-shot calls
+        error: Exception raised by the call, if any
+        queued: Seconds the call waited for a scheduler slot
+
+    Returns:
+        The recorded call
+    """
+    usage = getattr(response, "usage", None)
+    call = {
+        "agent": agent,
+        "model": model,
+        "duration": duration,
+        "queued": queued,
+        "iteration": iteration,
+        "stop_reason": getattr(response, "stop_reason", None) or ("error" if error else "unknown"),
+        **{field: getattr(usage, field, 0) or 0 for field in USAGE_FIELDS},
+    }
+
+    LLM_CALL_SECONDS.observe(duration, agent=agent, model=model)
+    LLM_CALL_ITERATION.observe(iteration, agent=agent)
+    if error is not None:
+        LLM_CALL_ERRORS.inc(agent=agent, model=model, error=type(error).__name__)
+    else:
+        LLM_CALLS.inc(agent=agent, model=model, stop_reason=call["stop_reason"])
+        for field in USAGE_FIELDS:
+            LLM_CALL_TOKENS.observe(call[field], agent=agent, model=model, type=field)
+
+    calls = _request_calls.get()
+    if calls is not None:
+        calls.append(call)
+
+    print(
+        f"⏱️ LLM {agent} ({model}) iteration={iteration} {duration:.2f}s queued={queued:.2f}s "
+        f"stop={call['stop_reason']} in={call['input_tokens']} out={call['output_tokens']} "
+        f"cache_read={call['cache_read_input_tokens']} cache_write={call['cache_creation_input_tokens']}"
+    )
+    return call
+
+
+async def create_message(
+    client: AsyncAnthropic,
+    *,
+    agent: str,
+    iteration: int = 1,
+    user_id: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE,
+    **params
+):
+    """
+    Scheduled and instrumented client.messages.create
+
+    Args:
+        client: Anthropic client
+        agent: Calling agent name
+        iteration: Tool loop iteration
+        user_id: User the call is made for (per-user fairness and cap)
+        priority: Scheduling class
+        **params: Messages API parameters
+
+    Returns:
+        The API response
+    """
+    model = params.get("model", "unknown")
+    async with model_scheduler.slot(user_id, priority) as queued:
+        started = time.perf_counter()
+        try:
+            response = await client.messages.create(**params)
+        except Exception as e:
+            record_call(
+                agent, model, time.perf_counter() - started,
+                iteration=iteration, error=e, queued=queued,
+            )
+            raise
+
+    record_call(agent, model, time.perf_counter() - started, response, iteration, queued=queued)
+    return response
+
+
+@asynccontextmanager
+async def stream_message(
+    client: AsyncAnthropic,
+    *,
+    agent: str,
+    iteration: int = 1,
+    user_id: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE,
+    **params
+) -> AsyncIterator:
+    """
+    Scheduled and instrumented client.messages.stream
+
+    Used like the SDK context manager. The scheduler slot is held until the
+    block exits, and the call is recorded with the wall time of the whole
+    stream.
+    """
+    model = params.get("model", "unknown")
+    async with model_scheduler.slot(user_id, priority) as queued:
+        started = time.perf_counter()
+        try:
+            async with client.messages.stream(**params) as stream:
+                yield stream
+                response = await stream.get_final_message()
+        except Exception as e:
+            record_call(
+                agent, model, time.perf_counter() - started,
+                iteration=iteration, error=e, queued=queued,
+            )
+            raise
+
+    record_call(agent, model, time.perf_counter() - started, response, iteration, queued=queued)
+
+
+def summarize_calls(calls: List[Dict]) -> Dict[str, str]:
+    """
+    Aggregate a request's calls into response headers
+
+    Returns:
+        X-LLM-Summary (counts, time, tokens, calls per agent) and a
+        Server-Timing entry so browser dev tools show the LLM time
+    """
+    if not calls:
+        return {}
+
+    total_ms = sum(call["duration"] for call in calls) * 1000
+    agents: Dict[str, int] = {}
+    for call in calls:
+        agents[call["agent"]] = agents.get(call["agent"], 0) + 1
+
+    summary = [
+        f"calls={len(calls)}",
+        f"time_ms={total_ms:.0f}",
+        f"queue_ms={sum(call['queued'] for call in calls) * 1000:.0f}",
+        f"max_iteration={max(call['iteration'] for call in calls)}",
+        *(f"{field}={sum(call[field] for call in calls)}" for field in USAGE_FIELDS),
+        "agents=" + ",".join(f"{agent}:{count}" for agent, count in agents.items()),
+    ]
+    return {
+        "X-LLM-Summary": "; ".join(summary),
+        "Server-Timing": f'llm;dur={total_ms:.1f};desc="{len(calls)} Claude calls"',
+    }
@@ -0,0 +1,223 @@
+"""
+Local intent router for chat messages
+Decides TOOLS (LearningOrchestrator) vs EXPLANATION (TutorAgent) without an LLM call
+
+Routing order:
+1. Context types that always need tools
+2. Keyword/regex rules for unambiguous messages
+3. Linear model over hashed word/character n-grams (numpy), if a trained
+   model file exists and it is confident enough
+4. Otherwise the caller falls back to the Claude Haiku classifier
+"""
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import zlib
+
+import numpy as np
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Contexts that always use the orchestrator
+TOOL_CONTEXTS = {"planning", "learning_session", "onboarding"}
+
+# Messages asking the AI to create, show or run something
+TOOL_RULES = [
+    re.compile(r"\b(create|generate|make|give|build|write|set up|design)\b.{0,40}\b(exercises?|quiz(zes)?|challenges?|practice|problems?|lessons?|notes|tutorials?|plan|path|nodes?)\b"),
+    re.compile(r"\b(quiz|test) me\b"),
+    re.compile(r"\b(run|execute|demo|demonstrate)\b.{0,30}\b(code|this|it|snippet|script|example)\b"),
+    re.compile(r"\bshow me\b.{0,30}\b(example|demo|how it runs|output)\b"),
+    re.compile(r"\b(next|another|new|more)\b.{0,15}\b(exercise|lesson|lecture|challenge|step|practice|problem)\b"),
+    re.compile(r"\b(let'?s|i want to|can we) (practice|continue|start)\b"),
+]
+
+# Conceptual questions and debugging help
+EXPLANATION_RULES = [
+    re.compile(r"^(what|why|how|when|where|which|who|is|are|does|do|should)\b.{0,200}\?$"),
+    re.compile(r"^(explain|describe|define|clarify)\b"),
+    re.compile(r"\b(difference between|what does .{1,40} mean|meaning of)\b"),
+    re.compile(r"\b(traceback|exception|error|doesn'?t work|not working|bug)\b"),
+    re.compile(r"^(thanks|thank you|ok|okay|got it|cool|great)\b"),
+]
+
+
+@dataclass
+class RoutingDecision:
+    """Result of local routing"""
+    requires_tools: bool
+    confidence: float
+    source: str  # context, rule, model
+
+
+class HashedNgramFeaturizer:
+    """Hash word uni/bigrams and character n-grams into a fixed-size space"""
+
+    def __init__(self, n_features: int = 2 ** 18, char_ngrams: Tuple[int, int] = (3, 5)):
+        self.n_features = n_features
+        self.char_ngrams = char_ngrams
+
+    def _tokens(self, text: str) -> Iterable[str]:
+        text = text.lower().strip()
+        words = re.findall(r"[a-z0-9_']+", text)
+
+        for word in words:
+            yield f"w:{word}"
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}"
+
+        padded = f" {' '.join(words)} "
+        low, high = self.char_ngrams
+        for n in range(low, high + 1):
+            for i in range(len(padded) - n + 1):
+                yield f"c:{padded[i:i + n]}"
+
+    def transform(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Featurize one message
+
+        Returns:
+            (indices, values) of the non-zero features, L2 normalized with
+            sublinear term frequency
+        """
+        counts = Counter(
+            zlib.crc32(token.encode("utf-8")) % self.n_features
+            for token in self._tokens(text)
+        )
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        values /= np.linalg.norm(values)
+        return indices, values
+
+
+class LinearIntentModel:
+    """Logistic regression over hashed n-gram features"""
+
+    def __init__(self, n_features: int = 2 ** 18, weights: Optional[np.ndarray] = None, bias: float = 0.0):
+        self.featurizer = HashedNgramFeaturizer(n_features)
+        self.weights = weights if weights is not None else np.zeros(n_features, dtype=np.float32)
+        self.bias = bias
+
+    def predict_proba(self, text: str) -> float:
+        """Probability that the message requires tools"""
+        indices, values = self.featurizer.transform(text)
+        score = float(self.weights[indices] @ values) + self.bias
+        return 1.0 / (1.0 + np.exp(-score))
+
+    def fit(
+        self,
+        texts: List[str],
+        labels: List[bool],
+        epochs: int = 10,
+        learning_rate: float = 0.5,
+        l2: float = 1e-6,
+        seed: int = 0,
+    ) -> "LinearIntentModel":
+        """Train with AdaGrad SGD on logistic loss"""
+        rows = [self.featurizer.transform(text) for text in texts]
+        targets = np.asarray(labels, dtype=np.float32)
+        grad_sq = np.full(self.weights.shape, 1e-8, dtype=np.float32)
+        bias_grad_sq = 1e-8
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            for i in rng.permutation(len(rows)):
+                indices, values = rows[i]
+                score = float(self.weights[indices] @ values) + self.bias
+                error = 1.0 / (1.0 + np.exp(-score)) - targets[i]
+
+                grad = error * values + l2 * self.weights[indices]
+                grad_sq[indices] += grad * grad
+                self.weights[indices] -= learning_rate * grad / np.sqrt(grad_sq[indices])
+
+                bias_grad_sq += error * error
+                self.bias -= learning_rate * error / np.sqrt(bias_grad_sq)
+
+        return self
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=np.float32(self.bias),
+            n_features=np.int64(self.featurizer.n_features),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearIntentModel":
+        data = np.load(path)
+        return cls(
+            n_features=int(data["n_features"]),
+            weights=data["weights"].astype(np.float32),
+            bias=float(data["bias"]),
+        )
+
+
+class IntentRouter:
+    """Routes chat messages locally, leaving only ambiguous ones to the LLM"""
+
+    def __init__(self, model: Optional[LinearIntentModel] = None, threshold: float = 0.8):
+        self.model = model
+        self.threshold = threshold
+        self.stats = Counter()
+
+    def route(self, message: str, context_type: str) -> Optional[RoutingDecision]:
+        """
+        Route a message locally
+
+        Returns:
+            RoutingDecision, or None if the caller should ask the LLM
+        """
+        if context_type in TOOL_CONTEXTS:
+            self.stats["context"] += 1
+            return RoutingDecision(True, 1.0, "context")
+
+        text = message.lower().strip()
+        wants_tools = any(rule.search(text) for rule in TOOL_RULES)
+        wants_explanation = any(rule.search(text) for rule in EXPLANATION_RULES)
+        if wants_tools != wants_explanation:
+            self.stats["rule"] += 1
+            return RoutingDecision(wants_tools, 1.0, "rule")
+
+        if self.model is not None:
+            probability = self.model.predict_proba(message)
+            confidence = max(probability, 1.0 - probability)
+            if confidence >= self.threshold:
+                self.stats["model"] += 1
+                return RoutingDecision(probability >= 0.5, confidence, "model")
+
+        self.stats["llm_fallback"] += 1
+        return None
+
+    def get_stats(self) -> Dict:
+        """Routing counts by source and the LLM fallback rate"""
+        total = sum(self.stats.values())
+        return {
+            "total": total,
+            "by_source": dict(self.stats),
+            "llm_fallback_rate": self.stats["llm_fallback"] / total if total else 0.0,
+            "model_loaded": self.model is not None,
+        }
+
+
+def _load_router() -> IntentRouter:
+    model = None
+    path = settings.INTENT_ROUTER_MODEL_PATH
+    if path and os.path.exists(path):
+        try:
+            model = LinearIntentModel.load(path)
+            print(f"✅ Loaded intent router model: {path}")
+        except Exception as e:
+            print(f"⚠️ Failed to load intent router model {path}: {e}")
+    return IntentRouter(model=model, threshold=settings.INTENT_ROUTER_CONFIDENCE)
+
+
+# Singleton instance
+intent_router = _load_router()
@@ -129,6 +129,36 @@ Would you like me to:
 3. See a similar example?"
 """
 
+POST_SUBMISSION_TASK_PROMPT = f"""CURRENT TASK: Analyze exercise submission and provide feedback
+
+{EXERCISE_FEEDBACK_PROMPT}
+
+Use your tools:
+1. `provide_feedback` - Give specific, constructive feedback
+2. `display_learning_content` - Create next lecture content (when user wants to continue to next lecture)
+3. `navigate_to_next_step` - Navigate user to content/exercise (after creating it)
+4. `generate_exercise` - Create another exercise (when user requests more practice)
+
+INTERACTIVE FLOW:
+1. **Give Feedback First** - Always start with detailed feedback about their submission
+2. **Ask User What They Want** - After feedback, ask them to choose:
+   - "Would you like to continue to the next lecture, or would you prefer another exercise to practice more?"
+3. **Wait for User Response** - DO NOT navigate or create anything until user responds
+4. **Act Based on User Choice**:
+   - If user says "next lecture" or "continue":
+     a. Use `display_learning_content` to create the next lecture content
+     b. Use `navigate_to_next_step` with target_type="content" and the content_id to navigate
+   - If user says "another exercise" or "more practice":
+     a. Use `generate_exercise` to create a new exercise
+     b. Use `navigate_to_next_step` with target_type="exercise" and the exercise_id to navigate
+   - If user wants to retry same exercise → Encourage them to try again (no navigation needed)
+
+CRITICAL RULES:
+- If they PASSED (score >= 70%): Give applause and congratulations! 🎉 Then ask what they want to do next
+- If they FAILED (score < 70%): Give encouragement and specific tips, then ask if they want to retry or need help
+- ALWAYS wait for user's explicit choice before navigating or generating new content
+- Be conversational and supportive in chat"""
+
 PROGRESS_ANALYZER_PROMPT = """You are an adaptive learning assistant analyzing student progress.
 
 Your task is to identify patterns in student performance and provide personalized recommendations.
@@ -0,0 +1,233 @@
+"""
+Scheduler for outbound Claude API calls
+
+Every model call waits here for a slot before it is sent, so classroom load
+spikes queue up locally instead of hitting Anthropic all at once:
+
+- Global concurrency cap (MODEL_MAX_CONCURRENCY calls in flight)
+- Global rate limit, a token bucket of RATE_LIMIT_PER_MINUTE calls per minute
+- Per-user cap of CHAT_MESSAGE_LIMIT calls in flight
+- Priority classes: interactive calls (chat, hints, routing) are always
+  dispatched before background ones (grading, error analysis, summaries)
+- Within a priority class, users are served round-robin, so one user with
+  many queued calls cannot starve the others
+
+Limits are per process; with several uvicorn workers each worker gets its
+own share.
+"""
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Deque, Dict, Optional
+import asyncio
+import time
+
+from app.config import get_settings
+from app.utils.metrics import metrics
+
+settings = get_settings()
+
+QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+SCHEDULER_QUEUE_SECONDS = metrics.histogram(
+    "llm_scheduler_queue_seconds",
+    "Time Claude API calls waited for a scheduler slot",
+    ("priority",),
+    buckets=QUEUE_BUCKETS,
+)
+SCHEDULER_QUEUED = metrics.gauge(
+    "llm_scheduler_queued",
+    "Claude API calls waiting for a scheduler slot",
+    ("priority",),
+)
+SCHEDULER_IN_FLIGHT = metrics.gauge(
+    "llm_scheduler_in_flight",
+    "Claude API calls currently holding a scheduler slot",
+)
+
+
+class Priority(IntEnum):
+    """Scheduling class of a model call (lower value is served first)"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class ModelCallScheduler:
+    """Fair, rate-limited admission of model calls"""
+
+    def __init__(self, max_concurrency: int, calls_per_minute: int, per_user_limit: int):
+        """
+        Args:
+            max_concurrency: Calls in flight across all users
+            calls_per_minute: Calls started per minute (0 disables the rate limit)
+            per_user_limit: Calls in flight per user (0 disables the per-user cap)
+        """
+        self.max_concurrency = max_concurrency
+        self.calls_per_minute = calls_per_minute
+        self.per_user_limit = per_user_limit
+
+        # priority -> user -> waiting futures, users in round-robin order
+        self._queues: Dict[Priority, "OrderedDict[Optional[str], Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+
+        self._tokens = float(calls_per_minute)
+        self._refilled_at = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def slot(
+        self, user_id: Optional[str] = None, priority: Priority = Priority.INTERACTIVE
+    ) -> AsyncIterator[float]:
+        """
+        Hold a slot for one model call
+
+        Args:
+            user_id: User the call is made for (None for system work, which is
+                not subject to the per-user cap)
+            priority: Scheduling class
+
+        Yields:
+            Seconds spent waiting in the queue
+        """
+        queued = await self._acquire(user_id, priority)
+        try:
+            yield queued
+        finally:
+            self._release(user_id)
+
+    def get_stats(self) -> Dict:
+        """Current queue depths and slot usage"""
+        self._refill()
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": {
+                priority.name.lower(): sum(len(waiters) for waiters in queue.values())
+                for priority, queue in self._queues.items()
+            },
+            "rate_tokens": round(self._tokens, 2) if self.calls_per_minute > 0 else None,
+            "users_in_flight": len(self._user_in_flight),
+        }
+
+    async def _acquire(self, user_id: Optional[str], priority: Priority) -> float:
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(waiter)
+        SCHEDULER_QUEUED.inc(priority=priority.name.lower())
+        self._dispatch()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller was cancelled: hand the slot back
+                self._release(user_id)
+            else:
+                self._discard(priority, user_id, waiter)
+                SCHEDULER_QUEUED.dec(priority=priority.name.lower())
+            raise
+
+        queued = time.monotonic() - started
+        SCHEDULER_QUEUE_SECONDS.observe(queued, priority=priority.name.lower())
+        return queued
+
+    def _release(self, user_id: Optional[str]):
+        self._in_flight -= 1
+        SCHEDULER_IN_FLIGHT.dec()
+        if user_id is not None:
+            remaining = self._user_in_flight.get(user_id, 1) - 1
+            if remaining > 0:
+                self._user_in_flight[user_id] = remaining
+            else:
+                self._user_in_flight.pop(user_id, None)
+        self._dispatch()
+
+    def _discard(self, priority: Priority, user_id: Optional[str], waiter: asyncio.Future):
+        queue = self._queues[priority]
+        waiters = queue.get(user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del queue[user_id]
+
+    def _refill(self):
+        if self.calls_per_minute <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.calls_per_minute),
+            self._tokens + (now - self._refilled_at) * self.calls_per_minute / 60.0,
+        )
+        self._refilled_at = now
+
+    def _user_has_capacity(self, user_id: Optional[str]) -> bool:
+        if user_id is None or self.per_user_limit <= 0:
+            return True
+        return self._user_in_flight.get(user_id, 0) < self.per_user_limit
+
+    def _next_user(self, queue) -> Optional[str]:
+        """First user in round-robin order that may start another call"""
+        for user_id in queue:
+            if self._user_has_capacity(user_id):
+                return user_id
+        raise LookupError
+
+    def _dispatch(self):
+        """Grant slots to waiting calls while capacity and rate allow"""
+        self._refill()
+
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._in_flight < self.max_concurrency:
+                try:
+                    user_id = self._next_user(queue)
+                except LookupError:
+                    break  # Everyone waiting here is at their per-user cap
+
+                if self.calls_per_minute > 0 and self._tokens < 1:
+                    self._schedule_refill()
+                    return
+
+                waiters = queue[user_id]
+                waiter = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(user_id)
+                else:
+                    del queue[user_id]
+                if waiter.done():
+                    continue  # Cancelled while queued
+
+                SCHEDULER_QUEUED.dec(priority=priority.name.lower())
+                if self.calls_per_minute > 0:
+                    self._tokens -= 1
+                self._in_flight += 1
+                SCHEDULER_IN_FLIGHT.inc()
+                if user_id is not None:
+                    self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+                waiter.set_result(None)
+
+    def _schedule_refill(self):
+        """Wake up the dispatcher when the next rate token is available"""
+        if self._timer is not None:
+            return
+        delay = (1 - self._tokens) * 60.0 / self.calls_per_minute
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_refill)
+
+    def _on_refill(self):
+        self._timer = None
+        self._dispatch()
+
+
+# Singleton instance
+model_scheduler = ModelCallScheduler(
+    max_concurrency=settings.MODEL_MAX_CONCURRENCY,
+    calls_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    per_user_limit=settings.CHAT_MESSAGE_LIMIT,
+)
@@ -6,6 +6,10 @@ from typing import Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime
+from app.sandbox.executor import executor
+
+# Seconds a demo snippet from the execute_code tool may run
+EXECUTE_CODE_TIMEOUT = 5
 
 
 class AIToolHandlers:
@@ -78,15 +82,7 @@ class AIToolHandlers:
                 "validation_script": tc["validation_script"]
             })
 
-        # If no test cases provided, create a basic one using validation_script
-        if not test_cases:
-            test_cases.append({
-                "test_id": "test_1",
-                "description": "Basic functionality test",
-                "input": {},
-                "expected_output": {"stdout": ""},
-                "validation_script": "# Test execution"
-            })
+        # No test cases: the submission is graded by Sonnet instead
 
         exercise_doc = {
             "exercise_id": exercise_id,
@@ -211,82 +207,52 @@ class AIToolHandlers:
         """
         Execute code and return output for display in chat
 
+        Runs in the same sandbox as exercise grading (resource limits, output
+        cap, result cache), without blocking the event loop.
+
         Args:
             input_data: {code, language, explanation}
 
         Returns:
             {success, output, execution_time, component}
         """
-        import subprocess
-        import time
-
         code = input_data["code"]
         language = input_data["language"]
         explanation = input_data["explanation"]
 
         try:
-            start_time = time.time()
-
-            if language == "python":
-                # Execute Python code
-                result = subprocess.run(
-                    ["python3", "-c", code],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                output = result.stdout if result.returncode == 0 else result.stderr
-
-            elif language == "javascript":
-                # Execute JavaScript with Node
-                result = subprocess.run(
-                    ["node", "-e", code],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                output = result.stdout if result.returncode == 0 else result.stderr
-
-            elif language == "bash":
-                # Execute Bash command
-                result = subprocess.run(
-                    ["bash", "-c", code],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                output = result.stdout if result.returncode == 0 else result.stderr
-            else:
-                output = f"Unsupported language: {language}"
-
-            execution_time = time.time() - start_time
-
-            # Return component data for frontend to render
+            result = await executor.execute(
+                code, language, timeout=EXECUTE_CODE_TIMEOUT, user_id=self.user_id
+            )
+        except Exception as e:
             return {
-                "success": True,
-                "output": output.strip(),
-                "execution_time": round(execution_time, 3),
-                "explanation": explanation,
-                "component": {
-                    "type": "code_execution",
-                    "language": language,
-                    "code": code,
-                    "output": output.strip()
-                }
+                "success": False,
+                "output": f"Execution error: {str(e)}",
+                "component": {"type": "error", "message": str(e)}
             }
 
-        except subprocess.TimeoutExpired:
+        if result["exit_code"] == 124:
             return {
                 "success": False,
-                "output": "Code execution timed out (5 second limit)",
+                "output": f"Code execution timed out ({EXECUTE_CODE_TIMEOUT} second limit)",
                 "component": {"type": "error", "message": "Execution timeout"}
             }
-        except Exception as e:
-            return {
-                "success": False,
-                "output": f"Execution error: {str(e)}",
-                "component": {"type": "error", "message": str(e)}
+
+        output = result["stdout"] if result["exit_code"] == 0 else result["stderr"]
+
+        # Return component data for frontend to render
+        return {
+            "success": True,
+            "output": output.strip(),
+            "execution_time": round(result["execution_time"], 3),
+            "explanation": explanation,
+            "component": {
+                "type": "code_execution",
+                "language": language,
+                "code": code,
+                "output": output.strip()
             }
+        }
 
     async def handle_show_interactive_component(self, input_data: Dict) -> Dict:
         """
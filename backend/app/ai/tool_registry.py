@@ -2,7 +2,7 @@
 Tool Registry for AI Tool Calling
 Centralizes tool definitions and execution routing
 """
-from typing import List, Dict
+from typing import List, Dict, Set
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import json
 
@@ -19,6 +19,10 @@ class ToolRegistry:
         self.handlers = AIToolHandlers(db, user_id)
         self.behavioral_tools = BehavioralTools(db, user_id)
         self.tools = {}
+        # Tools with ordering dependencies on other tool calls in the same
+        # assistant turn. ChatService runs these only after every earlier
+        # call has finished, and holds back later calls until they are done.
+        self.ordered_tools = set()
         self._register_tools()
 
     def _register_tools(self):
@@ -154,6 +158,8 @@ class ToolRegistry:
                 "required": ["target_type", "target_id"]
             }
         }
+        # Navigation must follow the content/exercise creation it points to
+        self.ordered_tools.add("navigate_to_next_step")
 
         # Tool 4: Provide Feedback
         self.tools["provide_feedback"] = {
@@ -216,6 +222,8 @@ class ToolRegistry:
                 "required": ["node_id", "status"]
             }
         }
+        # Writes the same user_progress document as create_learning_node
+        self.ordered_tools.add("update_user_progress")
 
         # Tool 6: Execute Code (NEW!)
         self.tools["execute_code"] = {
@@ -310,6 +318,8 @@ class ToolRegistry:
                 "required": ["experience_level", "learning_goals", "learning_style"]
             }
         }
+        # Overwrites the profile that behavioral tools update incrementally
+        self.ordered_tools.add("save_user_profile")
 
         # Tool 9: Create Learning Node (For Planning AI!)
         self.tools["create_learning_node"] = {
@@ -410,6 +420,15 @@ class ToolRegistry:
                 "tool_name": tool_name
             })
 
+    def get_ordered_tools(self) -> Set[str]:
+        """
+        Get names of tools that must not run concurrently with other tool calls
+
+        Returns:
+            Set of tool names
+        """
+        return set(self.ordered_tools)
+
     def get_tool_definitions(self) -> List[Dict]:
         """
         Get all tool definitions in Claude API format
@@ -2,36 +2,55 @@
 Chat API endpoints for AI tutor interactions
 """
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import datetime
+import asyncio
 import json
-from anthropic import AsyncAnthropic
+from redis.asyncio import Redis
 
-from app.dependencies import get_db, get_current_user_id
+from app.dependencies import get_db, get_current_user_id, get_redis_client
 from app.ai.agents.tutor_agent import TutorAgent
 from app.ai.agents.hint_agent import HintAgent
 from app.ai.chat_service import ChatService
+from app.ai.anthropic_client import get_anthropic_client
+from app.ai.instrumentation import create_message
+from app.ai.intent_router import intent_router
+from app.utils.single_flight import coalesce, normalize_message
 from app.config import get_settings
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 settings = get_settings()
 
+# Keep references to fire-and-forget tasks so they are not garbage collected
+_background_tasks = set()
 
-async def should_use_orchestrator(message: str, context_type: str) -> bool:
+
+async def should_use_orchestrator(
+    message: str, context_type: str, db: Optional[AsyncIOMotorDatabase] = None
+) -> bool:
     """
     Determine if message should use LearningOrchestrator (with tools)
-    vs TutorAgent (no tools) using semantic intent detection with Claude Haiku.
+    vs TutorAgent (no tools).
+
+    The local intent router (context, rules, hashed n-gram model) answers most
+    messages without a network call. Only messages it is not confident about
+    go to Claude Haiku for semantic intent detection. Decisions are logged to
+    routing_decisions when db is given, for offline router training.
 
     Returns True if tools are needed for this message
     """
-    # Always use orchestrator for these contexts
-    if context_type in ["planning", "learning_session", "onboarding"]:
-        return True
+    decision = intent_router.route(message, context_type)
+    if decision is not None:
+        if decision.source != "context":
+            _log_routing_decision(db, message, context_type, decision.requires_tools, decision.source, decision.confidence)
+        return decision.requires_tools
 
     # Use Claude Haiku for lightweight semantic intent detection
     try:
-        client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        client = get_anthropic_client()
 
         prompt = f"""Analyze this student message and determine if it requires TOOLS (actions like creating exercises, displaying content, executing code, generating quizzes) or just EXPLANATION (answering questions, explaining concepts).
 
@@ -54,7 +73,9 @@ EXPLANATION is sufficient for:
 Respond with only valid JSON in this exact format:
 {{"requires_tools": true/false, "intent": "brief description"}}"""
 
-        response = await client.messages.create(
+        response = await create_message(
+            client,
+            agent="intent_router",
             model="claude-3-haiku-20240307",
             max_tokens=100,
             messages=[{"role": "user", "content": prompt}]
@@ -66,7 +87,9 @@ Respond with only valid JSON in this exact format:
 
         print(f"🔍 Intent detection: message='{message[:50]}...' -> requires_tools={result.get('requires_tools', False)}, intent='{result.get('intent', 'unknown')}'")
 
-        return result.get("requires_tools", False)
+        requires_tools = bool(result.get("requires_tools", False))
+        _log_routing_decision(db, message, context_type, requires_tools, "llm")
+        return requires_tools
 
     except Exception as e:
         # Fallback to safe default on error
@@ -75,6 +98,30 @@ Respond with only valid JSON in this exact format:
         return True
 
 
+def _log_routing_decision(
+    db: Optional[AsyncIOMotorDatabase],
+    message: str,
+    context_type: str,
+    requires_tools: bool,
+    source: str,
+    confidence: Optional[float] = None,
+):
+    """Record a routing decision without delaying the request"""
+    if db is None:
+        return
+
+    task = asyncio.create_task(db.routing_decisions.insert_one({
+        "message": message,
+        "context_type": context_type,
+        "requires_tools": requires_tools,
+        "source": source,
+        "confidence": confidence,
+        "created_at": datetime.utcnow(),
+    }))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 class ChatMessageRequest(BaseModel):
     message: str
     context_type: Optional[str] = "general"  # "exercise", "node", "general"
@@ -88,86 +135,127 @@ class HintRequest(BaseModel):
     user_code: Optional[str] = ""
 
 
+async def _build_context_data(
+    request: ChatMessageRequest, db: AsyncIOMotorDatabase
+) -> Optional[dict]:
+    """Build context data (user code, exercise or node) for a chat request"""
+    context_data = {}
+    if request.user_code:
+        context_data["user_code"] = request.user_code
+
+    # If we have a context_id, fetch relevant details
+    if request.context_id:
+        if request.context_type == "exercise":
+            exercise = await db.exercises.find_one({"exercise_id": request.context_id})
+            if exercise:
+                context_data["exercise"] = exercise
+        elif request.context_type == "node":
+            node = await db.learning_nodes.find_one({"node_id": request.context_id})
+            if node:
+                context_data["node"] = node
+
+    return context_data if context_data else None
+
+
+async def _build_orchestrator_call(
+    request: ChatMessageRequest,
+    user_id: str,
+    db: AsyncIOMotorDatabase,
+    chat_service: ChatService,
+) -> dict:
+    """Build the ChatService arguments for a tool-enabled LearningOrchestrator turn"""
+    from app.ai.tool_registry import ToolRegistry
+    from app.ai.prompts.system_prompts import get_system_prompt
+
+    # Get or create session
+    session_id = await chat_service.get_or_create_session(
+        user_id=user_id,
+        context_type=request.context_type,
+        context_id=request.context_id or "general"
+    )
+
+    # Initialize tool registry
+    tool_registry = ToolRegistry(db, user_id)
+
+    # Load user profile with weak points for adaptive teaching
+    user_profile = await db.user_profiles.find_one({"user_id": user_id})
+    weak_points_info = None
+    if user_profile and user_profile.get("weak_points"):
+        weak_topics = [wp.get("topic", "") for wp in user_profile["weak_points"][-5:]]
+        if weak_topics:
+            weak_points_info = "USER'S WEAK POINTS (target these in exercises):\n- " + "\n- ".join(weak_topics)
+
+    # Choose system prompt based on context. The prompt itself stays static so
+    # it can be served from the prompt cache; per-user context goes after it.
+    system_context = None
+    if request.context_type == "onboarding":
+        system_prompt = get_system_prompt("onboarding")
+        print(f"✅ ROUTING: Selected ONBOARDING prompt for context_type='{request.context_type}'")
+    elif request.context_type == "planning":
+        system_prompt = get_system_prompt("planning")
+        print(f"✅ ROUTING: Selected PLANNING prompt for context_type='{request.context_type}'")
+    else:
+        system_prompt = get_system_prompt("learning_orchestrator")
+        system_context = weak_points_info  # Add weak points context
+        print(f"✅ ROUTING: Selected LEARNING_ORCHESTRATOR prompt for context_type='{request.context_type}'")
+
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        "message": request.message,
+        "system_prompt": system_prompt,
+        "system_context": system_context,
+        "context_data": await _build_context_data(request, db),
+        "tools": tool_registry.get_tool_definitions(),
+        "tool_executor": tool_registry.execute_tool,
+        "ordered_tools": tool_registry.get_ordered_tools(),
+    }
+
+
+def _format_sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @router.post("/message")
 async def send_chat_message(
     request: ChatMessageRequest,
     user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_db),
+    redis: Redis = Depends(get_redis_client),
 ):
     """Send a message to the AI tutor with intelligent routing"""
 
+    # Identical messages in flight for the same user and session share one response
+    return await coalesce(
+        redis,
+        ("chat_message", user_id, request.context_type, request.context_id,
+         normalize_message(request.message), normalize_message(request.user_code)),
+        lambda: _handle_chat_message(request, user_id, db),
+    )
+
+
+async def _handle_chat_message(
+    request: ChatMessageRequest,
+    user_id: str,
+    db: AsyncIOMotorDatabase,
+) -> dict:
+    """Route a chat message to the LearningOrchestrator or TutorAgent"""
+
     # Debug logging
     print(f"📥 Received message with context_type='{request.context_type}', message='{request.message[:50]}...'")
 
     # Determine if we need tools (LearningOrchestrator) or simple Q&A (TutorAgent)
-    use_orchestrator = await should_use_orchestrator(request.message, request.context_type)
+    use_orchestrator = await should_use_orchestrator(request.message, request.context_type, db)
     print(f"🔍 Routing decision: use_orchestrator={use_orchestrator}")
 
     # ROUTE 1: Use LearningOrchestrator with tools
     if use_orchestrator:
-        from app.ai.agents.learning_orchestrator import LearningOrchestrator
-        from app.ai.tool_registry import ToolRegistry
-        from app.ai.prompts.system_prompts import get_system_prompt
-
-        orchestrator = LearningOrchestrator(db)
-        chat_service = ChatService(db)
-
-        # Get or create session
-        session_id = await chat_service.get_or_create_session(
-            user_id=user_id,
-            context_type=request.context_type,
-            context_id=request.context_id or "general"
-        )
-
-        # Initialize tool registry
-        tool_registry = ToolRegistry(db, user_id)
-
-        # Load user profile with weak points for adaptive teaching
-        user_profile = await db.user_profiles.find_one({"user_id": user_id})
-        weak_points_info = ""
-        if user_profile and user_profile.get("weak_points"):
-            weak_topics = [wp.get("topic", "") for wp in user_profile["weak_points"][-5:]]
-            if weak_topics:
-                weak_points_info = f"\n\nUSER'S WEAK POINTS (target these in exercises):\n- " + "\n- ".join(weak_topics)
-
-        # Choose system prompt based on context
-        if request.context_type == "onboarding":
-            system_prompt = get_system_prompt("onboarding")
-            print(f"✅ ROUTING: Selected ONBOARDING prompt for context_type='{request.context_type}'")
-        elif request.context_type == "planning":
-            system_prompt = get_system_prompt("planning")
-            print(f"✅ ROUTING: Selected PLANNING prompt for context_type='{request.context_type}'")
-        else:
-            system_prompt = get_system_prompt("learning_orchestrator")
-            system_prompt += weak_points_info  # Add weak points context
-            print(f"✅ ROUTING: Selected LEARNING_ORCHESTRATOR prompt for context_type='{request.context_type}'")
-
-
-        # Build context data
-        context_data = {}
-        if request.user_code:
-            context_data["user_code"] = request.user_code
-
-        if request.context_id:
-            if request.context_type == "exercise":
-                exercise = await db.exercises.find_one({"exercise_id": request.context_id})
-                if exercise:
-                    context_data["exercise"] = exercise
-            elif request.context_type == "node":
-                node = await db.learning_nodes.find_one({"node_id": request.context_id})
-                if node:
-                    context_data["node"] = node
+        chat_service = ChatService(db, agent="orchestrator")
+        call_kwargs = await _build_orchestrator_call(request, user_id, db, chat_service)
 
         # Send message with tools enabled
-        response = await chat_service.send_message(
-            user_id=user_id,
-            session_id=session_id,
-            message=request.message,
-            system_prompt=system_prompt,
-            context_data=context_data if context_data else None,
-            tools=tool_registry.get_tool_definitions(),
-            tool_executor=tool_registry.execute_tool
-        )
+        response = await chat_service.send_message(**call_kwargs)
 
         print(f"🔧 Used LearningOrchestrator (tools enabled) for: {request.message[:50]}...")
         return response
@@ -176,43 +264,89 @@ async def send_chat_message(
     else:
         tutor = TutorAgent(db)
 
-        # Build context data if provided
-        context_data = None
-        if request.user_code:
-            context_data = {"user_code": request.user_code}
-
-        # If we have a context_id, fetch relevant details
-        if request.context_id:
-            if request.context_type == "exercise":
-                exercise = await db.exercises.find_one({"exercise_id": request.context_id})
-                if exercise:
-                    context_data = context_data or {}
-                    context_data["exercise"] = exercise
-            elif request.context_type == "node":
-                node = await db.learning_nodes.find_one({"node_id": request.context_id})
-                if node:
-                    context_data = context_data or {}
-                    context_data["node"] = node
-
         response = await tutor.ask_question(
             user_id=user_id,
             question=request.message,
             context_type=request.context_type,
             context_id=request.context_id,
-            context_data=context_data,
+            context_data=await _build_context_data(request, db),
         )
 
         print(f"💬 Used TutorAgent (simple Q&A) for: {request.message[:50]}...")
         return response
 
 
+@router.post("/message/stream")
+async def stream_chat_message(
+    request: ChatMessageRequest,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Streaming version of /message using Server-Sent Events
+
+    Emits text_delta events as Claude generates text, tool_started/tool_finished
+    events around each tool the orchestrator runs, and a final done event with
+    the same payload /message returns (after the assistant message is saved).
+    """
+    use_orchestrator = await should_use_orchestrator(request.message, request.context_type, db)
+    print(f"🔍 Routing decision (stream): use_orchestrator={use_orchestrator}")
+
+    if use_orchestrator:
+        chat_service = ChatService(db, agent="orchestrator")
+        call_kwargs = await _build_orchestrator_call(request, user_id, db, chat_service)
+        events = chat_service.stream_message(**call_kwargs)
+    else:
+        tutor = TutorAgent(db)
+        events = tutor.stream_question(
+            user_id=user_id,
+            question=request.message,
+            context_type=request.context_type,
+            context_id=request.context_id,
+            context_data=await _build_context_data(request, db),
+        )
+
+    async def event_source():
+        try:
+            async for event in events:
+                yield _format_sse(event["event"], event["data"])
+        except Exception as e:
+            print(f"❌ Chat stream error: {str(e)}")
+            yield _format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+        },
+    )
+
+
 @router.post("/hint")
 async def get_hint(
     request: HintRequest,
     user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_db),
+    redis: Redis = Depends(get_redis_client),
 ):
     """Get a progressive hint for an exercise"""
+    # Duplicate hint requests in flight share one response
+    return await coalesce(
+        redis,
+        ("hint", user_id, request.exercise_id, request.hint_level,
+         normalize_message(request.user_code)),
+        lambda: _generate_hint(request, user_id, db),
+    )
+
+
+async def _generate_hint(
+    request: HintRequest,
+    user_id: str,
+    db: AsyncIOMotorDatabase,
+) -> dict:
+    """Generate a hint with the HintAgent"""
     hint_agent = HintAgent(db)
 
     # Get user's attempt count for this exercise
@@ -294,3 +428,11 @@ async def close_session(
     await chat_service.close_session(session_id)
 
     return {"message": "Session closed", "session_id": session_id}
+
+
+@router.get("/routing/stats")
+async def get_routing_stats(
+    user_id: str = Depends(get_current_user_id),
+):
+    """Get local intent router counts and how often the LLM fallback fires"""
+    return intent_router.get_stats()
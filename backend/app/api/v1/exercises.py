@@ -1,16 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from redis.asyncio import Redis
 from datetime import datetime
 from typing import Optional
 from bson import ObjectId
-from app.dependencies import get_db, get_current_user_id
+import json
+from app.config import get_settings
+from app.dependencies import get_db, get_current_user_id, get_redis_client
 from app.models.exercise import (
     ExerciseResponse,
     ExerciseSubmit,
     ExerciseResultResponse,
     ExerciseAttemptInDB
 )
-from app.services.grading_service import grade_exercise
+from app.services.submission_pipeline import (
+    process_submission,
+    read_submission_events,
+    submission_finished,
+    subscribe_submission_events,
+)
+
+settings = get_settings()
 
 router = APIRouter(prefix="/exercises", tags=["Exercises"])
 
@@ -66,7 +77,13 @@ async def submit_exercise(
     user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Submit exercise code for AI assessment with interactive feedback"""
+    """
+    Submit exercise code for AI assessment with interactive feedback
+
+    The attempt is saved and acknowledged right away; grading, the rubric
+    review and chat feedback run in the background (submission_pipeline).
+    Follow them on /result/{submission_id}/events or poll /result/{submission_id}.
+    """
 
     # Verify exercise exists
     exercise = await db.exercises.find_one({"exercise_id": exercise_id})
@@ -82,158 +99,63 @@ async def submit_exercise(
         "exercise_id": exercise_id
     })
 
-    # Import AI Grading Service and Learning Orchestrator
-    from app.services.ai_grading_service import grade_exercise
-    from app.ai.agents.learning_orchestrator import LearningOrchestrator
-
-    orchestrator = LearningOrchestrator(db)
-
-    # AI-powered grading with Claude Sonnet
-    print(f"🎓 Grading submission for exercise: {exercise['title']}")
-
-    grading_result = await grade_exercise(
-        exercise=exercise,
-        student_code=submission.code,
-        expected_solution=exercise.get('solution')
-    )
-
-    score = grading_result['score']
-    passed = grading_result['passed']
-
-    print(f"📊 Score: {score}/100 ({'PASSED' if passed else 'NEEDS WORK'})")
-
-    # Prepare test results
-    test_results = {
-        "score": score,
-        "passed": passed,
-        "test_results": [{
-            "test_id": "ai_assessment",
-            "passed": passed,
-            "error_message": "" if passed else "Code needs improvement"
-        }]
-    }
-
-    # Create attempt record with detailed AI grading
+    # Create the attempt record; the pipeline fills it in
     attempt = {
         "user_id": user_id,
         "exercise_id": exercise_id,
         "attempt_number": attempt_count + 1,
         "submitted_code": submission.code,
-        "execution_result": {"status": "ai_graded", "grader": grading_result.get("graded_by", "ai_sonnet")},
-        "test_results": test_results["test_results"],
-        "score": score,
-        "feedback": grading_result["feedback"]["summary"],
-        "ai_comments": {
-            "strengths": grading_result["feedback"]["strengths"],
-            "improvements": grading_result["feedback"]["improvements"],
-            "specific_issues": grading_result["feedback"].get("specific_issues", []),
-            "next_steps": grading_result["next_steps"]
-        },
-        "grading_breakdown": grading_result["breakdown"],
-        "submitted_at": datetime.utcnow(),
-        "graded_at": datetime.utcnow()
+        "language": submission.language,
+        "status": "grading",
+        "feedback_status": "pending",
+        "submitted_at": datetime.utcnow()
     }
-
     result = await db.exercise_attempts.insert_one(attempt)
     submission_id = str(result.inserted_id)
 
-    # Analyze code for weak points
-    weak_points = []
-    code_lower = submission.code.lower()
-
-    # Check for common weak points
-    if 'def ' not in code_lower and 'function ' not in code_lower:
-        weak_points.append("function_declaration")
-    if 'for ' not in code_lower and 'while ' not in code_lower:
-        weak_points.append("loops")
-    if 'if ' not in code_lower:
-        weak_points.append("conditionals")
-    if 'class ' in code_lower and 'def __init__' not in code_lower:
-        weak_points.append("class_initialization")
-    if not passed:
-        weak_points.append("algorithmic_thinking")
-
-    # Update user profile with weak points
-    if weak_points:
-        for wp in weak_points:
-            # Try to update existing weak point
-            result = await db.user_profiles.update_one(
-                {
-                    "user_id": user_id,
-                    "weak_points.topic": wp
-                },
-                {
-                    "$inc": {"weak_points.$.occurrences": 1},
-                    "$push": {"weak_points.$.exercises_failed": exercise_id},
-                    "$set": {"weak_points.$.last_seen": datetime.utcnow()}
-                }
-            )
-
-            # If weak point doesn't exist, create it
-            if result.matched_count == 0:
-                await db.user_profiles.update_one(
-                    {"user_id": user_id},
-                    {
-                        "$push": {
-                            "weak_points": {
-                                "topic": wp,
-                                "description": f"Struggles with {wp.replace('_', ' ')}",
-                                "identified_at": datetime.utcnow(),
-                                "occurrences": 1,
-                                "exercises_failed": [exercise_id],
-                                "last_seen": datetime.utcnow()
-                            }
-                        }
-                    },
-                    upsert=True
-                )
-
-    # Update stats
-    await db.user_profiles.update_one(
-        {"user_id": user_id},
-        {
-            "$inc": {
-                "total_exercises_completed": 1,
-                "total_exercises_failed": 0 if passed else 1
-            },
-            "$set": {"last_active": datetime.utcnow()}
-        },
-        upsert=True
+    background_tasks.add_task(
+        process_submission, db, submission_id, exercise, submission.code, submission.language, user_id
     )
 
-    # Now send to Learning Orchestrator for interactive feedback in chat
-    try:
-        await orchestrator.handle_exercise_submission(
-            user_id=user_id,
-            exercise_id=exercise_id,
-            code=submission.code,
-            test_results=test_results
-        )
-        print(f"✅ Sent submission to AI orchestrator for interactive feedback")
-        if weak_points:
-            print(f"📊 Identified weak points: {', '.join(weak_points)}")
-    except Exception as e:
-        print(f"⚠️ AI orchestrator feedback failed: {e}")
-        # Don't fail the submission, just log it
-
     return {
         "submission_id": submission_id,
-        "status": "completed",
+        "status": "grading",
         "message": "Code submitted! Check the AI chat panel for detailed interactive feedback.",
-        "score": score,
-        "passed": passed
+        "result_url": f"/v1/exercises/{exercise_id}/result/{submission_id}",
+        "events_url": f"/v1/exercises/{exercise_id}/result/{submission_id}/events"
     }
 
 
-@router.get("/{exercise_id}/result/{submission_id}", response_model=dict)
-async def get_exercise_result(
-    exercise_id: str,
-    submission_id: str,
-    user_id: str = Depends(get_current_user_id),
-    db: AsyncIOMotorDatabase = Depends(get_db)
-):
-    """Get exercise grading result"""
+def _result_payload(attempt: dict, hints_available: int) -> dict:
+    """Result of an attempt as reported by /result and the events snapshot"""
+    # Determine status
+    if attempt.get("graded_at"):
+        status_value = "completed"
+    elif attempt.get("status") == "failed":
+        status_value = "failed"
+    else:
+        status_value = "grading"
+
+    return {
+        "submission_id": str(attempt["_id"]),
+        "status": status_value,
+        "error": attempt.get("error"),
+        "score": attempt.get("score", 0),
+        "passed": attempt.get("score", 0) >= 70,
+        "test_results": attempt.get("test_results", []),
+        "feedback": attempt.get("feedback", ""),
+        "graded_by": attempt.get("graded_by", "ai_sonnet"),
+        "rubric_status": attempt.get("rubric_status", "completed"),
+        "feedback_status": attempt.get("feedback_status", "completed"),
+        "grading_cache": attempt.get("grading_cache"),
+        "grading_breakdown": attempt.get("grading_breakdown"),
+        "ai_comments": attempt.get("ai_comments"),
+        "next_step": "Continue to next exercise" if attempt.get("score", 0) >= 70 else "Review feedback and try again",
+        "hints_available": hints_available
+    }
+
 
+async def _find_attempt(db: AsyncIOMotorDatabase, exercise_id: str, submission_id: str, user_id: str) -> dict:
     attempt = await db.exercise_attempts.find_one({
         "_id": ObjectId(submission_id),
         "user_id": user_id,
@@ -245,24 +167,78 @@ async def get_exercise_result(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Submission not found"
         )
+    return attempt
 
-    # Determine status
-    status_value = "completed" if attempt.get("graded_at") else "grading"
 
-    # Get exercise for hints
-    exercise = await db.exercises.find_one({"exercise_id": exercise_id})
-    hints_available = len(exercise.get("hints", [])) if exercise else 0
+async def _hints_available(db: AsyncIOMotorDatabase, exercise_id: str) -> int:
+    exercise = await db.exercises.find_one({"exercise_id": exercise_id}, {"hints": 1})
+    return len(exercise.get("hints", [])) if exercise else 0
 
-    return {
-        "submission_id": str(attempt["_id"]),
-        "status": status_value,
-        "score": attempt.get("score", 0),
-        "passed": attempt.get("score", 0) >= 70,
-        "test_results": attempt.get("test_results", []),
-        "feedback": attempt.get("feedback", ""),
-        "next_step": "Continue to next exercise" if attempt.get("score", 0) >= 70 else "Review feedback and try again",
-        "hints_available": hints_available
-    }
+
+@router.get("/{exercise_id}/result/{submission_id}", response_model=dict)
+async def get_exercise_result(
+    exercise_id: str,
+    submission_id: str,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get exercise grading result"""
+
+    attempt = await _find_attempt(db, exercise_id, submission_id, user_id)
+    return _result_payload(attempt, await _hints_available(db, exercise_id))
+
+
+@router.get("/{exercise_id}/result/{submission_id}/events")
+async def stream_exercise_result(
+    exercise_id: str,
+    submission_id: str,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    redis: Redis = Depends(get_redis_client)
+):
+    """
+    Grading progress of a submission as Server-Sent Events
+
+    Starts with a status event (the /result payload), then relays the
+    pipeline's graded, rubric, feedback and failed events, and ends with
+    done (or failed) once every step has finished.
+    """
+    pubsub = await subscribe_submission_events(redis, submission_id)
+    try:
+        attempt = await _find_attempt(db, exercise_id, submission_id, user_id)
+        snapshot = _result_payload(attempt, await _hints_available(db, exercise_id))
+    except Exception:
+        await pubsub.aclose()
+        raise
+
+    async def event_source():
+        yield _format_sse("status", snapshot)
+        if submission_finished(attempt):
+            await pubsub.aclose()
+            yield _format_sse("done", {"submission_id": submission_id})
+            return
+
+        async for event in read_submission_events(
+            pubsub, settings.SUBMISSION_EVENTS_TIMEOUT, settings.SUBMISSION_EVENTS_KEEPALIVE
+        ):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _format_sse(event["event"], event["data"])
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+        },
+    )
+
+
+def _format_sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 @router.post("/{exercise_id}/hint", response_model=dict)
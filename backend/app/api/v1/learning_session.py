@@ -6,9 +6,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
 from typing import Optional
+from redis.asyncio import Redis
 
-from app.dependencies import get_db, get_current_user_id
+from app.dependencies import get_db, get_current_user_id, get_redis_client
 from app.ai.agents.learning_orchestrator import LearningOrchestrator
+from app.utils.single_flight import coalesce
 
 
 router = APIRouter(prefix="/learning-session", tags=["Learning Session"])
@@ -31,7 +33,8 @@ class ExerciseSubmissionEvent(BaseModel):
 async def start_learning_session(
     node_id: str,
     user_id: str = Depends(get_current_user_id),
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    redis: Redis = Depends(get_redis_client)
 ):
     """
     Start AI-driven learning session for a node
@@ -49,7 +52,12 @@ async def start_learning_session(
     orchestrator = LearningOrchestrator(db)
 
     try:
-        result = await orchestrator.start_learning_session(user_id, node_id)
+        # Duplicate "Start Learning" clicks in flight share one orchestrator run
+        result = await coalesce(
+            redis,
+            ("learning_session_start", user_id, node_id),
+            lambda: orchestrator.start_learning_session(user_id, node_id),
+        )
 
         return {
             "session_id": result.get("session_id"),
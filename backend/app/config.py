@@ -30,6 +30,30 @@ class Settings(BaseSettings):
 
     # AI
     ANTHROPIC_API_KEY: str = ""
+    ANTHROPIC_BASE_URL: str = ""  # Empty for the real API; e.g. a local mock server
+    ANTHROPIC_MAX_CONNECTIONS: int = 100
+    ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    ANTHROPIC_KEEPALIVE_EXPIRY: float = 60.0  # seconds
+    ANTHROPIC_HTTP2: bool = True
+    ANTHROPIC_TIMEOUT: float = 120.0  # seconds
+    ANTHROPIC_CONNECT_TIMEOUT: float = 5.0  # seconds
+    ANTHROPIC_MAX_RETRIES: int = 2
+    MODEL_MAX_CONCURRENCY: int = 20  # Claude calls in flight per process
+    CHAT_HISTORY_TOKEN_BUDGET: int = 6000  # Verbatim history sent per request
+    CHAT_HISTORY_REFRESH_HEADROOM: float = 0.25  # Budget share the background summary refresh frees up
+    CHAT_HISTORY_SUMMARY_MESSAGE_CHARS: int = 2000  # Per-message cap in summary input
+    INTENT_ROUTER_MODEL_PATH: str = "data/intent_router.npz"
+    INTENT_ROUTER_CONFIDENCE: float = 0.8  # Below this, ask Claude Haiku
+    GRADE_CACHE_ENABLED: bool = True  # Reuse Sonnet grades of equivalent submissions
+    GRADE_CACHE_HOT_TTL: int = 86400  # seconds in the Redis tier
+    GRADE_CACHE_HOT_MAX_ENTRIES: int = 5000  # Least recently used beyond this leave the Redis tier
+    SIMILARITY_INDEX_ENABLED: bool = True  # Reuse rubric reviews of near-duplicate submissions
+    SIMILARITY_THRESHOLD: float = 0.9  # Estimated Jaccard similarity of token shingles
+    SIMILARITY_MAX_CANDIDATES: int = 100  # Signatures compared per lookup
+    SUBMISSION_BUSY_RETRIES: int = 3  # Background grading retries while the sandbox queue is full
+    SUBMISSION_EVENTS_TIMEOUT: int = 300  # seconds a submission's SSE stream stays open
+    SUBMISSION_EVENTS_KEEPALIVE: int = 15  # seconds between SSE keep-alive comments
+    SUBMISSION_GRADING_DEADLINE: int = 600  # seconds before an unfinished attempt is marked failed
 
     # Sandbox
     SANDBOX_TIMEOUT: int = 30  # seconds
@@ -37,11 +61,31 @@ class Settings(BaseSettings):
     SANDBOX_CPU_LIMIT: str = "0.5"
     MAX_CODE_LENGTH: int = 10000
     MAX_OUTPUT_SIZE: int = 10240  # 10KB
+    SANDBOX_POOL_SIZE: int = 4  # Warm Docker containers per language (0 disables the pool)
+    SANDBOX_POOL_MIN_IDLE: int = 1
+    SANDBOX_POOL_MAX_AGE: int = 600  # seconds
+    SANDBOX_POOL_MAX_RUNS: int = 50
+    SANDBOX_POOL_CHECKOUT_TIMEOUT: float = 10.0  # seconds
+    SANDBOX_ZYGOTE_ENABLED: bool = False  # Fork Python runs from a preloaded interpreter
+    SANDBOX_ZYGOTE_SOCKET: str = "/tmp/myteacher-sandbox-zygote.sock"
+    SANDBOX_ZYGOTE_UID: int = 65534  # Runs drop to this uid/gid when the API runs as root
+    SANDBOX_BACKEND: str = "subprocess"  # subprocess or docker
+    SANDBOX_LANGUAGE_CONCURRENCY: dict = {"python": 8, "bash": 4, "javascript": 4}  # Runs at once per language
+    SANDBOX_TEST_TIMEOUT: int = 5  # Per test case when a submission's tests run in one harness
+    SANDBOX_CACHE_ENABLED: bool = True  # Reuse results of identical deterministic runs
+    SANDBOX_CACHE_TTL: int = 3600  # seconds
+    SANDBOX_CACHE_MAX_ENTRIES: int = 10000
+    SANDBOX_CACHE_MAX_ENTRY_BYTES: int = 65536
+    SANDBOX_QUEUE_ENABLED: bool = False  # Send runs to sandbox workers (python -m app.sandbox.worker)
+    SANDBOX_QUEUE_MAX_DEPTH: int = 200  # Queued jobs before new runs get 429
+    SANDBOX_QUEUE_USER_LIMIT: int = 3  # Runs in flight per user
+    SANDBOX_QUEUE_RETRY_AFTER: int = 5  # seconds
+    SANDBOX_WORKER_CONCURRENCY: int = 4  # Jobs run at once per worker process
 
     # Rate Limiting
-    RATE_LIMIT_PER_MINUTE: int = 100
+    RATE_LIMIT_PER_MINUTE: int = 100  # Claude calls started per minute
     EXERCISE_SUBMIT_LIMIT: int = 10
-    CHAT_MESSAGE_LIMIT: int = 5
+    CHAT_MESSAGE_LIMIT: int = 5  # Claude calls in flight per user
 
     # CORS
     CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:3001"]
@@ -1,9 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 from app.config import get_settings
-from app.db.mongodb import connect_to_mongodb, close_mongodb_connection
+from app.db.mongodb import connect_to_mongodb, close_mongodb_connection, mongodb
 from app.db.redis import connect_to_redis, close_redis_connection
+from app.ai.anthropic_client import connect_to_anthropic, close_anthropic_client
+from app.ai.instrumentation import track_request_calls, summarize_calls
+from app.sandbox.container_pool import close_container_pools
+from app.sandbox.job_queue import SandboxBusyError
+from app.sandbox.zygote import close_zygote
+from app.services.grade_cache import create_grade_cache_indexes
+from app.services.similarity_index import create_similarity_indexes
+from app.services.submission_pipeline import create_submission_indexes, sweep_stale_submissions
+from app.utils.metrics import metrics
 from app.api.v1 import api_router
 
 settings = get_settings()
@@ -14,12 +25,21 @@ async def lifespan(app: FastAPI):
     """Lifespan events for startup and shutdown"""
     # Startup
     await connect_to_mongodb()
+    await create_grade_cache_indexes(mongodb.db)
+    await create_similarity_indexes(mongodb.db)
+    await create_submission_indexes(mongodb.db)
     await connect_to_redis()
+    await connect_to_anthropic()
+    stale_sweep = asyncio.create_task(sweep_stale_submissions(mongodb.db))
     print(f"🚀 {settings.APP_NAME} started")
     yield
     # Shutdown
+    stale_sweep.cancel()
     await close_mongodb_connection()
     await close_redis_connection()
+    await close_anthropic_client()
+    await close_container_pools()
+    await close_zygote()
     print(f"👋 {settings.APP_NAME} stopped")
 
 
@@ -36,8 +56,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-LLM-Summary", "Server-Timing"],
 )
 
+
+@app.middleware("http")
+async def llm_call_summary(request: Request, call_next):
+    """
+    Add a summary of the Claude API calls made for this request to the headers
+
+    Streaming responses send their headers before the body is generated, so
+    their summary only covers calls made before the stream started.
+    """
+    calls = track_request_calls()
+    response = await call_next(request)
+    response.headers.update(summarize_calls(calls))
+    return response
+
+
+@app.exception_handler(SandboxBusyError)
+async def sandbox_busy(request: Request, exc: SandboxBusyError):
+    """Sandbox job queue backpressure: ask the client to retry later"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Include API routes
 app.include_router(api_router, prefix="/v1")
 
@@ -62,6 +107,12 @@ async def health_check():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Process metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -67,12 +67,27 @@ class ExerciseResponse(ExerciseBase):
         populate_by_name = True
 
 
+class SyntaxErrorDetail(BaseModel):
+    """Syntax error found before running the code"""
+    line: Optional[int] = None
+    column: Optional[int] = None
+    message: str
+
+
 class ExecutionResult(BaseModel):
     """Code execution result"""
     stdout: str
     stderr: str
     exit_code: int
     execution_time: float
+    truncated_bytes: int = 0  # Output dropped by the sandbox's output limit
+    # Resource usage of the run (see app/sandbox/accounting.py), None if not measured
+    cpu_user: Optional[float] = 0.0
+    cpu_sys: Optional[float] = 0.0
+    peak_rss_kb: Optional[int] = 0
+    bytes_written: int = 0
+    limit_hit: Optional[str] = None  # time, memory, output, file_size
+    syntax_error: Optional[SyntaxErrorDetail] = None  # Rejected by the pre-flight check, never run
 
 
 class TestResult(BaseModel):
@@ -0,0 +1,76 @@
+"""
+Per-run resource accounting for sandbox results
+
+Every backend adds the same fields to its result dict:
+
+    cpu_user, cpu_sys   CPU seconds (user / kernel), None if not measured
+    peak_rss_kb         peak resident memory, None if not measured
+    bytes_written       stdout + stderr bytes the program produced (before truncation)
+    limit_hit           "time", "memory", "output", "file_size" or None
+
+Subprocess and zygote runs take these from wait4's rusage; Docker runs from
+the container's cgroup stats before and after the run.
+"""
+from typing import Any, Dict, Optional
+import signal
+
+MEMORY_ERROR_MARKERS = (
+    "MemoryError",                       # Python
+    "JavaScript heap out of memory",     # node
+    "Cannot allocate memory",            # bash, coreutils
+    "xmalloc: cannot allocate",          # bash
+)
+
+
+def _killed_by(exit_code: int, sig: signal.Signals) -> bool:
+    """Signal deaths are reported as -N (subprocess) or 128 + N (shell, Docker)"""
+    return exit_code in (-sig, 128 + sig)
+
+
+def classify_limit(
+    exit_code: int,
+    stderr: str,
+    timed_out: bool = False,
+    output_exceeded: bool = False,
+    oom_killed: bool = False,
+) -> Optional[str]:
+    """
+    Work out which sandbox limit, if any, ended a run
+
+    Args:
+        exit_code: Run exit code
+        stderr: Run stderr (checked for out-of-memory errors)
+        timed_out: Wall-clock timeout fired
+        output_exceeded: Output limit was exceeded
+        oom_killed: The container's OOM killer fired (Docker)
+
+    Returns:
+        "time", "memory", "output", "file_size" or None
+    """
+    if timed_out or exit_code == 124 or _killed_by(exit_code, signal.SIGXCPU):
+        return "time"
+    if output_exceeded:
+        return "output"
+    if oom_killed or any(marker in stderr for marker in MEMORY_ERROR_MARKERS):
+        return "memory"
+    # Python ignores SIGXFSZ and raises "File too large" instead
+    if _killed_by(exit_code, signal.SIGXFSZ) or "File too large" in stderr:
+        return "file_size"
+    return None
+
+
+def usage_fields(
+    cpu_user: Optional[float] = None,
+    cpu_sys: Optional[float] = None,
+    peak_rss_kb: Optional[int] = None,
+    bytes_written: int = 0,
+    limit_hit: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Resource accounting fields for a result dict (None: not measured)"""
+    return {
+        "cpu_user": None if cpu_user is None else round(cpu_user, 4),
+        "cpu_sys": None if cpu_sys is None else round(cpu_sys, 4),
+        "peak_rss_kb": None if peak_rss_kb is None else int(peak_rss_kb),
+        "bytes_written": int(bytes_written),
+        "limit_hit": limit_hit,
+    }
@@ -0,0 +1,431 @@
+"""
+Warm container pool for the Docker sandbox
+
+Keeps pre-started, network-less, resource-limited containers per language
+(sleeping on `sleep infinity`), so a run is a single `docker exec` instead of
+create/start/wait/remove. Code is passed to the interpreter via exec
+arguments; nothing is written into the container image.
+
+A container is recycled after SANDBOX_POOL_MAX_RUNS runs, after
+SANDBOX_POOL_MAX_AGE seconds, or as soon as a run leaves traces behind
+(lingering processes, files in /workspace, /tmp or /dev/shm, a timeout, an
+OOM kill, exceeding the output limit, or the container no longer running).
+
+The Docker SDK is synchronous; every Docker API call runs in a worker thread.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import time
+
+import docker
+
+from app.config import get_settings
+from app.sandbox.output import (
+    OUTPUT_LIMIT_EXIT_CODE,
+    BoundedOutputBuffer,
+    read_demuxed,
+)
+from app.utils.metrics import metrics
+
+settings = get_settings()
+
+# Exit code of `timeout -s KILL` when the limit is hit (128 + SIGKILL)
+KILLED_EXIT_CODE = 137
+
+# Lists the probe's own PID, every PID in the container, then any leftover files
+_TAMPER_PROBE = (
+    'echo $$; for p in /proc/[0-9]*; do echo "pid:${p#/proc/}"; done; '
+    "find /workspace /tmp /dev/shm -mindepth 1 -maxdepth 1"
+)
+
+POOL_CHECKOUT_SECONDS = metrics.histogram(
+    "sandbox_pool_checkout_seconds",
+    "Time waited to check out a warm sandbox container",
+    ("language",),
+)
+POOL_EXHAUSTED = metrics.counter(
+    "sandbox_pool_exhausted_total",
+    "Checkouts that found no idle container and the pool at its size limit",
+    ("language",),
+)
+POOL_RECYCLED = metrics.counter(
+    "sandbox_pool_recycled_total",
+    "Sandbox containers destroyed, by reason",
+    ("language", "reason"),
+)
+POOL_CONTAINERS = metrics.gauge(
+    "sandbox_pool_containers",
+    "Sandbox containers by state",
+    ("language", "state"),
+)
+
+
+class PooledContainer:
+    """A warm container and its usage"""
+
+    def __init__(self, container, language: str):
+        self.container = container
+        self.language = language
+        self.created_at = time.monotonic()
+        self.runs = 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class ContainerPool:
+    """Pool of warm containers for one language"""
+
+    def __init__(
+        self,
+        client: docker.DockerClient,
+        language: str,
+        image: str,
+        size: int,
+        min_idle: int,
+        max_age: float,
+        max_runs: int,
+    ):
+        """
+        Args:
+            client: Docker client
+            language: Sandbox language (python, bash)
+            image: Sandbox image for the language
+            size: Maximum containers (idle + busy)
+            min_idle: Idle containers kept warm ahead of demand
+            max_age: Seconds before a container is recycled
+            max_runs: Runs before a container is recycled
+        """
+        self.client = client
+        self.language = language
+        self.image = image
+        self.size = size
+        self.min_idle = min(min_idle, size)
+        self.max_age = max_age
+        self.max_runs = max_runs
+
+        self._idle: List[PooledContainer] = []
+        self._total = 0  # idle + busy + being created
+        self._available = asyncio.Condition()
+        self._closed = False
+        self._background = set()
+
+    async def checkout(self, timeout: float) -> PooledContainer:
+        """
+        Take a warm container, starting one if the pool has room
+
+        Raises:
+            TimeoutError: No container became available within timeout
+        """
+        started = time.monotonic()
+        exhausted = False
+
+        async with self._available:
+            while True:
+                while self._idle:
+                    pooled = self._idle.pop()
+                    if pooled.age < self.max_age:
+                        self._update_gauges()
+                        POOL_CHECKOUT_SECONDS.observe(time.monotonic() - started, language=self.language)
+                        return pooled
+                    self._discard(pooled, "max_age")
+
+                if self._total < self.size:
+                    self._total += 1
+                    break
+
+                if not exhausted:
+                    exhausted = True
+                    POOL_EXHAUSTED.inc(language=self.language)
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise TimeoutError(f"No {self.language} sandbox container available")
+                try:
+                    await asyncio.wait_for(self._available.wait(), remaining)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"No {self.language} sandbox container available")
+
+        # Cold start outside the lock
+        try:
+            pooled = await asyncio.to_thread(self._start_container)
+        except BaseException:
+            await self._release_slot()
+            raise
+        self._update_gauges()
+        POOL_CHECKOUT_SECONDS.observe(time.monotonic() - started, language=self.language)
+        return pooled
+
+    async def checkin(self, pooled: PooledContainer, tainted: Optional[str] = None):
+        """
+        Return a container after a run
+
+        Args:
+            pooled: Container from checkout()
+            tainted: Reason the container must not be reused, if any
+        """
+        pooled.runs += 1
+        reason = tainted
+        if reason is None and pooled.runs >= self.max_runs:
+            reason = "max_runs"
+        if reason is None and pooled.age >= self.max_age:
+            reason = "max_age"
+        if reason is None and self._closed:
+            reason = "closed"
+
+        async with self._available:
+            if reason is None:
+                self._idle.append(pooled)
+            else:
+                self._discard(pooled, reason)
+            self._available.notify()
+        self._update_gauges()
+        self._spawn(self.fill())
+
+    async def fill(self):
+        """Start containers until min_idle are idle (within the size limit)"""
+        while not self._closed:
+            async with self._available:
+                if len(self._idle) >= self.min_idle or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                pooled = await asyncio.to_thread(self._start_container)
+            except Exception as e:
+                print(f"⚠️ Failed to start {self.language} sandbox container: {e}")
+                await self._release_slot()
+                return
+            async with self._available:
+                self._idle.append(pooled)
+                self._available.notify()
+            self._update_gauges()
+
+    async def close(self):
+        """Destroy idle containers; busy ones are destroyed on checkin"""
+        self._closed = True
+        async with self._available:
+            idle, self._idle = self._idle, []
+            for pooled in idle:
+                self._discard(pooled, "closed")
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        self._update_gauges()
+
+    def _start_container(self) -> PooledContainer:
+        """Start a sleeping, locked-down container (blocking)"""
+        container = self.client.containers.run(
+            image=self.image,
+            command=["sleep", "infinity"],
+            detach=True,
+            network_mode="none",  # No network access
+            mem_limit=settings.SANDBOX_MEMORY_LIMIT,
+            memswap_limit=settings.SANDBOX_MEMORY_LIMIT,
+            cpu_quota=int(float(settings.SANDBOX_CPU_LIMIT) * 100000),
+            pids_limit=64,
+            read_only=True,
+            tmpfs={
+                "/workspace": "rw,size=16m,mode=1777",
+                "/tmp": "rw,size=16m,mode=1777",
+                # Replaces Docker's default 64m /dev/shm, which the probe also checks
+                "/dev/shm": "rw,size=1m,mode=1777",
+            },
+            security_opt=["no-new-privileges"],
+            cap_drop=["ALL"],
+            labels={"myteacher.sandbox.pool": self.language},
+        )
+        return PooledContainer(container, self.language)
+
+    def _discard(self, pooled: PooledContainer, reason: str):
+        """Forget a container and remove it in the background (caller holds the lock)"""
+        self._total -= 1
+        POOL_RECYCLED.inc(language=self.language, reason=reason)
+        self._spawn(asyncio.to_thread(self._remove_container, pooled))
+
+    def _remove_container(self, pooled: PooledContainer):
+        try:
+            pooled.container.remove(force=True)
+        except docker.errors.APIError as e:
+            print(f"⚠️ Failed to remove sandbox container {pooled.container.short_id}: {e}")
+
+    async def _release_slot(self):
+        async with self._available:
+            self._total -= 1
+            self._available.notify()
+        self._update_gauges()
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _update_gauges(self):
+        idle = len(self._idle)
+        POOL_CONTAINERS.set(idle, language=self.language, state="idle")
+        POOL_CONTAINERS.set(max(self._total - idle, 0), language=self.language, state="busy")
+
+
+def exec_in_container(
+    pooled: PooledContainer,
+    command: List[str],
+    timeout: int,
+    max_output: int,
+    probe: bool = True
+) -> Tuple[BoundedOutputBuffer, BoundedOutputBuffer, int, Optional[str], Dict[str, Any]]:
+    """
+    Run a command in a warm container and check it for leftovers (blocking)
+
+    The command is wrapped in `timeout -s KILL`, so a runaway process is
+    killed inside the container without losing the container's other state.
+    Output is streamed into bounded buffers; if either stream exceeds
+    max_output bytes the whole container is killed (and recycled).
+    probe=False skips the leftover check, for a container that is removed
+    after the run anyway.
+
+    Returns:
+        (stdout, stderr, exit_code, tainted, usage) where tainted is the
+        reason the container must be recycled, or None, and usage holds
+        cpu_user, cpu_sys, peak_rss_kb and oom_killed (see cgroup_usage).
+        exit_code is 124 on timeout and OUTPUT_LIMIT_EXIT_CODE when the
+        output limit was exceeded.
+    """
+    api = pooled.container.client.api
+    exec_id = api.exec_create(
+        pooled.container.id,
+        ["timeout", "-s", "KILL", str(timeout), *command],
+        workdir="/workspace",
+        user="1000:1000",
+        environment={"LANG": "C.UTF-8", "LC_ALL": "C.UTF-8"},
+    )["Id"]
+    stdout = BoundedOutputBuffer(max_output)
+    stderr = BoundedOutputBuffer(max_output)
+    before = _cgroup_stats(pooled)
+    started = time.monotonic()
+    exceeded = read_demuxed(
+        api.exec_start(exec_id, stream=True, demux=True),
+        stdout,
+        stderr,
+        lambda: _kill_container(pooled),
+    )
+    elapsed = time.monotonic() - started
+
+    if exceeded:
+        return stdout, stderr, OUTPUT_LIMIT_EXIT_CODE, "output_limit", cgroup_usage(before, None)
+
+    exit_code = api.exec_inspect(exec_id)["ExitCode"]
+    usage = cgroup_usage(before, _cgroup_stats(pooled))
+    tainted = None
+    if exit_code == KILLED_EXIT_CODE and elapsed < timeout:
+        # SIGKILLed before `timeout` fired: the cgroup's OOM killer
+        usage["oom_killed"] = True
+        tainted = "oom"
+    elif exit_code == KILLED_EXIT_CODE:
+        exit_code = 124
+        tainted = "timeout"
+    elif probe:
+        tainted = _probe_leftovers(pooled)
+
+    return stdout, stderr, exit_code, tainted, usage
+
+
+def _cgroup_stats(pooled: PooledContainer) -> Optional[Dict[str, Any]]:
+    """One stats sample of the container's cgroup, or None if unavailable"""
+    try:
+        return pooled.container.client.api.stats(pooled.container.id, stream=False, one_shot=True)
+    except (docker.errors.APIError, docker.errors.InvalidVersion):
+        return None
+
+
+def cgroup_usage(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Resource usage of one run from cgroup stats taken around it
+
+    CPU time is the difference between the samples. Memory is the cgroup's
+    high-water mark if the run raised it (cgroup v1), otherwise its usage
+    after the run; both include the idle container's own small footprint.
+    Without both samples they are None (not measured).
+    """
+    usage = {"cpu_user": None, "cpu_sys": None, "peak_rss_kb": None, "oom_killed": False}
+    if not before or not after:
+        return usage
+
+    cpu_before = before.get("cpu_stats", {}).get("cpu_usage", {})
+    cpu_after = after.get("cpu_stats", {}).get("cpu_usage", {})
+    usage["cpu_user"] = max(0, cpu_after.get("usage_in_usermode", 0) - cpu_before.get("usage_in_usermode", 0)) / 1e9
+    usage["cpu_sys"] = max(0, cpu_after.get("usage_in_kernelmode", 0) - cpu_before.get("usage_in_kernelmode", 0)) / 1e9
+
+    memory_before = before.get("memory_stats", {})
+    memory_after = after.get("memory_stats", {})
+    if memory_after.get("max_usage", 0) > memory_before.get("max_usage", 0):
+        usage["peak_rss_kb"] = memory_after["max_usage"] // 1024
+    else:
+        usage["peak_rss_kb"] = memory_after.get("usage", 0) // 1024
+    return usage
+
+
+def _kill_container(pooled: PooledContainer):
+    try:
+        pooled.container.kill()
+    except docker.errors.APIError:
+        pass
+
+
+def _probe_leftovers(pooled: PooledContainer) -> Optional[str]:
+    """Detect processes or files a run left behind"""
+    try:
+        exit_code, output = pooled.container.exec_run(["sh", "-c", _TAMPER_PROBE], user="0:0")
+    except docker.errors.APIError:
+        return "unhealthy"
+    if exit_code != 0:
+        return "unhealthy"
+
+    lines = output.decode("utf-8", errors="replace").split()
+    if not lines:
+        return "unhealthy"
+    probe_pid = lines[0]
+    pids = {line[4:] for line in lines[1:] if line.startswith("pid:")}
+    if pids - {"1", probe_pid}:
+        return "lingering_processes"
+    if any(not line.startswith("pid:") for line in lines[1:]):
+        return "leftover_files"
+    return None
+
+
+class ContainerPoolManager:
+    """Container pools per language"""
+
+    def __init__(self):
+        self.pools: Dict[str, ContainerPool] = {}
+
+    def get_pool(self, client: docker.DockerClient, language: str, image: str) -> ContainerPool:
+        """Get the pool for a language, creating and warming it on first use"""
+        pool = self.pools.get(language)
+        if pool is None:
+            pool = ContainerPool(
+                client,
+                language,
+                image,
+                size=settings.SANDBOX_POOL_SIZE,
+                min_idle=settings.SANDBOX_POOL_MIN_IDLE,
+                max_age=settings.SANDBOX_POOL_MAX_AGE,
+                max_runs=settings.SANDBOX_POOL_MAX_RUNS,
+            )
+            self.pools[language] = pool
+            pool._spawn(pool.fill())
+            print(f"✅ Sandbox container pool for {language} (size={pool.size}, min_idle={pool.min_idle})")
+        return pool
+
+    async def close_all(self):
+        for pool in self.pools.values():
+            await pool.close()
+        self.pools = {}
+
+
+# Singleton instance
+container_pools = ContainerPoolManager()
+
+
+async def close_container_pools():
+    """Destroy warm sandbox containers"""
+    if container_pools.pools:
+        await container_pools.close_all()
+        print("✅ Closed sandbox container pools")
@@ -1,12 +1,20 @@
 """
 Docker-based sandbox for secure code execution
 """
+import asyncio
 import docker
 import tempfile
 import os
 import time
-from typing import Dict, Tuple
+from typing import Dict, Optional
 from app.config import get_settings
+from app.sandbox.accounting import classify_limit, usage_fields
+from app.sandbox.container_pool import PooledContainer, container_pools, exec_in_container
+from app.sandbox.output import (
+    OUTPUT_LIMIT_EXIT_CODE,
+    BoundedOutputBuffer,
+    output_limit_message,
+)
 
 settings = get_settings()
 
@@ -14,7 +22,23 @@ settings = get_settings()
 class DockerSandbox:
     """Manages Docker-based code execution"""
 
+    # Sandbox image per language
+    IMAGES = {
+        "python": "myteacher-sandbox-python",
+        "bash": "myteacher-sandbox-bash",
+        "javascript": "myteacher-sandbox-javascript"
+    }
+
+    # Interpreter command taking the code as an argument (warm pool runs)
+    INLINE_COMMANDS = {
+        "python": ["python3", "-c"],
+        "bash": ["bash", "-c"],
+        "javascript": ["node", "-e"],
+    }
+
     def __init__(self):
+        self._images_ready = set()
+        self._image_ids: Dict[str, str] = {}
         try:
             self.client = docker.from_env()
             # Test connection
@@ -28,18 +52,21 @@ class DockerSandbox:
         self,
         code: str,
         language: str,
-        timeout: int = None
+        timeout: int = None,
+        max_output: int = None
     ) -> Dict[str, any]:
         """
         Execute code in isolated Docker container
 
         Args:
             code: Code to execute
-            language: Language (python, bash)
+            language: Language (python, bash, javascript)
             timeout: Execution timeout in seconds
+            max_output: Output size limit per stream (MAX_OUTPUT_SIZE by default)
 
         Returns:
-            Dict with stdout, stderr, exit_code, execution_time
+            Dict with stdout, stderr, exit_code, execution_time, truncated_bytes
+            and resource usage (see accounting.py)
         """
         if not self.client:
             return {
@@ -50,14 +77,10 @@ class DockerSandbox:
             }
 
         timeout = timeout or settings.SANDBOX_TIMEOUT
+        max_output = max_output or settings.MAX_OUTPUT_SIZE
 
         # Select image based on language
-        image_map = {
-            "python": "myteacher-sandbox-python",
-            "bash": "myteacher-sandbox-bash"
-        }
-
-        image = image_map.get(language)
+        image = self.IMAGES.get(language)
         if not image:
             return {
                 "stdout": "",
@@ -75,71 +98,222 @@ class DockerSandbox:
             elif language == "bash":
                 code_file = os.path.join(tmpdir, "script.sh")
                 command = ["bash", "/workspace/script.sh"]
+            elif language == "javascript":
+                code_file = os.path.join(tmpdir, "main.js")
+                command = ["node", "/workspace/main.js"]
 
             with open(code_file, "w") as f:
                 f.write(code)
 
             # Build image if it doesn't exist
-            try:
-                self.client.images.get(image)
-            except docker.errors.ImageNotFound:
-                self._build_image(language, image)
+            self._ensure_image(language, image)
 
-            # Execute in container
+            # Run as an exec in a sleeping container, like warm pool runs, so
+            # the cgroup can still be sampled once the program has exited
+            container = None
             try:
                 start_time = time.time()
 
                 container = self.client.containers.run(
                     image=image,
-                    command=command,
+                    command=["sleep", "infinity"],
                     volumes={tmpdir: {"bind": "/workspace", "mode": "ro"}},
                     network_mode="none",  # No network access
                     mem_limit=settings.SANDBOX_MEMORY_LIMIT,
                     cpu_quota=int(float(settings.SANDBOX_CPU_LIMIT) * 100000),
                     detach=True,
-                    remove=True,
                     security_opt=["no-new-privileges"],
                     cap_drop=["ALL"]
                 )
 
-                # Wait for completion with timeout
-                result = container.wait(timeout=timeout)
-                execution_time = time.time() - start_time
-
-                # Get logs
-                logs = container.logs(stdout=True, stderr=True)
-                output = logs.decode("utf-8")
-
-                # Separate stdout and stderr (simplified)
-                stdout = output
-                stderr = ""
-                exit_code = result["StatusCode"]
-
-                # Truncate output if too large
-                if len(stdout) > settings.MAX_OUTPUT_SIZE:
-                    stdout = stdout[:settings.MAX_OUTPUT_SIZE] + "\n... (output truncated)"
+                stdout, stderr, exit_code, tainted, usage = exec_in_container(
+                    PooledContainer(container, language), command, timeout, max_output, probe=False
+                )
 
-                return {
-                    "stdout": stdout,
-                    "stderr": stderr,
-                    "exit_code": exit_code,
-                    "execution_time": execution_time
-                }
+                if exit_code == 124:
+                    return {
+                        "stdout": stdout.text(),
+                        "stderr": f"Execution timed out after {timeout} seconds",
+                        "exit_code": 124,
+                        "execution_time": timeout,
+                        "truncated_bytes": stdout.truncated_bytes + stderr.truncated_bytes,
+                        **self._usage(usage, stdout, stderr, "time")
+                    }
+                return self._result(
+                    stdout, stderr, exit_code, time.time() - start_time, tainted == "output_limit", max_output, usage
+                )
 
-            except docker.errors.ContainerError as e:
-                return {
-                    "stdout": e.stdout.decode("utf-8") if e.stdout else "",
-                    "stderr": e.stderr.decode("utf-8") if e.stderr else str(e),
-                    "exit_code": e.exit_status,
-                    "execution_time": 0
-                }
             except Exception as e:
                 return {
                     "stdout": "",
                     "stderr": f"Execution error: {str(e)}",
                     "exit_code": 1,
-                    "execution_time": 0
+                    "execution_time": 0,
+                    **usage_fields()
                 }
+            finally:
+                if container is not None:
+                    try:
+                        container.remove(force=True)
+                    except docker.errors.APIError:
+                        pass
+
+    async def execute_code_async(
+        self,
+        code: str,
+        language: str,
+        timeout: int = None,
+        max_output: int = None
+    ) -> Dict[str, any]:
+        """
+        Execute code in isolated Docker container without blocking the event loop
+
+        Runs in a warm pooled container when SANDBOX_POOL_SIZE > 0, otherwise
+        in a fresh container. The Docker SDK is synchronous, so Docker calls
+        happen in worker threads.
+        """
+        if not self.client or settings.SANDBOX_POOL_SIZE <= 0:
+            return await asyncio.to_thread(self.execute_code, code, language, timeout, max_output)
+
+        timeout = timeout or settings.SANDBOX_TIMEOUT
+        max_output = max_output or settings.MAX_OUTPUT_SIZE
+        image = self.IMAGES.get(language)
+        if not image:
+            return {
+                "stdout": "",
+                "stderr": f"Unsupported language: {language}",
+                "exit_code": 1,
+                "execution_time": 0
+            }
+
+        if image not in self._images_ready:
+            await asyncio.to_thread(self._ensure_image, language, image)
+        pool = container_pools.get_pool(self.client, language, image)
+
+        try:
+            pooled = await pool.checkout(settings.SANDBOX_POOL_CHECKOUT_TIMEOUT)
+        except TimeoutError as e:
+            return {
+                "stdout": "",
+                "stderr": f"Sandbox busy, please try again: {e}",
+                "exit_code": 1,
+                "execution_time": 0,
+                **usage_fields()
+            }
+
+        tainted = "error"
+        start_time = time.time()
+        try:
+            stdout, stderr, exit_code, tainted, usage = await asyncio.wait_for(
+                asyncio.to_thread(
+                    exec_in_container,
+                    pooled,
+                    [*self.INLINE_COMMANDS[language], code],
+                    timeout,
+                    max_output,
+                ),
+                # The in-container timeout fires first; this guards a hung Docker API
+                timeout + 10,
+            )
+        except asyncio.TimeoutError:
+            tainted = "host_timeout"
+            return {
+                "stdout": "",
+                "stderr": f"Execution timed out after {timeout} seconds",
+                "exit_code": 124,
+                "execution_time": timeout,
+                **usage_fields(limit_hit="time")
+            }
+        except Exception as e:
+            return {
+                "stdout": "",
+                "stderr": f"Execution error: {str(e)}",
+                "exit_code": 1,
+                "execution_time": 0,
+                **usage_fields()
+            }
+        finally:
+            await pool.checkin(pooled, tainted)
+
+        if exit_code == 124:
+            return {
+                "stdout": stdout.text(),
+                "stderr": f"Execution timed out after {timeout} seconds",
+                "exit_code": 124,
+                "execution_time": timeout,
+                "truncated_bytes": stdout.truncated_bytes + stderr.truncated_bytes,
+                **self._usage(usage, stdout, stderr, "time")
+            }
+
+        return self._result(
+            stdout, stderr, exit_code, time.time() - start_time, tainted == "output_limit", max_output, usage
+        )
+
+    def _result(
+        self,
+        stdout: BoundedOutputBuffer,
+        stderr: BoundedOutputBuffer,
+        exit_code: int,
+        execution_time: float,
+        exceeded: bool,
+        max_output: int,
+        usage: Dict[str, any]
+    ) -> Dict[str, any]:
+        """Build the result dict for a finished run"""
+        stderr_text = stderr.text()
+        limit_hit = classify_limit(
+            exit_code, stderr_text, output_exceeded=exceeded, oom_killed=usage["oom_killed"]
+        )
+        if exceeded:
+            exit_code = OUTPUT_LIMIT_EXIT_CODE
+            stderr_text += output_limit_message(max_output)
+        return {
+            "stdout": stdout.text(),
+            "stderr": stderr_text,
+            "exit_code": exit_code,
+            "execution_time": execution_time,
+            "truncated_bytes": stdout.truncated_bytes + stderr.truncated_bytes,
+            **self._usage(usage, stdout, stderr, limit_hit)
+        }
+
+    def _usage(
+        self,
+        usage: Dict[str, any],
+        stdout: BoundedOutputBuffer,
+        stderr: BoundedOutputBuffer,
+        limit_hit: Optional[str]
+    ) -> Dict[str, any]:
+        return usage_fields(
+            cpu_user=usage["cpu_user"],
+            cpu_sys=usage["cpu_sys"],
+            peak_rss_kb=usage["peak_rss_kb"],
+            bytes_written=stdout.total_bytes + stderr.total_bytes,
+            limit_hit=limit_hit,
+        )
+
+    async def fingerprint(self, language: str) -> str:
+        """
+        Identify what runs code for a language (sandbox image digest), so
+        cached results are not reused across image rebuilds
+        """
+        image = self.IMAGES[language]
+        if image not in self._image_ids:
+            self._image_ids[image] = await asyncio.to_thread(self._image_id, language, image)
+        return f"docker:{self._image_ids[image]}"
+
+    def _image_id(self, language: str, image: str) -> str:
+        self._ensure_image(language, image)
+        return self.client.images.get(image).id
+
+    def _ensure_image(self, language: str, image: str):
+        """Build the sandbox image if it does not exist (blocking)"""
+        if image in self._images_ready:
+            return
+        try:
+            self.client.images.get(image)
+        except docker.errors.ImageNotFound:
+            self._build_image(language, image)
+        self._images_ready.add(image)
 
     def _build_image(self, language: str, image_name: str):
         """Build sandbox Docker image"""
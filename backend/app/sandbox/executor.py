@@ -0,0 +1,183 @@
+"""
+Sandbox executor: the single entry point for running code
+
+Picks the sandbox backend (SANDBOX_BACKEND), serves repeated runs from the
+content-addressed result cache (see result_cache.py) and caps concurrent
+runs per language (SANDBOX_LANGUAGE_CONCURRENCY), so a burst of one
+language cannot take every sandbox slot.
+
+With SANDBOX_QUEUE_ENABLED, cache misses are sent to sandbox workers through
+the Redis job queue (see job_queue.py) instead of running in this process;
+workers call run_local.
+"""
+from typing import Any, Dict, Optional
+import asyncio
+import time
+
+from app.config import get_settings
+from app.db.redis import redis_client
+from app.sandbox.harness import HARNESS_VERSION
+from app.sandbox.job_queue import get_job_queue
+from app.sandbox.result_cache import (
+    ExecutionResultCache,
+    cache_key,
+    get_result_cache,
+    is_cacheable_result,
+    is_deterministic,
+)
+from app.utils.metrics import metrics
+
+settings = get_settings()
+
+# Concurrent runs for languages missing from SANDBOX_LANGUAGE_CONCURRENCY
+DEFAULT_LANGUAGE_CONCURRENCY = 4
+
+SLOT_WAIT_SECONDS = metrics.histogram(
+    "sandbox_slot_wait_seconds",
+    "Time a run waited for a per-language sandbox slot",
+    ("language",),
+)
+RUNS_IN_FLIGHT = metrics.gauge(
+    "sandbox_runs_in_flight",
+    "Sandbox runs executing, by language",
+    ("language",),
+)
+
+
+class SandboxExecutor:
+    """Runs code in the configured sandbox, with result caching"""
+
+    def __init__(self, backend: str, language_concurrency: Dict[str, int]):
+        """
+        Args:
+            backend: "subprocess" or "docker"
+            language_concurrency: Maximum concurrent runs per language
+        """
+        self.backend_name = backend
+        self.language_concurrency = language_concurrency
+        self._backend = None
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def backend(self):
+        """The sandbox backend, created on first use"""
+        if self._backend is None:
+            if self.backend_name == "docker":
+                from app.sandbox.docker_runner import sandbox
+            else:
+                from app.sandbox.subprocess_runner import sandbox
+            self._backend = sandbox
+        return self._backend
+
+    async def execute(
+        self,
+        code: str,
+        language: str,
+        timeout: int = None,
+        max_output: int = None,
+        cacheable: Optional[bool] = None,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute code, reusing a cached result for an identical earlier run
+
+        Args:
+            code: Program to run
+            language: Language (python, bash, javascript)
+            timeout: Execution timeout in seconds
+            max_output: Output size limit per stream
+            cacheable: Whether the run may be served from or stored in the
+                cache; by default, whether the code looks deterministic
+            user_id: User the run is for (per-user limit in queue mode)
+
+        Returns:
+            Dict with stdout, stderr, exit_code, execution_time, truncated_bytes
+            and resource usage (see accounting.py)
+
+        Raises:
+            SandboxBusyError: Queue mode only, the job queue refused the run
+        """
+        timeout = timeout or settings.SANDBOX_TIMEOUT
+        max_output = max_output or settings.MAX_OUTPUT_SIZE
+        if cacheable is None:
+            cacheable = is_deterministic(code, language)
+
+        cache = get_result_cache(redis_client.client)
+        if cache is None:
+            return await self._run(code, language, timeout, max_output, user_id)
+        if not cacheable:
+            ExecutionResultCache.bypass(language)
+            return await self._run(code, language, timeout, max_output, user_id)
+
+        try:
+            key = await self._cache_key(code, language, timeout, max_output)
+        except Exception as e:
+            print(f"⚠️ Sandbox result cache skipped, no fingerprint for {language}: {e}")
+            ExecutionResultCache.bypass(language)
+            return await self._run(code, language, timeout, max_output, user_id)
+
+        cached = await cache.get(key, language)
+        if cached is not None:
+            return cached
+
+        result = await self._run(code, language, timeout, max_output, user_id)
+        if is_cacheable_result(result):
+            await cache.set(key, result)
+        return result
+
+    async def _run(
+        self, code: str, language: str, timeout: int, max_output: int, user_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """Run through the job queue when enabled, otherwise in this process"""
+        queue = get_job_queue(redis_client.client)
+        if queue is not None:
+            return await queue.submit(code, language, timeout, max_output, user_id)
+        return await self.run_local(code, language, timeout, max_output)
+
+    async def run_local(self, code: str, language: str, timeout: int, max_output: int) -> Dict[str, Any]:
+        """Run on this process's backend once a slot for the language is free"""
+        slot = self._slots.get(language)
+        if slot is None:
+            limit = self.language_concurrency.get(language, DEFAULT_LANGUAGE_CONCURRENCY)
+            slot = self._slots[language] = asyncio.Semaphore(limit)
+
+        started = time.monotonic()
+        async with slot:
+            SLOT_WAIT_SECONDS.observe(time.monotonic() - started, language=language)
+            RUNS_IN_FLIGHT.inc(language=language)
+            try:
+                return await self.backend.execute_code_async(code, language, timeout, max_output)
+            finally:
+                RUNS_IN_FLIGHT.dec(language=language)
+
+    async def fingerprint(self, language: str) -> str:
+        """
+        Fingerprint of the sandbox that will run the code
+
+        In queue mode that is the workers' sandbox, as published by them.
+        """
+        queue = get_job_queue(redis_client.client)
+        if queue is None:
+            return await self.backend.fingerprint(language)
+        fingerprint = await queue.worker_fingerprint(language)
+        if fingerprint is None:
+            raise RuntimeError("no sandbox worker has published a fingerprint")
+        return fingerprint
+
+    async def _cache_key(self, code: str, language: str, timeout: int, max_output: int) -> str:
+        return cache_key(
+            language,
+            code,
+            harness_version=HARNESS_VERSION,
+            sandbox=await self.fingerprint(language),
+            limits={
+                "timeout": timeout,
+                "max_output": max_output,
+                "memory": settings.SANDBOX_MEMORY_LIMIT,
+                "cpu": settings.SANDBOX_CPU_LIMIT,
+            },
+        )
+
+
+# Singleton instance
+executor = SandboxExecutor(settings.SANDBOX_BACKEND, settings.SANDBOX_LANGUAGE_CONCURRENCY)
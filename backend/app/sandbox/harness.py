@@ -0,0 +1,355 @@
+"""
+Test harness: run every test case of an exercise in one sandbox invocation
+
+The harness is a single program sent to the sandbox. For each test case it
+runs the submission followed by the test's validation_script in its own
+child process, with its own timeout and captured stdout/stderr, and prints
+one frame line per test:
+
+    @@TEST@@ <b64 test_id> <exit_code> <timed_out 0|1> <b64 stdout> <b64 stderr> <ms>
+             <cpu_user_ms> <cpu_sys_ms> <peak_rss_kb> <output_exceeded 0|1>
+
+CPU time and peak RSS come from wait4 in the Python harness; the Bash
+harness reports 0 for both.
+
+Tests are isolated from each other: a crash, os._exit or infinite loop in
+one test only fails that test. Anything the harness itself prints outside
+of frames is ignored by the parser.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import base64
+import json
+import signal
+
+from app.config import get_settings
+from app.sandbox.accounting import classify_limit
+
+settings = get_settings()
+
+FRAME_MARKER = "@@TEST@@"
+
+# Bumped whenever the harness programs change (part of result cache keys)
+HARNESS_VERSION = 3
+
+_PYTHON_HARNESS = r'''
+import base64, json, os, selectors, signal, sys, time
+
+PAYLOAD = json.loads(base64.b64decode(%(payload)r))
+MARKER = %(marker)r
+
+
+def b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def run_in_child(test, out_w, err_w, in_r):
+    os.setpgid(0, 0)
+    os.dup2(in_r, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+
+    import linecache, traceback, types
+    main = types.ModuleType("__main__")
+    main.__builtins__ = __builtins__
+    sys.modules["__main__"] = main
+    code = 0
+    try:
+        for filename, source in (("main.py", PAYLOAD["code"]), ("test.py", test["script"])):
+            linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+            exec(compile(source, filename, "exec"), main.__dict__)
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(code)
+
+
+def run_test(test):
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    in_r, in_w = os.pipe()
+    started = time.monotonic()
+
+    pid = os.fork()
+    if pid == 0:
+        for fd in (out_r, err_r, in_w):
+            os.close(fd)
+        run_in_child(test, out_w, err_w, in_r)
+
+    for fd in (out_w, err_w, in_r):
+        os.close(fd)
+    try:
+        os.write(in_w, test["stdin"].encode("utf-8"))
+    except OSError:
+        pass
+    os.close(in_w)
+
+    cap = PAYLOAD["max_output"]
+    buffers = {out_r: bytearray(), err_r: bytearray()}
+    selector = selectors.DefaultSelector()
+    for fd in buffers:
+        selector.register(fd, selectors.EVENT_READ)
+
+    deadline = started + test["timeout"]
+    timed_out = False
+    overflowed = False
+    while selector.get_map():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            if not timed_out:
+                timed_out = True
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                deadline = time.monotonic() + 0.5
+                continue
+            break
+        for key, _ in selector.select(timeout=remaining):
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                selector.unregister(key.fd)
+                continue
+            buffer = buffers[key.fd]
+            if len(buffer) < cap:
+                buffer.extend(chunk[:cap - len(buffer)])
+            elif not overflowed:
+                # Output limit hit: stop the test instead of draining it
+                overflowed = True
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+    selector.close()
+
+    # Reap and clean up anything the test left running
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    _, status, usage = os.wait4(pid, 0)
+    os.close(out_r)
+    os.close(err_r)
+
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code < 0:
+        exit_code = 128 - exit_code
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    line = " ".join([
+        MARKER, b64(test["id"].encode("utf-8")), str(exit_code), "1" if timed_out else "0",
+        b64(bytes(buffers[out_r])), b64(bytes(buffers[err_r])), str(elapsed_ms),
+        str(int(usage.ru_utime * 1000)), str(int(usage.ru_stime * 1000)), str(usage.ru_maxrss),
+        "1" if overflowed else "0",
+    ])
+    os.write(1, (line + "\n").encode("ascii"))
+
+
+for test in PAYLOAD["tests"]:
+    run_test(test)
+'''
+
+_BASH_HARNESS_HEADER = r'''
+__harness_dir=$(mktemp -d)
+trap 'rm -rf "$__harness_dir"' EXIT
+__harness_run() {
+    local id_b64="$1" timeout="$2" script_b64="$3" stdin_b64="$4"
+    local script="$__harness_dir/test.sh" input="$__harness_dir/in" out="$__harness_dir/out" err="$__harness_dir/err"
+    printf '%%s' "$script_b64" | base64 -d > "$script"
+    printf '%%s' "$stdin_b64" | base64 -d > "$input"
+    local start=$(date +%%s%%N)
+    # head stops reading at the output limit, so a runaway writer dies of SIGPIPE
+    timeout -k 1 "$timeout" bash "$script" < "$input" 2> >(head -c %(max_output)d > "$err") | head -c %(max_output)d > "$out"
+    local code=${PIPESTATUS[0]}
+    wait $!
+    local end=$(date +%%s%%N)
+    local elapsed_ms=$(( (end - start) / 1000000 ))
+    local timed_out=0
+    [ "$code" -eq 124 ] && timed_out=1
+    # timeout -k escalated to SIGKILL
+    [ "$code" -eq 137 ] && [ "$elapsed_ms" -ge $(( timeout * 1000 )) ] && timed_out=1
+    local exceeded=0
+    [ "$(wc -c < "$out")" -ge %(max_output)d ] || [ "$(wc -c < "$err")" -ge %(max_output)d ] && exceeded=1
+    echo "%(marker)s $id_b64 $code $timed_out $(base64 -w0 < "$out") $(base64 -w0 < "$err") $elapsed_ms 0 0 0 $exceeded"
+}
+'''
+
+
+@dataclass
+class Harness:
+    """A harness program and the limits to run it with"""
+    code: str
+    timeout: int
+    max_output: int
+    test_ids: List[str]
+
+
+@dataclass
+class TestFrame:
+    """One test's result as reported by the harness"""
+    test_id: str
+    exit_code: int
+    timed_out: bool
+    stdout: str
+    stderr: str
+    execution_time: float
+    cpu_user: float = 0.0
+    cpu_sys: float = 0.0
+    peak_rss_kb: int = 0
+    output_exceeded: bool = False
+
+
+SUPPORTED_LANGUAGES = {"python", "bash"}
+
+
+def _b64(text: str) -> str:
+    return base64.b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def test_ids(test_cases: List[Any]) -> List[str]:
+    """
+    Unique IDs for test cases, as used in harness frames and test results
+
+    Missing or empty IDs become test_<index>; repeated IDs get the index
+    appended, so every test has a frame of its own.
+    """
+    ids = []
+    seen = set()
+    for index, test_case in enumerate(test_cases):
+        if isinstance(test_case, dict):
+            test_id = test_case.get("test_id")
+        else:
+            test_id = test_case.test_id
+        test_id = str(test_id) if test_id else f"test_{index}"
+        if test_id in seen:
+            test_id = f"{test_id}_{index}"
+        while test_id in seen:
+            test_id += "_"
+        seen.add(test_id)
+        ids.append(test_id)
+    return ids
+
+
+def _test_field(test_case: Any, name: str, default=None):
+    if isinstance(test_case, dict):
+        return test_case.get(name, default)
+    return getattr(test_case, name, default)
+
+
+def build_harness(
+    code: str,
+    test_cases: List[Any],
+    language: str,
+    test_timeout: Optional[int] = None,
+) -> Harness:
+    """
+    Build the harness program for a submission
+
+    Args:
+        code: Submitted code
+        test_cases: Exercise test cases (dicts or TestCase objects)
+        language: python or bash
+        test_timeout: Per-test timeout in seconds (SANDBOX_TEST_TIMEOUT by default)
+
+    Returns:
+        Harness with the program and the overall sandbox timeout
+    """
+    if language not in SUPPORTED_LANGUAGES:
+        raise ValueError(f"No test harness for language: {language}")
+
+    test_timeout = test_timeout or settings.SANDBOX_TEST_TIMEOUT
+    tests = []
+    for test_id, test_case in zip(test_ids(test_cases), test_cases):
+        test_input = _test_field(test_case, "input") or {}
+        tests.append({
+            "id": test_id,
+            "script": _test_field(test_case, "validation_script") or "",
+            "stdin": str(test_input.get("stdin", "")) if isinstance(test_input, dict) else "",
+            "timeout": test_timeout,
+        })
+
+    if language == "python":
+        payload = json.dumps({
+            "code": code,
+            "tests": tests,
+            "max_output": settings.MAX_OUTPUT_SIZE,
+        })
+        program = _PYTHON_HARNESS % {
+            "payload": base64.b64encode(payload.encode("utf-8")).decode("ascii"),
+            "marker": FRAME_MARKER,
+        }
+    else:
+        lines = [_BASH_HARNESS_HEADER % {"marker": FRAME_MARKER, "max_output": settings.MAX_OUTPUT_SIZE}]
+        for test in tests:
+            lines.append(
+                f"__harness_run {_b64(test['id'])} {test['timeout']} "
+                f"{_b64(code + chr(10) + test['script'])} '{_b64(test['stdin'])}'"
+            )
+        program = "\n".join(lines) + "\n"
+
+    # Every test may use its full timeout, plus interpreter startup
+    overall = min(settings.SANDBOX_TIMEOUT, test_timeout * max(len(tests), 1) + 5)
+    # Room for every frame: two base64-encoded streams of up to MAX_OUTPUT_SIZE each
+    max_output = len(tests) * (settings.MAX_OUTPUT_SIZE * 8 // 3 + 256)
+    return Harness(
+        code=program,
+        timeout=overall,
+        max_output=max_output,
+        test_ids=[test["id"] for test in tests],
+    )
+
+
+def frame_limit(frame: TestFrame) -> Optional[str]:
+    """Which sandbox limit, if any, ended a test ("time", "memory", "output", "file_size")"""
+    return classify_limit(
+        frame.exit_code,
+        frame.stderr,
+        timed_out=frame.timed_out,
+        output_exceeded=frame.output_exceeded,
+        # SIGKILL the harness did not send: the OOM killer
+        oom_killed=frame.exit_code == 128 + signal.SIGKILL,
+    )
+
+
+def parse_frames(stdout: str) -> Dict[str, TestFrame]:
+    """
+    Parse the harness output into per-test frames
+
+    Lines that are not well-formed frames are ignored.
+    """
+    frames = {}
+    for line in stdout.splitlines():
+        if not line.startswith(FRAME_MARKER + " "):
+            continue
+        parts = line.split(" ")
+        if len(parts) != 11:
+            continue
+        try:
+            frame = TestFrame(
+                test_id=base64.b64decode(parts[1]).decode("utf-8"),
+                exit_code=int(parts[2]),
+                timed_out=parts[3] == "1",
+                stdout=base64.b64decode(parts[4]).decode("utf-8", errors="replace"),
+                stderr=base64.b64decode(parts[5]).decode("utf-8", errors="replace"),
+                execution_time=int(parts[6]) / 1000,
+                cpu_user=int(parts[7]) / 1000,
+                cpu_sys=int(parts[8]) / 1000,
+                peak_rss_kb=int(parts[9]),
+                output_exceeded=parts[10] == "1",
+            )
+        except ValueError:
+            continue
+        frames[frame.test_id] = frame
+    return frames
@@ -0,0 +1,172 @@
+"""
+Sandbox job queue on Redis Streams
+
+With SANDBOX_QUEUE_ENABLED, the API does not run sandbox code itself: it
+appends a job to the `sandbox:jobs` stream and waits for the result, while
+sandbox workers (`python -m app.sandbox.worker`, see worker.py) consume the
+stream through a consumer group. A burst of submissions then queues up on
+the workers instead of eating the API's CPU.
+
+    API                                   worker
+    XADD sandbox:jobs {job}      ──▶      XREADGROUP (consumer group)
+    BLPOP sandbox:job:result:ID  ◀──      run, LPUSH result, XACK + XDEL
+
+Backpressure:
+    - the stream holds at most SANDBOX_QUEUE_MAX_DEPTH unfinished jobs
+      (checked and appended atomically)
+    - a user has at most SANDBOX_QUEUE_USER_LIMIT jobs in flight
+Both raise SandboxBusyError, which the API turns into 429 + Retry-After.
+
+Each job carries a deadline; workers drop jobs whose requester has already
+given up.
+"""
+from typing import Any, Dict, Optional
+import json
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+from app.config import get_settings
+from app.utils.metrics import metrics
+
+settings = get_settings()
+
+STREAM_KEY = "sandbox:jobs"
+GROUP_NAME = "sandbox-workers"
+RESULT_KEY_PREFIX = "sandbox:job:result:"
+INFLIGHT_KEY_PREFIX = "sandbox:inflight:"
+FINGERPRINTS_KEY = "sandbox:worker:fingerprints"
+
+# Seconds a worker's result waits for a requester that went away
+RESULT_TTL = 60
+
+# Extra seconds the API waits beyond the run's own timeout (queueing, startup)
+RESULT_GRACE = 30
+
+# Append a job unless the stream is full; returns the depth seen before appending
+_ENQUEUE_SCRIPT = """
+local depth = redis.call("XLEN", KEYS[1])
+if depth < tonumber(ARGV[1]) then
+    redis.call("XADD", KEYS[1], "*", "job", ARGV[2])
+end
+return depth
+"""
+
+QUEUE_REJECTED = metrics.counter(
+    "sandbox_queue_rejected_total",
+    "Sandbox jobs refused by backpressure, by reason",
+    ("reason",),
+)
+QUEUE_ROUNDTRIP_SECONDS = metrics.histogram(
+    "sandbox_queue_roundtrip_seconds",
+    "Time from enqueueing a sandbox job to receiving its result",
+    ("language",),
+)
+QUEUE_DEPTH = metrics.gauge(
+    "sandbox_queue_depth",
+    "Unfinished jobs in the sandbox stream, as last seen by this process",
+)
+
+
+class SandboxBusyError(Exception):
+    """The sandbox queue refused a job; retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SandboxJobQueue:
+    """Producer side of the sandbox job stream"""
+
+    def __init__(self, redis: Redis, max_depth: int, per_user_limit: int, retry_after: int):
+        """
+        Args:
+            redis: Redis client
+            max_depth: Unfinished jobs allowed in the stream
+            per_user_limit: Jobs a single user may have in flight
+            retry_after: Retry-After seconds suggested when the queue is full
+        """
+        self.redis = redis
+        self.max_depth = max_depth
+        self.per_user_limit = per_user_limit
+        self.retry_after = retry_after
+
+    async def submit(
+        self,
+        code: str,
+        language: str,
+        timeout: int,
+        max_output: int,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Enqueue a run and wait for a worker's result
+
+        Raises:
+            SandboxBusyError: The queue is full or the user has too many runs in flight
+
+        Returns:
+            Dict with stdout, stderr, exit_code, execution_time, truncated_bytes
+            and resource usage (see accounting.py)
+        """
+        inflight_key = f"{INFLIGHT_KEY_PREFIX}{user_id}" if user_id else None
+        if inflight_key:
+            count = await self.redis.incr(inflight_key)
+            # Self-heal counters of crashed API processes
+            await self.redis.expire(inflight_key, timeout + RESULT_GRACE)
+            if count > self.per_user_limit:
+                await self.redis.decr(inflight_key)
+                QUEUE_REJECTED.inc(reason="user_limit")
+                raise SandboxBusyError("Too many code runs in progress, please wait", retry_after=1)
+
+        try:
+            job_id = uuid.uuid4().hex
+            result_key = f"{RESULT_KEY_PREFIX}{job_id}"
+            wait = timeout + RESULT_GRACE
+            started = time.monotonic()
+            job = json.dumps({
+                "id": job_id,
+                "code": code,
+                "language": language,
+                "timeout": timeout,
+                "max_output": max_output,
+                "result_key": result_key,
+                "deadline": time.time() + wait,
+            })
+            depth = await self.redis.eval(_ENQUEUE_SCRIPT, 1, STREAM_KEY, self.max_depth, job)
+            QUEUE_DEPTH.set(depth)
+            if depth >= self.max_depth:
+                QUEUE_REJECTED.inc(reason="queue_full")
+                raise SandboxBusyError("Code runner is busy, please try again", retry_after=self.retry_after)
+
+            reply = await self.redis.blpop([result_key], timeout=wait)
+            if reply is None:
+                return {
+                    "stdout": "",
+                    "stderr": "Code runner did not respond in time, please try again",
+                    "exit_code": 1,
+                    "execution_time": 0
+                }
+            QUEUE_ROUNDTRIP_SECONDS.observe(time.monotonic() - started, language=language)
+            return json.loads(reply[1])
+        finally:
+            if inflight_key:
+                await self.redis.decr(inflight_key)
+
+    async def worker_fingerprint(self, language: str) -> Optional[str]:
+        """Sandbox fingerprint published by the workers for a language"""
+        return await self.redis.hget(FINGERPRINTS_KEY, language)
+
+
+def get_job_queue(redis: Optional[Redis]) -> Optional[SandboxJobQueue]:
+    """Job queue on the given Redis client, or None when runs happen in-process"""
+    if redis is None or not settings.SANDBOX_QUEUE_ENABLED:
+        return None
+    return SandboxJobQueue(
+        redis,
+        max_depth=settings.SANDBOX_QUEUE_MAX_DEPTH,
+        per_user_limit=settings.SANDBOX_QUEUE_USER_LIMIT,
+        retry_after=settings.SANDBOX_QUEUE_RETRY_AFTER,
+    )
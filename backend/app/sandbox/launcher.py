@@ -0,0 +1,94 @@
+"""
+Launcher for subprocess sandbox runs
+
+    python -I -S launcher.py REPORT_PATH LIMITS_JSON -- COMMAND [ARGS...]
+
+Forks COMMAND with rlimits applied, reaps it with wait4 and writes
+{"status": <wait status>, "rusage": {...}} to REPORT_PATH.
+
+Runs are started from this small process rather than directly from the API
+process because a process's peak RSS (ru_maxrss) starts at the high-water
+mark of the memory it was forked from: a direct child of the API would
+report the API's own footprint.
+
+On SIGTERM the launcher SIGKILLs the command and still writes its report,
+so runs stopped for a limit keep their CPU time. Once the command has been
+reaped, anything it left running, including processes that escaped its
+session, is killed (see reaper.py).
+
+Standard library only.
+"""
+import importlib.util
+import json
+import os
+import resource
+import signal
+import sys
+
+LIMITS = {
+    "cpu": resource.RLIMIT_CPU,
+    "fsize": resource.RLIMIT_FSIZE,
+    "as": resource.RLIMIT_AS,
+}
+
+
+def _load_reaper():
+    """Load reaper.py by path (the launcher runs with -I, without app on sys.path)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reaper.py")
+    spec = importlib.util.spec_from_file_location("sandbox_reaper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+reaper = _load_reaper()
+
+
+def run_command(command, limits):
+    """Child: apply limits (soft = hard) and exec the command"""
+    try:
+        # Python ignores these at startup and ignored signals survive exec
+        for sig in (signal.SIGPIPE, signal.SIGXFSZ):
+            signal.signal(sig, signal.SIG_DFL)
+        for name, value in limits.items():
+            resource.setrlimit(LIMITS[name], (value, value))
+        os.execvp(command[0], command)
+    except OSError as e:
+        os.write(2, f"{command[0]}: {e.strerror}\n".encode("utf-8", errors="replace"))
+    os._exit(127)
+
+
+def main(argv):
+    report_path, limits, command = argv[1], json.loads(argv[2]), argv[4:]
+
+    reaper.become_subreaper()
+    pid = os.fork()
+    if pid == 0:
+        run_command(command, limits)
+
+    def stop(signum, frame):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    signal.signal(signal.SIGTERM, stop)
+    _, status, usage = os.wait4(pid, 0)
+
+    with open(report_path, "w") as f:
+        json.dump({
+            "status": status,
+            "rusage": {
+                "cpu_user": usage.ru_utime,
+                "cpu_sys": usage.ru_stime,
+                "max_rss_kb": usage.ru_maxrss,
+            },
+        }, f)
+
+    # After the report, which must not wait on stragglers
+    reaper.kill_descendants()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
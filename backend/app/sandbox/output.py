@@ -0,0 +1,106 @@
+"""
+Bounded output capture for sandbox runs
+
+Output is read incrementally into a fixed-size head + tail buffer instead of
+being collected whole and truncated afterwards, so a runaway
+`while True: print(...)` costs at most `limit` bytes of memory. Callers kill
+the process once a buffer reports that the limit was exceeded.
+
+Standard library only: the zygote server (which cannot import app modules)
+loads this file directly.
+"""
+
+# Read size for pipes and Docker streams
+CHUNK_SIZE = 65536
+
+# Share of the limit kept from the end of the output
+TAIL_FRACTION = 0.25
+
+# Exit code reported when a run is killed for exceeding the output limit (128 + SIGKILL)
+OUTPUT_LIMIT_EXIT_CODE = 137
+
+
+class BoundedOutputBuffer:
+    """Keeps the first and last bytes of a stream, counting what is dropped"""
+
+    def __init__(self, limit: int):
+        """
+        Args:
+            limit: Maximum bytes kept (head + tail)
+        """
+        self.limit = max(int(limit), 0)
+        self.tail_limit = int(self.limit * TAIL_FRACTION)
+        self.head_limit = self.limit - self.tail_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+
+    @property
+    def exceeded(self) -> bool:
+        """Whether more than `limit` bytes were written"""
+        return self.total_bytes > self.limit
+
+    @property
+    def truncated_bytes(self) -> int:
+        """Bytes written but not kept"""
+        return self.total_bytes - len(self.head) - len(self.tail)
+
+    def write(self, chunk: bytes) -> bool:
+        """
+        Add a chunk of output
+
+        Returns:
+            False once the limit has been exceeded
+        """
+        self.total_bytes += len(chunk)
+
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head.extend(chunk[:room])
+            chunk = chunk[room:]
+
+        if chunk and self.tail_limit:
+            self.tail.extend(chunk[-self.tail_limit:])
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+        return not self.exceeded
+
+    def getvalue(self) -> bytes:
+        """Kept output, with a marker where bytes were dropped"""
+        if not self.truncated_bytes:
+            return bytes(self.head + self.tail)
+        marker = f"\n... ({self.truncated_bytes} bytes truncated) ...\n".encode("ascii")
+        return bytes(self.head) + marker + bytes(self.tail)
+
+    def text(self) -> str:
+        """Kept output decoded as UTF-8"""
+        return self.getvalue().decode("utf-8", errors="replace")
+
+
+def output_limit_message(limit: int) -> str:
+    return f"\nOutput limit exceeded ({limit} bytes), execution stopped"
+
+
+def read_demuxed(chunks, stdout: BoundedOutputBuffer, stderr: BoundedOutputBuffer, on_exceeded) -> bool:
+    """
+    Feed a demultiplexed Docker stream into output buffers
+
+    Args:
+        chunks: Iterable of (stdout_bytes, stderr_bytes) pairs, either may be None
+            (Docker attach/exec_start with stream=True, demux=True)
+        stdout: Buffer for stdout
+        stderr: Buffer for stderr
+        on_exceeded: Called once when either buffer exceeds its limit; it
+            should stop the process so the stream ends
+
+    Returns:
+        Whether the output limit was exceeded
+    """
+    exceeded = False
+    for out_chunk, err_chunk in chunks:
+        for chunk, buffer in ((out_chunk, stdout), (err_chunk, stderr)):
+            if chunk and not buffer.write(chunk) and not exceeded:
+                exceeded = True
+                on_exceeded()
+    return exceeded
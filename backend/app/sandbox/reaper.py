@@ -0,0 +1,66 @@
+"""
+Cleanup of processes a sandbox run leaves behind
+
+Killing a run's process group misses anything that left it with setsid()
+(start_new_session=True in Python), and such a process keeps the run's
+output pipes open. The process that starts a run (launcher.py, the
+zygote's monitor) therefore makes itself a child subreaper: orphans below
+it are reparented to it instead of to init, so once the run is over it can
+find, kill and reap every one of them.
+
+Standard library only: loaded by path from launcher.py and zygote_server.py.
+"""
+import ctypes
+import os
+import signal
+
+# From <linux/prctl.h>
+PR_SET_CHILD_SUBREAPER = 36
+
+
+def become_subreaper() -> bool:
+    """Adopt this process's orphaned descendants (Linux only)"""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def children(pid: int) -> list:
+    """Pids whose parent is `pid`, zombies included"""
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # state and ppid follow the command name, which may contain anything
+        fields = stat[stat.rindex(b")") + 2:].split()
+        if int(fields[1]) == pid:
+            found.append(int(entry))
+    return found
+
+
+def kill_descendants():
+    """
+    SIGKILL and reap every remaining descendant of this process
+
+    Reap the run's own command first (its wait status and rusage would be
+    lost here). Each pass kills the current children and reaps one; the
+    orphans of a killed child are reparented here and killed on the next.
+    """
+    me = os.getpid()
+    while True:
+        for pid in children(me):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        try:
+            os.waitpid(-1, 0)
+        except ChildProcessError:
+            return
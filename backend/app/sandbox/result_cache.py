@@ -0,0 +1,175 @@
+"""
+Content-addressed cache of sandbox execution results
+
+Learners resubmit identical code (undo/redo, re-clicking Submit) and the
+tutor's execute_code tool re-runs the same demo snippets across users. A run
+is keyed by the hash of everything that determines its result: language,
+code, harness version, sandbox fingerprint (interpreter version or image
+digest) and limits. Entries live in Redis with a TTL; a sorted-set index of
+insertion times keeps the number of entries bounded.
+
+Only runs that look deterministic are cached (see is_deterministic), and only
+results that reflect the code rather than the sandbox's state: timeouts
+(including a single test's timeout inside the test harness) and
+infrastructure errors are never stored.
+"""
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import re
+import time
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.config import get_settings
+from app.sandbox.harness import FRAME_MARKER, parse_frames
+from app.utils.metrics import metrics
+
+settings = get_settings()
+
+KEY_PREFIX = "sandbox:result:"
+INDEX_KEY = "sandbox:result:index"
+
+# Code that reads clocks, randomness, the environment or the network can give
+# a different result on every run
+_NONDETERMINISTIC = {
+    "python": re.compile(
+        r"\b(random|secrets|uuid|time|datetime|os\.urandom|os\.getpid|os\.environ|"
+        r"socket|urllib|requests|http|threading|multiprocessing|asyncio|subprocess|"
+        r"id|hash)\b"
+    ),
+    "bash": re.compile(
+        r"\$RANDOM|\$SRANDOM|\$\$|\$BASHPID|\$SECONDS|\$EPOCH|/dev/u?random|"
+        r"\b(date|shuf|mktemp|uuidgen|sleep|curl|wget|ps|hostname|whoami|env|read)\b"
+    ),
+    "javascript": re.compile(
+        r"\b(Math\.random|Date|crypto|process\.env|process\.pid|performance|"
+        r"setTimeout|setInterval|fetch|require)\b"
+    ),
+}
+
+CACHE_LOOKUPS = metrics.counter(
+    "sandbox_result_cache_total",
+    "Sandbox result cache lookups by outcome (hit, miss, bypass)",
+    ("language", "outcome"),
+)
+
+
+def is_deterministic(code: str, language: str) -> bool:
+    """
+    Heuristic: whether code's output depends only on the code itself
+
+    Conservative by design; a false "no" only costs a sandbox run.
+    """
+    pattern = _NONDETERMINISTIC.get(language)
+    return pattern is not None and not pattern.search(code)
+
+
+def is_cacheable_result(result: Dict[str, Any]) -> bool:
+    """
+    Timeouts and infrastructure errors (reported with no execution time) are not cached
+
+    That includes test harness runs in which any single test timed out: the
+    harness itself exits normally, but the timeout may be down to host load.
+    """
+    if result.get("exit_code") == 124 or result.get("execution_time", 0) <= 0:
+        return False
+    stdout = result.get("stdout") or ""
+    if FRAME_MARKER in stdout and any(frame.timed_out for frame in parse_frames(stdout).values()):
+        return False
+    return True
+
+
+def cache_key(language: str, code: str, **context: Any) -> str:
+    """
+    Build the cache key for a run
+
+    Args:
+        language: Programming language
+        code: Exact program sent to the sandbox
+        **context: Everything else that determines the result (harness
+            version, sandbox fingerprint, limits)
+
+    Returns:
+        Redis key
+    """
+    material = json.dumps(
+        {"language": language, "code": code, **context},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return KEY_PREFIX + hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ExecutionResultCache:
+    """Redis-backed result cache with TTL and entry-count bounds"""
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: int,
+        max_entries: int,
+        max_entry_bytes: int,
+    ):
+        """
+        Args:
+            redis: Redis client
+            ttl: Seconds an entry is kept
+            max_entries: Entries kept before the oldest are evicted
+            max_entry_bytes: Larger results are not stored
+        """
+        self.redis = redis
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+
+    async def get(self, key: str, language: str) -> Optional[Dict[str, Any]]:
+        """Get a cached result, or None on a miss"""
+        try:
+            cached = await self.redis.get(key)
+        except RedisError as e:
+            print(f"⚠️ Sandbox result cache unavailable: {e}")
+            cached = None
+
+        CACHE_LOOKUPS.inc(language=language, outcome="hit" if cached is not None else "miss")
+        return json.loads(cached) if cached is not None else None
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        """Store a result, evicting the oldest entries beyond max_entries"""
+        value = json.dumps(result)
+        if len(value) > self.max_entry_bytes:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=self.ttl)
+                pipe.zadd(INDEX_KEY, {key: time.time()})
+                # Entries that expired on their own
+                pipe.zremrangebyscore(INDEX_KEY, 0, time.time() - self.ttl)
+                pipe.zcard(INDEX_KEY)
+                *_, size = await pipe.execute()
+
+            if size > self.max_entries:
+                evicted = await self.redis.zpopmin(INDEX_KEY, size - self.max_entries)
+                if evicted:
+                    await self.redis.delete(*(member for member, _ in evicted))
+        except RedisError as e:
+            print(f"⚠️ Failed to cache sandbox result: {e}")
+
+    @staticmethod
+    def bypass(language: str):
+        """Record a run that was not eligible for caching"""
+        CACHE_LOOKUPS.inc(language=language, outcome="bypass")
+
+
+def get_result_cache(redis: Optional[Redis]) -> Optional[ExecutionResultCache]:
+    """Result cache on the given Redis client, or None when caching is off"""
+    if redis is None or not settings.SANDBOX_CACHE_ENABLED:
+        return None
+    return ExecutionResultCache(
+        redis,
+        ttl=settings.SANDBOX_CACHE_TTL,
+        max_entries=settings.SANDBOX_CACHE_MAX_ENTRIES,
+        max_entry_bytes=settings.SANDBOX_CACHE_MAX_ENTRY_BYTES,
+    )
@@ -2,23 +2,61 @@
 Subprocess-based sandbox for secure code execution
 A lightweight alternative to Docker sandbox for development/testing
 """
+import asyncio
+import json
 import subprocess
+import sys
 import tempfile
 import os
 import time
 import signal
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from app.config import get_settings
+from app.sandbox.accounting import classify_limit, usage_fields
+from app.sandbox.output import (
+    CHUNK_SIZE,
+    OUTPUT_LIMIT_EXIT_CODE,
+    BoundedOutputBuffer,
+    output_limit_message,
+)
+from app.sandbox.zygote import FILE_SIZE_LIMIT, parse_memory_limit, zygote
 
 settings = get_settings()
 
+# Starts each run and reports its rusage (see launcher.py)
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+
+# Seconds the launcher gets to stop a run and report before everything is SIGKILLed
+STOP_GRACE = 1
+
 
 class SubprocessSandbox:
     """Manages subprocess-based code execution with security limits"""
 
+    # Interpreter command and file suffix per language
+    COMMANDS = {
+        "python": (["python3"], ".py"),
+        "bash": (["bash"], ".sh"),
+        "javascript": (["node"], ".js"),
+    }
+
     def __init__(self):
+        self._versions: Dict[str, str] = {}
         print("✅ Subprocess sandbox initialized")
 
+    async def fingerprint(self, language: str) -> str:
+        """
+        Identify what runs code for a language (interpreter version), so cached
+        results are not reused across interpreter upgrades
+        """
+        if language not in self._versions:
+            command, _ = self.COMMANDS[language]
+            result = await self._run_process([*command, "--version"], 5)
+            version = (result["stdout"] or result["stderr"]).strip().splitlines()
+            self._versions[language] = version[0] if version else "unknown"
+        zygote_mode = language == "python" and settings.SANDBOX_ZYGOTE_ENABLED
+        return f"subprocess:{self._versions[language]}{':zygote' if zygote_mode else ''}"
+
     def execute_code(
         self,
         code: str,
@@ -26,23 +64,51 @@ class SubprocessSandbox:
         timeout: int = None
     ) -> Dict[str, any]:
         """
-        Execute code in subprocess with security limits
+        Execute code in subprocess with security limits (blocking)
+
+        Sync shim around execute_code_async for callers without an event
+        loop. Async code must await execute_code_async instead, since this
+        blocks the calling thread for the whole run.
 
         Args:
             code: Code to execute
-            language: Language (python, bash)
+            language: Language (python, bash, javascript)
             timeout: Execution timeout in seconds
 
         Returns:
             Dict with stdout, stderr, exit_code, execution_time
         """
+        return asyncio.run(self.execute_code_async(code, language, timeout))
+
+    async def execute_code_async(
+        self,
+        code: str,
+        language: str,
+        timeout: int = None,
+        max_output: int = None
+    ) -> Dict[str, any]:
+        """
+        Execute code in subprocess with security limits, without blocking the event loop
+
+        The process runs in its own session (process group), so on timeout or
+        cancellation the whole group is killed, including any children the
+        code spawned. With SANDBOX_ZYGOTE_ENABLED, Python runs are forked
+        from a preloaded zygote instead of starting a fresh interpreter.
+
+        Args:
+            code: Code to execute
+            language: Language (python, bash, javascript)
+            timeout: Execution timeout in seconds
+            max_output: Output size limit per stream (MAX_OUTPUT_SIZE by default)
+
+        Returns:
+            Dict with stdout, stderr, exit_code, execution_time, truncated_bytes
+            and resource usage (see accounting.py)
+        """
         timeout = timeout or settings.SANDBOX_TIMEOUT
+        max_output = max_output or settings.MAX_OUTPUT_SIZE
 
-        if language == "python":
-            return self._execute_python(code, timeout)
-        elif language == "bash":
-            return self._execute_bash(code, timeout)
-        else:
+        if language not in self.COMMANDS:
             return {
                 "stdout": "",
                 "stderr": f"Unsupported language: {language}",
@@ -50,51 +116,21 @@ class SubprocessSandbox:
                 "execution_time": 0
             }
 
-    def _execute_python(self, code: str, timeout: int) -> Dict:
-        """Execute Python code"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+        if language == "python" and settings.SANDBOX_ZYGOTE_ENABLED:
+            try:
+                return await zygote.execute(code, timeout, max_output)
+            except (OSError, RuntimeError, ValueError, asyncio.TimeoutError) as e:
+                print(f"⚠️ Sandbox zygote unavailable, using a fresh interpreter: {e}")
+
+        command, suffix = self._command(language)
+        with tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False) as f:
             f.write(code)
             temp_file = f.name
 
         try:
-            start_time = time.time()
-
-            # Run Python with restricted environment
-            result = subprocess.run(
-                ['python3', temp_file],
-                capture_output=True,
-                timeout=timeout,
-                text=True,
-                env=self._get_restricted_env(),
-                # Prevent shell injection
-                shell=False
+            return await self._run_process(
+                [*command, temp_file], timeout, max_output, self._limits(language, timeout)
             )
-
-            execution_time = time.time() - start_time
-
-            # Truncate output if too large
-            stdout = result.stdout
-            stderr = result.stderr
-
-            if len(stdout) > settings.MAX_OUTPUT_SIZE:
-                stdout = stdout[:settings.MAX_OUTPUT_SIZE] + "\n... (output truncated)"
-            if len(stderr) > settings.MAX_OUTPUT_SIZE:
-                stderr = stderr[:settings.MAX_OUTPUT_SIZE] + "\n... (output truncated)"
-
-            return {
-                "stdout": stdout,
-                "stderr": stderr,
-                "exit_code": result.returncode,
-                "execution_time": execution_time
-            }
-
-        except subprocess.TimeoutExpired:
-            return {
-                "stdout": "",
-                "stderr": f"Execution timed out after {timeout} seconds",
-                "exit_code": 124,  # Standard timeout exit code
-                "execution_time": timeout
-            }
         except Exception as e:
             return {
                 "stdout": "",
@@ -106,69 +142,225 @@ class SubprocessSandbox:
             # Clean up temp file
             try:
                 os.unlink(temp_file)
-            except:
+            except OSError:
                 pass
 
-    def _execute_bash(self, code: str, timeout: int) -> Dict:
-        """Execute Bash script"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
+    async def _run_process(
+        self,
+        command: List[str],
+        timeout: int,
+        max_output: int = None,
+        limits: Optional[Dict[str, int]] = None
+    ) -> Dict:
+        """
+        Run a command with a restricted environment
 
-        # Make script executable
-        os.chmod(temp_file, 0o755)
+        The command is started by launcher.py, which applies `limits` and
+        reports the command's own rusage. Output is read as it is produced
+        into bounded buffers. The run is stopped on timeout, or as soon as
+        either stream exceeds max_output bytes; anything it left running,
+        in its process group or not, is killed once it exits.
+        """
+        max_output = max_output or settings.MAX_OUTPUT_SIZE
+        start_time = time.time()
 
-        try:
-            start_time = time.time()
-
-            # Run Bash with restricted environment
-            result = subprocess.run(
-                ['bash', temp_file],
-                capture_output=True,
-                timeout=timeout,
-                text=True,
-                env=self._get_restricted_env(),
-                shell=False
-            )
+        with tempfile.NamedTemporaryFile(suffix=".usage", delete=False) as f:
+            report_path = f.name
 
-            execution_time = time.time() - start_time
+        # Popen rather than asyncio's subprocess API: asyncio reaps children
+        # itself, which loses the rusage that wait4 reports
+        process = subprocess.Popen(
+            [sys.executable, "-I", "-S", LAUNCHER, report_path, json.dumps(limits or {}), "--", *command],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self._get_restricted_env(),
+            start_new_session=True,
+        )
+        stdout = BoundedOutputBuffer(max_output)
+        stderr = BoundedOutputBuffer(max_output)
+        exited = asyncio.ensure_future(self._wait4(process))
 
-            # Truncate output if too large
-            stdout = result.stdout
-            stderr = result.stderr
+        async def pump(pipe, buffer: BoundedOutputBuffer):
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader()
+            transport, _ = await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), pipe
+            )
+            try:
+                while True:
+                    chunk = await reader.read(CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    if not buffer.write(chunk):
+                        self._stop_command(process)
+            finally:
+                transport.close()
 
-            if len(stdout) > settings.MAX_OUTPUT_SIZE:
-                stdout = stdout[:settings.MAX_OUTPUT_SIZE] + "\n... (output truncated)"
-            if len(stderr) > settings.MAX_OUTPUT_SIZE:
-                stderr = stderr[:settings.MAX_OUTPUT_SIZE] + "\n... (output truncated)"
+        pumps = asyncio.gather(pump(process.stdout, stdout), pump(process.stderr, stderr))
 
-            return {
-                "stdout": stdout,
-                "stderr": stderr,
-                "exit_code": result.returncode,
-                "execution_time": execution_time
-            }
+        async def collect():
+            await asyncio.shield(exited)
+            # Background processes would hold the pipes open
+            self._signal_process_group(process)
+            await self._drain(pumps)
 
-        except subprocess.TimeoutExpired:
+        try:
+            try:
+                await asyncio.wait_for(collect(), timeout)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
+                self._stop_command(process)
+                try:
+                    await asyncio.wait_for(asyncio.shield(exited), STOP_GRACE)
+                finally:
+                    self._signal_process_group(process)
+                await asyncio.shield(exited)
+                await self._drain(pumps)
+            except asyncio.CancelledError:
+                self._signal_process_group(process)
+                await asyncio.shield(exited)
+                raise
+            status, usage = self._read_report(report_path, *exited.result())
+        finally:
+            pumps.cancel()
+            try:
+                os.unlink(report_path)
+            except OSError:
+                pass
+
+        if timed_out:
             return {
-                "stdout": "",
+                "stdout": stdout.text(),
                 "stderr": f"Execution timed out after {timeout} seconds",
-                "exit_code": 124,
-                "execution_time": timeout
-            }
-        except Exception as e:
-            return {
-                "stdout": "",
-                "stderr": f"Execution error: {str(e)}",
-                "exit_code": 1,
-                "execution_time": 0
+                "exit_code": 124,  # Standard timeout exit code
+                "execution_time": timeout,
+                "truncated_bytes": stdout.truncated_bytes + stderr.truncated_bytes,
+                **self._usage(usage, stdout, stderr, limit_hit="time")
             }
-        finally:
-            # Clean up temp file
+
+        exit_code = os.waitstatus_to_exitcode(status)
+        stderr_text = stderr.text()
+        output_exceeded = stdout.exceeded or stderr.exceeded
+        limit_hit = classify_limit(exit_code, stderr_text, output_exceeded=output_exceeded)
+        if output_exceeded:
+            exit_code = OUTPUT_LIMIT_EXIT_CODE
+            stderr_text += output_limit_message(max_output)
+
+        return {
+            "stdout": stdout.text(),
+            "stderr": stderr_text,
+            "exit_code": exit_code,
+            "execution_time": time.time() - start_time,
+            "truncated_bytes": stdout.truncated_bytes + stderr.truncated_bytes,
+            **self._usage(usage, stdout, stderr, limit_hit)
+        }
+
+    async def _drain(self, pumps: asyncio.Future):
+        """
+        Give the output pumps STOP_GRACE to reach EOF once the run is over
+
+        A process the launcher could not kill may still hold the pipes open;
+        stop reading then and keep what was read (cancelling a pump closes
+        its pipe), rather than waiting on it or raising.
+        """
+        done, _ = await asyncio.wait({pumps}, timeout=STOP_GRACE)
+        if done:
+            pumps.result()
+            return
+        pumps.cancel()
+        await asyncio.wait({pumps})
+
+    async def _wait4(self, process: subprocess.Popen):
+        """
+        Reap the process with wait4 once it exits, without blocking the event loop
+
+        Waits on a pidfd where available, otherwise in a worker thread.
+
+        Returns:
+            (wait status, rusage)
+        """
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            _, status, usage = await asyncio.to_thread(os.wait4, process.pid, 0)
+        else:
+            loop = asyncio.get_running_loop()
+            readable = loop.create_future()
+            loop.add_reader(pidfd, lambda: readable.done() or readable.set_result(None))
             try:
-                os.unlink(temp_file)
-            except:
-                pass
+                await readable
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+            _, status, usage = os.wait4(process.pid, 0)
+
+        # Reaped here; keep Popen from waiting on the pid again
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return status, usage
+
+    def _read_report(self, report_path: str, status: int, usage) -> Tuple[int, Dict]:
+        """
+        The command's wait status and rusage as reported by the launcher
+
+        Falls back to the launcher's own (which then includes little more
+        than the launcher) if it died before writing its report.
+        """
+        try:
+            with open(report_path) as f:
+                report = json.load(f)
+            return report["status"], report["rusage"]
+        except (OSError, ValueError, KeyError):
+            return status, {
+                "cpu_user": usage.ru_utime,
+                "cpu_sys": usage.ru_stime,
+                "max_rss_kb": usage.ru_maxrss,
+            }
+
+    def _usage(self, usage: Dict, stdout: BoundedOutputBuffer, stderr: BoundedOutputBuffer, limit_hit: Optional[str]) -> Dict:
+        return usage_fields(
+            cpu_user=usage["cpu_user"],
+            cpu_sys=usage["cpu_sys"],
+            peak_rss_kb=usage["max_rss_kb"],
+            bytes_written=stdout.total_bytes + stderr.total_bytes,
+            limit_hit=limit_hit,
+        )
+
+    def _command(self, language: str):
+        """Interpreter command and file suffix, with node's heap capped to the memory limit"""
+        command, suffix = self.COMMANDS[language]
+        if language == "javascript":
+            heap_mb = parse_memory_limit(settings.SANDBOX_MEMORY_LIMIT) // (1024 * 1024)
+            command = [*command, f"--max-old-space-size={heap_mb}"]
+        return command, suffix
+
+    def _limits(self, language: str, timeout: int) -> Dict[str, int]:
+        """
+        Build the rlimits for a run (applied by the launcher, soft = hard)
+
+        CPU time, file size and, except for node, address space: V8 reserves
+        far more address space than it uses, so node's heap is capped by
+        flag instead.
+        """
+        limits = {"cpu": timeout + 1, "fsize": FILE_SIZE_LIMIT}
+        if language != "javascript":
+            limits["as"] = parse_memory_limit(settings.SANDBOX_MEMORY_LIMIT)
+        return limits
+
+    def _stop_command(self, process: subprocess.Popen):
+        """Ask the launcher to kill the command; it still reports its usage"""
+        try:
+            os.kill(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _signal_process_group(self, process: subprocess.Popen):
+        """SIGKILL the process and everything it spawned"""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
     def _get_restricted_env(self) -> Dict[str, str]:
         """Get restricted environment variables"""
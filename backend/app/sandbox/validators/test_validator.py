@@ -1,8 +1,9 @@
 """
 Test case validation logic
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from app.models.exercise import TestCase, TestResult, ExecutionResult
+from app.sandbox.harness import TestFrame, test_ids
 
 
 def validate_test_cases(
@@ -25,8 +26,7 @@ def validate_test_cases(
 
     # If execution failed, all tests fail
     if execution_result.exit_code != 0:
-        for i, test_case in enumerate(test_cases):
-            test_id = test_case.get("test_id", f"test_{i}") if isinstance(test_case, dict) else test_case.test_id
+        for test_id in test_ids(test_cases):
             results.append(TestResult(
                 test_id=test_id,
                 passed=False,
@@ -35,31 +35,104 @@ def validate_test_cases(
         return results
 
     # Validate each test case
-    for test_case in test_cases:
+    for test_id, test_case in zip(test_ids(test_cases), test_cases):
         result = validate_single_test(
             execution_result,
             test_case,
-            language
+            language,
+            test_id
         )
         results.append(result)
 
     return results
 
 
+def validate_test_frames(
+    frames: Dict[str, TestFrame],
+    test_cases: List[Any],  # Can be dict or TestCase
+    harness_result: ExecutionResult,
+    language: str
+) -> List[TestResult]:
+    """
+    Validate per-test results reported by the test harness
+
+    Each test is judged on its own frame, so one crashing test does not fail
+    the others. Tests without a frame never ran (the harness itself failed
+    or hit the overall timeout).
+
+    Args:
+        frames: Frames from harness.parse_frames, keyed by test_id
+        test_cases: List of test cases to validate (dicts or TestCase objects)
+        harness_result: Result of the harness run itself
+        language: Programming language
+
+    Returns:
+        List of test results
+    """
+    results = []
+
+    for test_id, test_case in zip(test_ids(test_cases), test_cases):
+        frame = frames.get(test_id)
+
+        if frame is None:
+            reason = harness_result.stderr.strip() or "no result reported"
+            results.append(TestResult(
+                test_id=test_id,
+                passed=False,
+                error_message=f"Test did not run: {reason}"
+            ))
+        elif frame.timed_out:
+            results.append(TestResult(
+                test_id=test_id,
+                passed=False,
+                actual_output={"stdout": frame.stdout},
+                error_message=f"Timed out after {int(frame.execution_time)} seconds"
+            ))
+        elif frame.output_exceeded:
+            results.append(TestResult(
+                test_id=test_id,
+                passed=False,
+                actual_output={"stdout": frame.stdout},
+                error_message="Stopped: the test printed more output than the sandbox allows"
+            ))
+        elif frame.exit_code != 0:
+            results.append(TestResult(
+                test_id=test_id,
+                passed=False,
+                actual_output={"stdout": frame.stdout},
+                error_message=f"Execution failed: {frame.stderr or f'exit code {frame.exit_code}'}"
+            ))
+        else:
+            results.append(validate_single_test(frame_to_result(frame), test_case, language, test_id))
+
+    return results
+
+
+def frame_to_result(frame: TestFrame) -> ExecutionResult:
+    """Convert a harness frame to an ExecutionResult"""
+    return ExecutionResult(
+        stdout=frame.stdout,
+        stderr=frame.stderr,
+        exit_code=frame.exit_code,
+        execution_time=frame.execution_time
+    )
+
+
 def validate_single_test(
     execution_result: ExecutionResult,
     test_case: Any,  # Can be dict or TestCase
-    language: str
+    language: str,
+    test_id: Optional[str] = None
 ) -> TestResult:
-    """Validate a single test case"""
+    """Validate a single test case (test_id: from harness.test_ids, else the test case's own)"""
 
     try:
         # Handle both dict and TestCase object
         if isinstance(test_case, dict):
-            test_id = test_case.get("test_id", "test_1")
+            test_id = test_id or test_case.get("test_id", "test_1")
             expected_output = test_case.get("expected_output", {})
         else:
-            test_id = test_case.test_id
+            test_id = test_id or test_case.test_id
             expected_output = test_case.expected_output
 
         # Check expected output
@@ -98,7 +171,7 @@ def validate_single_test(
             )
 
     except Exception as e:
-        test_id = test_case.get("test_id", "test_error") if isinstance(test_case, dict) else "test_error"
+        test_id = test_id or (test_case.get("test_id", "test_error") if isinstance(test_case, dict) else "test_error")
         return TestResult(
             test_id=test_id,
             passed=False,
@@ -106,6 +179,34 @@ def validate_single_test(
         )
 
 
+def test_checks_something(test_case: Any) -> bool:
+    """
+    Whether a test case can tell a correct submission from an incorrect one
+
+    A test checks something when it expects specific output or runs a
+    validation script with more than comments in it. Tests with neither
+    pass any program that exits cleanly (placeholders).
+    """
+    if isinstance(test_case, dict):
+        expected_output = test_case.get("expected_output") or {}
+        script = test_case.get("validation_script") or ""
+    else:
+        expected_output = test_case.expected_output or {}
+        script = test_case.validation_script or ""
+
+    if isinstance(expected_output, dict) and str(expected_output.get("stdout") or "").strip():
+        return True
+    return any(
+        line.strip() and not line.strip().startswith(("#", "//"))
+        for line in script.splitlines()
+    )
+
+
+def has_checking_tests(test_cases: List[Any]) -> bool:
+    """Whether at least one test case checks something (see test_checks_something)"""
+    return any(test_checks_something(test_case) for test_case in test_cases)
+
+
 def calculate_score(test_results: List[TestResult]) -> int:
     """
     Calculate score based on test results
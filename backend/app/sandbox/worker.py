@@ -0,0 +1,198 @@
+"""
+Sandbox worker: runs jobs from the sandbox job stream (see job_queue.py)
+
+Runs as its own process, next to (or on other hosts than) the API:
+
+    python -m app.sandbox.worker --concurrency 4
+
+Each of `concurrency` loops reads one job at a time through the consumer
+group, runs it on this host's sandbox backend and pushes the result to the
+job's result list. Jobs left pending by a crashed worker are claimed back
+once they are older than any run could take, and discarded (their requester
+has given up by then) so they stop counting towards the queue depth.
+
+SIGTERM/SIGINT stop reading new jobs; jobs in progress finish first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+
+from redis.exceptions import RedisError, ResponseError
+
+from app.config import get_settings
+from app.db.redis import close_redis_connection, connect_to_redis, redis_client
+from app.sandbox.container_pool import close_container_pools
+from app.sandbox.executor import executor
+from app.sandbox.job_queue import (
+    FINGERPRINTS_KEY,
+    GROUP_NAME,
+    RESULT_GRACE,
+    RESULT_TTL,
+    STREAM_KEY,
+)
+from app.sandbox.zygote import close_zygote
+
+settings = get_settings()
+
+# Milliseconds XREADGROUP blocks before checking for shutdown
+READ_BLOCK_MS = 2000
+
+
+class SandboxWorker:
+    """Consumes the sandbox job stream"""
+
+    def __init__(self, concurrency: int, consumer: str):
+        """
+        Args:
+            concurrency: Jobs run at once by this worker
+            consumer: Consumer name within the group (unique per worker)
+        """
+        self.concurrency = concurrency
+        self.consumer = consumer
+        # Older pending jobs belong to a dead worker: no run takes this long
+        self.claim_idle_ms = (settings.SANDBOX_TIMEOUT + RESULT_GRACE) * 1000
+        self._stopping = asyncio.Event()
+
+    @property
+    def redis(self):
+        return redis_client.client
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        """Consume jobs until stop() is called"""
+        await self._ensure_group()
+        await self._publish_fingerprints()
+        print(f"✅ Sandbox worker {self.consumer} consuming {STREAM_KEY} (concurrency={self.concurrency})")
+
+        loops = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        loops.append(asyncio.create_task(self._reclaim()))
+        await asyncio.gather(*loops)
+
+    async def _ensure_group(self):
+        try:
+            await self.redis.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _publish_fingerprints(self):
+        """Tell the API what runs each language here (used in result cache keys)"""
+        fingerprints = {}
+        for language in settings.SANDBOX_LANGUAGE_CONCURRENCY:
+            try:
+                fingerprints[language] = await executor.backend.fingerprint(language)
+            except Exception as e:
+                print(f"⚠️ No sandbox fingerprint for {language}: {e}")
+        if fingerprints:
+            await self.redis.hset(FINGERPRINTS_KEY, mapping=fingerprints)
+
+    async def _consume(self):
+        while not self._stopping.is_set():
+            try:
+                reply = await self.redis.xreadgroup(
+                    GROUP_NAME, self.consumer, {STREAM_KEY: ">"}, count=1, block=READ_BLOCK_MS
+                )
+            except RedisError as e:
+                print(f"⚠️ Sandbox worker failed to read jobs: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for _, messages in reply or []:
+                for message_id, fields in messages:
+                    await self._handle_isolated(message_id, fields)
+
+    async def _reclaim(self):
+        """Periodically take over jobs stuck with dead consumers"""
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.redis.xautoclaim(
+                    STREAM_KEY, GROUP_NAME, self.consumer, self.claim_idle_ms, start_id="0-0", count=10
+                )
+                for message_id, fields in claimed[1]:
+                    if fields:
+                        await self._handle_isolated(message_id, fields)
+            except Exception as e:
+                # Keep reclaiming: this loop is the only one that does
+                print(f"⚠️ Sandbox worker failed to reclaim jobs: {e}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.claim_idle_ms / 2000)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _handle_isolated(self, message_id: str, fields: dict):
+        """_handle, without letting one job's failure stop the loop running it"""
+        try:
+            await self._handle(message_id, fields)
+        except Exception as e:
+            print(f"⚠️ Sandbox job {message_id} failed: {e}")
+
+    async def _handle(self, message_id: str, fields: dict):
+        """Run one job and deliver its result"""
+        try:
+            job = json.loads(fields["job"])
+            if time.time() > job["deadline"]:
+                print(f"⚠️ Dropped expired sandbox job {job['id']}")
+                return
+
+            try:
+                result = await executor.run_local(
+                    job["code"], job["language"], job["timeout"], job["max_output"]
+                )
+            except asyncio.CancelledError:
+                # Only a shutdown may cancel the worker; anything else
+                # cancelled inside the backend is this job's error
+                if self._stopping.is_set() or asyncio.current_task().cancelling():
+                    raise
+                result = self._error_result("run was cancelled")
+            except Exception as e:
+                result = self._error_result(str(e))
+
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.lpush(job["result_key"], json.dumps(result))
+                pipe.expire(job["result_key"], RESULT_TTL)
+                await pipe.execute()
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ Dropped malformed sandbox job {message_id}: {e}")
+        finally:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.xack(STREAM_KEY, GROUP_NAME, message_id)
+                pipe.xdel(STREAM_KEY, message_id)
+                await pipe.execute()
+
+    def _error_result(self, error: str) -> dict:
+        return {
+            "stdout": "",
+            "stderr": f"Execution error: {error}",
+            "exit_code": 1,
+            "execution_time": 0
+        }
+
+
+async def main(args):
+    await connect_to_redis()
+    worker = SandboxWorker(args.concurrency, f"{socket.gethostname()}-{os.getpid()}")
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await close_container_pools()
+        await close_zygote()
+        await close_redis_connection()
+        print(f"👋 Sandbox worker {worker.consumer} stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=settings.SANDBOX_WORKER_CONCURRENCY)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,189 @@
+"""
+Client for the sandbox zygote (see zygote_server.py)
+
+The zygote is started on first use as a child of the API process and stops
+when the API process closes its stdin pipe (or exits).
+
+When the API runs as root, runs drop to SANDBOX_ZYGOTE_UID, so the Python
+installation must be readable by that uid for imports beyond the preloaded
+modules to work.
+"""
+from typing import Dict, Optional
+import asyncio
+import json
+import os
+import signal
+import sys
+
+from app.config import get_settings
+from app.sandbox.accounting import classify_limit, usage_fields
+from app.sandbox.output import output_limit_message
+
+settings = get_settings()
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zygote_server.py")
+
+# Largest JSON line accepted from the zygote
+MAX_RESPONSE_BYTES = 16 * 1024 * 1024
+
+# Per-run file size cap (RLIMIT_FSIZE) and process cap (RLIMIT_NPROC)
+FILE_SIZE_LIMIT = 1024 * 1024
+NPROC_LIMIT = 64
+
+
+def parse_memory_limit(value: str) -> int:
+    """Parse a Docker-style size ("256m", "1g", "512k") into bytes"""
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class ZygoteClient:
+    """Starts the zygote and sends it Python submissions"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        """Start the zygote if it is not running"""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            if self.running and self._loop is loop:
+                return
+            if self.running:
+                # Started from another event loop (sync shim callers)
+                try:
+                    os.kill(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            self._loop = loop
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-I", SERVER_PATH, self.socket_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            line = await asyncio.wait_for(self.process.stdout.readline(), 10)
+            if line.strip() != b"ready":
+                await self._stop_process()
+                raise RuntimeError("Sandbox zygote failed to start")
+            print(f"✅ Sandbox zygote ready (pid={self.process.pid}, socket={self.socket_path})")
+
+    async def execute(self, code: str, timeout: int, max_output: int = None) -> Dict:
+        """
+        Run Python code in a child forked from the zygote
+
+        Args:
+            code: Python code
+            timeout: Execution timeout in seconds
+            max_output: Output size limit per stream (MAX_OUTPUT_SIZE by default)
+
+        Returns:
+            Dict with stdout, stderr, exit_code, execution_time, truncated_bytes
+            and resource usage (see accounting.py)
+
+        Raises:
+            OSError, RuntimeError, asyncio.TimeoutError: The zygote is unavailable
+        """
+        await self.start()
+        max_output = max_output or settings.MAX_OUTPUT_SIZE
+
+        request = {
+            "code": code,
+            "timeout": timeout,
+            "max_output": max_output,
+            "env": {"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8", "LC_ALL": "C.UTF-8"},
+            "limits": {
+                "cpu": timeout + 1,
+                "address_space": parse_memory_limit(settings.SANDBOX_MEMORY_LIMIT),
+                "file_size": FILE_SIZE_LIMIT,
+                "nproc": NPROC_LIMIT,
+            },
+            "uid": settings.SANDBOX_ZYGOTE_UID,
+            "gid": settings.SANDBOX_ZYGOTE_UID,
+        }
+
+        reader, writer = await asyncio.open_unix_connection(
+            self.socket_path, limit=MAX_RESPONSE_BYTES
+        )
+        try:
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            # The monitor enforces the timeout; this only guards a stuck zygote
+            line = await asyncio.wait_for(reader.readline(), timeout + 10)
+        finally:
+            writer.close()
+
+        if not line:
+            raise RuntimeError("Sandbox zygote closed the connection")
+        result = json.loads(line)
+        rusage = result["rusage"]
+        limit_hit = classify_limit(
+            result["exit_code"],
+            result["stderr"],
+            timed_out=result["timed_out"],
+            output_exceeded=result["output_exceeded"],
+        )
+        usage = usage_fields(
+            cpu_user=rusage["cpu_user"],
+            cpu_sys=rusage["cpu_sys"],
+            peak_rss_kb=rusage["max_rss_kb"],
+            bytes_written=result["bytes_written"],
+            limit_hit=limit_hit,
+        )
+
+        if result["timed_out"]:
+            return {
+                "stdout": result["stdout"],
+                "stderr": f"Execution timed out after {timeout} seconds",
+                "exit_code": 124,
+                "execution_time": timeout,
+                "truncated_bytes": result["truncated_bytes"],
+                **usage
+            }
+        stderr = result["stderr"]
+        if result["output_exceeded"]:
+            stderr += output_limit_message(max_output)
+        return {
+            "stdout": result["stdout"],
+            "stderr": stderr,
+            "exit_code": result["exit_code"],
+            "execution_time": result["execution_time"],
+            "truncated_bytes": result["truncated_bytes"],
+            **usage
+        }
+
+    async def close(self):
+        """Stop the zygote"""
+        async with self._lock:
+            await self._stop_process()
+
+    async def _stop_process(self):
+        if not self.running:
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+
+# Singleton instance
+zygote = ZygoteClient(settings.SANDBOX_ZYGOTE_SOCKET)
+
+
+async def close_zygote():
+    """Stop the sandbox zygote if it was started"""
+    if zygote.running:
+        await zygote.close()
+        print("✅ Stopped sandbox zygote")
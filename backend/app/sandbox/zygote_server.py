@@ -0,0 +1,314 @@
+"""
+Zygote process for the subprocess sandbox
+
+A long-lived Python interpreter with common stdlib modules preloaded. It
+listens on a unix socket and, per request, forks:
+
+    zygote (accept loop, never runs user code)
+      └─ monitor: reads the request, collects output, enforces the timeout,
+         reaps the runner with wait4, kills whatever it left behind (see
+         reaper.py) and writes the JSON result back
+           └─ runner: new session, rlimits, dropped privileges, then exec()s
+              the submission in the already-initialized interpreter
+
+Skipping interpreter startup and imports is what makes a warm run cheaper
+than a fresh `python3`.
+
+Protocol: one JSON line per connection, in and out.
+    request:  {"code", "timeout", "max_output", "env", "limits": {"cpu",
+               "address_space", "file_size", "nproc"}, "uid", "gid"}
+    response: {"stdout", "stderr", "exit_code", "timed_out",
+               "output_exceeded", "truncated_bytes", "bytes_written",
+               "execution_time", "rusage": {...}}
+
+Standard library only: it is started with `python -I zygote_server.py
+SOCKET_PATH` and exits when its stdin (a pipe held by the app) closes.
+"""
+import importlib.util
+import json
+import os
+import resource
+import selectors
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# Imported once in the zygote so submissions do not pay for them
+PRELOAD_MODULES = (
+    "abc", "array", "bisect", "collections", "copy", "dataclasses", "datetime",
+    "decimal", "enum", "fractions", "functools", "heapq", "io", "itertools",
+    "json", "linecache", "math", "operator", "random", "re", "statistics",
+    "string", "textwrap", "time", "traceback", "types", "typing",
+)
+
+# Extra time given to lingering output after the runner exits or is killed
+DRAIN_GRACE = 0.5
+
+
+def _load_sandbox_module(name: str):
+    """Load app/sandbox/<name>.py by path (app modules are not importable here)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"sandbox_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+output = _load_sandbox_module("output")
+reaper = _load_sandbox_module("reaper")
+
+
+def preload():
+    for name in PRELOAD_MODULES:
+        __import__(name)
+
+
+def serve(socket_path: str):
+    preload()
+
+    # The zygote never waits for monitors; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(128)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    selector.register(sys.stdin, selectors.EVENT_READ)
+
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is sys.stdin:
+                if not sys.stdin.buffer.read1(4096):
+                    # The app went away
+                    server.close()
+                    os.unlink(socket_path)
+                    return
+                continue
+
+            conn, _ = server.accept()
+            pid = os.fork()
+            if pid == 0:
+                selector.close()
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                try:
+                    handle(conn)
+                finally:
+                    os._exit(0)
+            conn.close()
+
+
+def handle(conn: socket.socket):
+    """Monitor process: run one request and send back the result"""
+    # So processes the runner detaches from its session can still be killed
+    reaper.become_subreaper()
+    with conn.makefile("rb") as reader:
+        request = json.loads(reader.readline())
+
+    timeout = float(request["timeout"])
+    max_output = int(request.get("max_output", 10240))
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    uid, gid = request.get("uid"), request.get("gid")
+    if os.geteuid() == 0 and uid is not None:
+        os.chown(workdir, uid, gid)
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    started = time.monotonic()
+
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        conn.close()
+        run_user_code(request, workdir, out_w, err_w)  # Never returns
+
+    os.close(out_w)
+    os.close(err_w)
+    try:
+        stdout, stderr, timed_out = collect_output(pid, out_r, err_r, started + timeout, max_output)
+        _, status, usage = os.wait4(pid, 0)
+        execution_time = time.monotonic() - started
+        reaper.kill_descendants()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code < 0:
+        exit_code = 128 - exit_code  # Killed by a signal, shell convention
+    output_exceeded = stdout.exceeded or stderr.exceeded
+    if timed_out:
+        exit_code = 124
+    elif output_exceeded:
+        exit_code = output.OUTPUT_LIMIT_EXIT_CODE
+
+    result = {
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "exit_code": exit_code,
+        "timed_out": timed_out,
+        "output_exceeded": output_exceeded,
+        "truncated_bytes": stdout.truncated_bytes + stderr.truncated_bytes,
+        "bytes_written": stdout.total_bytes + stderr.total_bytes,
+        "execution_time": execution_time,
+        "rusage": {
+            "cpu_user": usage.ru_utime,
+            "cpu_sys": usage.ru_stime,
+            "max_rss_kb": usage.ru_maxrss,
+        },
+    }
+    conn.sendall(json.dumps(result).encode("utf-8") + b"\n")
+    conn.close()
+
+
+def collect_output(pid: int, out_r: int, err_r: int, deadline: float, max_output: int):
+    """
+    Read the runner's stdout/stderr until EOF into bounded buffers, killing its
+    process group on timeout or once either stream exceeds max_output bytes
+    """
+    buffers = {
+        out_r: output.BoundedOutputBuffer(max_output),
+        err_r: output.BoundedOutputBuffer(max_output),
+    }
+    selector = selectors.DefaultSelector()
+    for fd in buffers:
+        selector.register(fd, selectors.EVENT_READ)
+
+    timed_out = False
+    exited = False
+    overflowed = False
+    while selector.get_map():
+        now = time.monotonic()
+        if not timed_out and not exited and now >= deadline:
+            timed_out = True
+            _kill_group(pid)
+            deadline = now + DRAIN_GRACE
+        elif (timed_out or exited) and now >= deadline:
+            break
+
+        if not exited and not timed_out and os.waitid(
+            os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT
+        ):
+            # Runner is done; stragglers it left in its session must not hold the pipes
+            exited = True
+            _kill_group(pid)
+            deadline = time.monotonic() + DRAIN_GRACE
+
+        for key, _ in selector.select(timeout=min(0.05, max(deadline - now, 0.0))):
+            chunk = os.read(key.fd, output.CHUNK_SIZE)
+            if not chunk:
+                selector.unregister(key.fd)
+                continue
+            if not buffers[key.fd].write(chunk) and not overflowed:
+                overflowed = True
+                _kill_group(pid)
+
+    selector.close()
+    os.close(out_r)
+    os.close(err_r)
+    return buffers[out_r], buffers[err_r], timed_out
+
+
+def _kill_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_user_code(request: dict, workdir: str, out_w: int, err_w: int):
+    """Runner process: isolate, limit and run the submission, then exit"""
+    exit_code = 1
+    try:
+        os.setsid()
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        os.closerange(3, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+
+        apply_limits(request.get("limits", {}))
+        os.chdir(workdir)
+        if os.geteuid() == 0 and request.get("uid") is not None:
+            os.setgroups([])
+            os.setgid(request["gid"])
+            os.setuid(request["uid"])
+
+        os.environ.clear()
+        os.environ.update(request.get("env", {}))
+
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+        sys.stderr = open(2, "w", encoding="utf-8", errors="backslashreplace", closefd=False)
+    except BaseException:
+        os._exit(126)
+
+    exit_code = execute(request["code"])
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code)
+
+
+def apply_limits(limits: dict):
+    """Apply rlimits (soft = hard, so the code cannot raise them)"""
+    mapping = {
+        "cpu": resource.RLIMIT_CPU,
+        "address_space": resource.RLIMIT_AS,
+        "file_size": resource.RLIMIT_FSIZE,
+        "nproc": resource.RLIMIT_NPROC,
+    }
+    for name, value in limits.items():
+        if value is not None:
+            resource.setrlimit(mapping[name], (int(value), int(value)))
+
+
+def execute(code: str) -> int:
+    """Run code as __main__ of a fresh module, returning the process exit code"""
+    import linecache
+    import random
+    import traceback
+    import types
+
+    # Forked children share the zygote's PRNG state
+    random.seed()
+
+    filename = "main.py"
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+    main = types.ModuleType("__main__")
+    main.__file__ = filename
+    main.__builtins__ = __builtins__
+    sys.modules["__main__"] = main
+    sys.argv = [filename]
+
+    try:
+        exec(compile(code, filename, "exec"), main.__dict__)
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # Skip this frame so the traceback starts in the submission
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -2,25 +2,33 @@
 AI-Powered Grading Service using Claude Sonnet
 Provides structured, rubric-based assessment of student code submissions
 """
-from anthropic import AsyncAnthropic
+from app.ai.anthropic_client import get_anthropic_client
+from app.ai.instrumentation import create_message
+from app.ai.scheduler import Priority
 from app.config import get_settings
 import json
 from typing import Dict, List, Optional
 
 settings = get_settings()
 
+GRADING_MODEL = "claude-3-5-sonnet-20241022"
+
+# Bumped whenever the grading prompt or rubric changes (part of grade cache keys)
+GRADING_PROMPT_VERSION = 1
+
 
 class AIGradingService:
     """Service for AI-powered code assessment with detailed feedback"""
 
     def __init__(self):
-        self.client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.client = get_anthropic_client()
 
     async def grade_submission(
         self,
         exercise: Dict,
         student_code: str,
-        expected_solution: Optional[str] = None
+        expected_solution: Optional[str] = None,
+        user_id: Optional[str] = None
     ) -> Dict:
         """
         Grade a student's code submission using AI with structured rubric.
@@ -29,6 +37,7 @@ class AIGradingService:
             exercise: Exercise details (title, description, prompt, type)
             student_code: The code submitted by the student
             expected_solution: Optional reference solution for comparison
+            user_id: Submitting user (model call scheduling)
 
         Returns:
             Dict with:
@@ -45,8 +54,12 @@ class AIGradingService:
 
         try:
             # Use Claude Sonnet for intelligent grading
-            response = await self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
+            response = await create_message(
+                self.client,
+                agent="grading",
+                user_id=user_id,
+                priority=Priority.BACKGROUND,
+                model=GRADING_MODEL,
                 max_tokens=2000,
                 temperature=0.3,  # Lower temperature for consistent grading
                 messages=[{"role": "user", "content": prompt}]
@@ -251,7 +264,8 @@ Be constructive and encouraging while being honest about issues. Focus on learni
 async def grade_exercise(
     exercise: Dict,
     student_code: str,
-    expected_solution: Optional[str] = None
+    expected_solution: Optional[str] = None,
+    user_id: Optional[str] = None
 ) -> Dict:
     """
     Convenience function for grading an exercise submission.
@@ -260,9 +274,10 @@ async def grade_exercise(
         exercise: Exercise details
         student_code: Student's submitted code
         expected_solution: Optional reference solution
+        user_id: Submitting user
 
     Returns:
         Grading result dictionary
     """
     service = AIGradingService()
-    return await service.grade_submission(exercise, student_code, expected_solution)
+    return await service.grade_submission(exercise, student_code, expected_solution, user_id)
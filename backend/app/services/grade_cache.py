@@ -0,0 +1,352 @@
+"""
+Cache of Sonnet grades by normalized code
+
+Learners often submit byte-identical solutions, or ones that differ only in
+whitespace and comments, and each used to cost a Sonnet grading call. A
+grade is keyed by the exercise (and the exercise text the prompt is built
+from), the grading prompt version and model, and a hash of the normalized
+code:
+
+    python  ast.dump of the parsed code (comments and formatting gone)
+    bash    tokens outside quotes re-joined with single spaces, comments
+            and blank lines dropped
+    other   trailing whitespace and blank lines dropped
+
+Normalization only merges programs that run identically; code it cannot
+normalize safely (Python that does not parse, Bash with heredocs or
+nested quoting) is hashed nearly as written.
+
+Two tiers:
+    Redis   hot entries with a TTL, least recently used evicted beyond
+            GRADE_CACHE_HOT_MAX_ENTRIES
+    MongoDB `grading_cache` collection, every grade; hits are promoted back
+            to Redis
+Only real Sonnet grades are stored, never the heuristic fallback.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import ast
+import hashlib
+import json
+import time
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.config import get_settings
+from app.services.ai_grading_service import (
+    GRADING_MODEL,
+    GRADING_PROMPT_VERSION,
+    grade_exercise as ai_grade_exercise,
+)
+from app.utils.metrics import metrics
+
+settings = get_settings()
+
+KEY_PREFIX = "grade:cache:"
+LRU_KEY = "grade:cache:lru"
+COLLECTION = "grading_cache"
+
+# Exercise fields the grading prompt is built from
+_PROMPT_FIELDS = ("title", "type", "description", "prompt", "solution")
+
+# Word separators in Bash: a `#` after one of these starts a comment
+_BASH_WORD_BREAKS = " \t\n;&|()"
+
+GRADE_CACHE_LOOKUPS = metrics.counter(
+    "grade_cache_total",
+    "Sonnet grade cache lookups by outcome (redis, mongo, miss, bypass)",
+    ("outcome",),
+)
+
+
+def normalize_code(code: str, language: str) -> str:
+    """
+    Normalize code so formatting and comment changes do not change its hash
+
+    Args:
+        code: Submitted code
+        language: Programming language
+
+    Returns:
+        Normalized representation (not necessarily valid code)
+    """
+    if language == "python":
+        try:
+            return ast.dump(ast.parse(code))
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            pass
+    elif language == "bash":
+        normalized = _normalize_bash(code)
+        if normalized is not None:
+            return normalized
+    return _strip_lines(code)
+
+
+def _strip_lines(code: str) -> str:
+    return "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
+
+
+def _normalize_bash(code: str) -> Optional[str]:
+    r"""
+    Re-join Bash tokens outside quotes with single spaces, dropping comments
+    and line continuations
+
+    Returns:
+        Normalized code, or None for constructs this scanner does not follow
+        (heredocs, $'...' strings, command substitution inside double quotes,
+        unterminated quotes)
+
+    A continuation keeps the whitespace around it significant:
+
+    >>> _normalize_bash("echo hi\\\n  there")
+    'echo hi there'
+    >>> _normalize_bash("echo hi\\\nthere")
+    'echo hithere'
+    """
+    out = []
+    quote = None
+    pending_space = False
+    prev = "\n"
+    i = 0
+    while i < len(code):
+        ch = code[i]
+        nxt = code[i + 1] if i + 1 < len(code) else ""
+
+        if quote == "'":
+            out.append(ch)
+            if ch == "'":
+                quote = None
+        elif quote == '"':
+            if ch == "`" or (ch == "$" and nxt == "("):
+                return None
+            out.append(ch)
+            if ch == "\\":
+                out.append(nxt)
+                i += 1
+            elif ch == '"':
+                quote = None
+        elif ch == "\\" and nxt == "\n":
+            # Line continuation: both characters vanish, so the words on either
+            # side join unless whitespace separates them
+            i += 2
+            continue
+        elif ch == "#" and prev in _BASH_WORD_BREAKS:
+            # Comment: skip to the end of the line
+            while i + 1 < len(code) and code[i + 1] != "\n":
+                i += 1
+        elif ch in " \t":
+            pending_space = True
+        elif ch == "\n":
+            while out and out[-1] == " ":
+                out.pop()
+            if out and out[-1] != "\n":
+                out.append("\n")
+            pending_space = False
+        elif (ch == "<" and nxt == "<") or (ch == "$" and nxt == "'"):
+            return None
+        else:
+            if pending_space and out and out[-1] != "\n":
+                out.append(" ")
+            pending_space = False
+            out.append(ch)
+            if ch == "\\":
+                out.append(nxt)
+                i += 1
+            elif ch in "'\"":
+                quote = ch
+
+        prev = ch
+        i += 1
+
+    if quote is not None:
+        return None
+    return "".join(out).strip()
+
+
+def grade_cache_key(exercise: Dict, code: str, language: str) -> str:
+    """
+    Cache key for grading code against an exercise
+
+    Args:
+        exercise: Exercise document
+        code: Submitted code
+        language: Programming language
+
+    Returns:
+        Hex digest, also used as the MongoDB _id
+    """
+    material = json.dumps(
+        {
+            "exercise_id": exercise.get("exercise_id"),
+            "exercise": {field: exercise.get(field) for field in _PROMPT_FIELDS},
+            "prompt_version": GRADING_PROMPT_VERSION,
+            "model": GRADING_MODEL,
+            "language": language,
+            "code": normalize_code(code, language),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class GradeCache:
+    """Two-tier (Redis, MongoDB) store of Sonnet grades"""
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        redis: Optional[Redis],
+        hot_ttl: int,
+        hot_max_entries: int,
+    ):
+        """
+        Args:
+            db: Database instance
+            redis: Redis client, or None for MongoDB only
+            hot_ttl: Seconds an entry stays in Redis
+            hot_max_entries: Redis entries kept before the least recently used are evicted
+        """
+        self.collection = db[COLLECTION]
+        self.redis = redis
+        self.hot_ttl = hot_ttl
+        self.hot_max_entries = hot_max_entries
+
+    async def get(self, key: str) -> Tuple[Optional[Dict], str]:
+        """
+        Look up a grade
+
+        Returns:
+            (grading result or None, outcome: "redis", "mongo" or "miss")
+        """
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(KEY_PREFIX + key)
+                    # Refresh recency of existing entries only
+                    pipe.zadd(LRU_KEY, {key: time.time()}, xx=True)
+                    cached, _ = await pipe.execute()
+                if cached is not None:
+                    return json.loads(cached), "redis"
+            except RedisError as e:
+                print(f"⚠️ Grade cache (Redis) unavailable: {e}")
+
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": key},
+                {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}},
+                projection={"result": 1},
+            )
+        except PyMongoError as e:
+            print(f"⚠️ Grade cache (MongoDB) unavailable: {e}")
+            return None, "miss"
+        if doc is None:
+            return None, "miss"
+
+        await self._set_hot(key, doc["result"])
+        return doc["result"], "mongo"
+
+    async def set(self, key: str, exercise_id: str, language: str, result: Dict):
+        """Store a grade in both tiers"""
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {
+                    "$setOnInsert": {
+                        "exercise_id": exercise_id,
+                        "language": language,
+                        "prompt_version": GRADING_PROMPT_VERSION,
+                        "model": GRADING_MODEL,
+                        "result": result,
+                        "hits": 0,
+                        "created_at": datetime.utcnow(),
+                    }
+                },
+                upsert=True,
+            )
+        except PyMongoError as e:
+            print(f"⚠️ Failed to store grade in cache: {e}")
+        await self._set_hot(key, result)
+
+    async def _set_hot(self, key: str, result: Dict):
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(KEY_PREFIX + key, json.dumps(result), ex=self.hot_ttl)
+                pipe.zadd(LRU_KEY, {key: time.time()})
+                # Entries that expired on their own
+                pipe.zremrangebyscore(LRU_KEY, 0, time.time() - self.hot_ttl)
+                pipe.zcard(LRU_KEY)
+                *_, size = await pipe.execute()
+
+            if size > self.hot_max_entries:
+                evicted = await self.redis.zpopmin(LRU_KEY, size - self.hot_max_entries)
+                if evicted:
+                    await self.redis.delete(*(KEY_PREFIX + member for member, _ in evicted))
+        except RedisError as e:
+            print(f"⚠️ Failed to cache grade in Redis: {e}")
+
+
+def get_grade_cache(db: AsyncIOMotorDatabase, redis: Optional[Redis]) -> Optional[GradeCache]:
+    """Grade cache on the given database and Redis client, or None when caching is off"""
+    if not settings.GRADE_CACHE_ENABLED:
+        return None
+    return GradeCache(
+        db,
+        redis,
+        hot_ttl=settings.GRADE_CACHE_HOT_TTL,
+        hot_max_entries=settings.GRADE_CACHE_HOT_MAX_ENTRIES,
+    )
+
+
+async def create_grade_cache_indexes(db: AsyncIOMotorDatabase):
+    """Indexes for the grading_cache collection (lookups use _id)"""
+    try:
+        await db[COLLECTION].create_index([("exercise_id", 1), ("prompt_version", 1)])
+    except PyMongoError as e:
+        print(f"⚠️ Failed to create grade cache indexes: {e}")
+
+
+async def grade_with_cache(
+    cache: Optional[GradeCache],
+    exercise: Dict,
+    code: str,
+    language: str,
+    user_id: Optional[str] = None
+) -> Tuple[Dict, str]:
+    """
+    Grade a submission with Sonnet, reusing the grade of equivalent code
+
+    Args:
+        cache: Grade cache, or None to always call Sonnet
+        exercise: Exercise document
+        code: Submitted code
+        language: Programming language
+        user_id: Submitting user
+
+    Returns:
+        (grading result, cache outcome: "redis", "mongo", "miss" or "bypass")
+    """
+    if cache is None:
+        GRADE_CACHE_LOOKUPS.inc(outcome="bypass")
+        return await ai_grade_exercise(
+            exercise=exercise, student_code=code, expected_solution=exercise.get("solution"), user_id=user_id
+        ), "bypass"
+
+    key = grade_cache_key(exercise, code, language)
+    cached, outcome = await cache.get(key)
+    GRADE_CACHE_LOOKUPS.inc(outcome=outcome)
+    if cached is not None:
+        return cached, outcome
+
+    result = await ai_grade_exercise(
+        exercise=exercise, student_code=code, expected_solution=exercise.get("solution"), user_id=user_id
+    )
+    if result.get("graded_by") == "ai_sonnet":
+        await cache.set(key, exercise.get("exercise_id"), language, result)
+    return result, outcome
@@ -2,11 +2,18 @@
 Exercise grading service
 """
 from datetime import datetime
+from typing import List, Tuple
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-# Use subprocess sandbox instead of Docker for development
-from app.sandbox.subprocess_runner import sandbox
-from app.sandbox.validators.test_validator import validate_test_cases, calculate_score
+from app.sandbox.executor import executor
+from app.sandbox.preflight import PreflightError, check_syntax
+from app.sandbox.result_cache import is_deterministic
+from app.sandbox.harness import SUPPORTED_LANGUAGES, build_harness, frame_limit, parse_frames
+from app.sandbox.validators.test_validator import (
+    validate_test_cases,
+    validate_test_frames,
+    calculate_score,
+)
 from app.models.exercise import ExecutionResult, TestResult
 
 
@@ -15,7 +22,9 @@ async def grade_exercise(
     submission_id: str,
     exercise_id: str,
     code: str,
-    language: str
+    language: str,
+    user_id: str = None,
+    exercise: dict = None
 ) -> dict:
     """
     Grade an exercise submission
@@ -26,13 +35,16 @@ async def grade_exercise(
         exercise_id: Exercise ID
         code: Submitted code
         language: Programming language
+        user_id: Submitting user (per-user sandbox limits)
+        exercise: Exercise document, if the caller already has it
 
     Returns:
         Grading result dictionary
     """
 
     # Get exercise from database
-    exercise = await db.exercises.find_one({"exercise_id": exercise_id})
+    if exercise is None:
+        exercise = await db.exercises.find_one({"exercise_id": exercise_id})
     if not exercise:
         return {
             "error": "Exercise not found",
@@ -40,36 +52,37 @@ async def grade_exercise(
             "passed": False
         }
 
-    # Build complete code with validation scripts
-    # For exercises with validation scripts, append them to execute the functions
-    complete_code = code
     test_cases = exercise.get("test_cases", [])
 
-    # If there are validation scripts, append them to call the user's functions
-    if test_cases and test_cases[0].get("validation_script"):
-        validation_script = test_cases[0].get("validation_script")
-        complete_code = f"{code}\n\n# Test execution\n{validation_script}"
-
-    # Execute code in sandbox
-    exec_result = sandbox.execute_code(complete_code, language)
-
-    execution_result = ExecutionResult(
-        stdout=exec_result["stdout"],
-        stderr=exec_result["stderr"],
-        exit_code=exec_result["exit_code"],
-        execution_time=exec_result["execution_time"]
-    )
-
-    # Validate test cases
-    test_cases = [tc for tc in exercise.get("test_cases", [])]
-    test_results = validate_test_cases(execution_result, test_cases, language)
+    # Identical resubmissions reuse the earlier run unless the exercise opts out
+    scripts = "\n".join(tc.get("validation_script") or "" for tc in test_cases)
+    cacheable = exercise.get("cache_results", True) and is_deterministic(f"{code}\n{scripts}", language)
+
+    try:
+        # Code that does not parse fails every test; no sandbox run needed
+        await check_syntax(code, language)
+    except PreflightError as e:
+        execution_result = ExecutionResult(
+            stdout="",
+            stderr=e.stderr,
+            exit_code=1,
+            execution_time=0,
+            syntax_error=e.detail
+        )
+        test_results = validate_test_cases(execution_result, test_cases, language)
+    else:
+        if test_cases and language in SUPPORTED_LANGUAGES:
+            # All test cases in one sandbox run, each with its own timeout and output
+            execution_result, test_results = await run_test_harness(code, test_cases, language, cacheable, user_id)
+        else:
+            execution_result, test_results = await run_single(code, test_cases, language, cacheable, user_id)
 
     # Calculate score
     score = calculate_score(test_results)
     passed = score >= 70  # Passing threshold
 
     # Generate feedback
-    feedback = generate_feedback(test_results, score, passed)
+    feedback = generate_feedback(test_results, score, passed, execution_result)
 
     # Update attempt in database
     await db.exercise_attempts.update_one(
@@ -95,13 +108,114 @@ async def grade_exercise(
     }
 
 
+async def run_test_harness(
+    code: str,
+    test_cases: list,
+    language: str,
+    cacheable: bool = False,
+    user_id: str = None
+) -> Tuple[ExecutionResult, List[TestResult]]:
+    """
+    Run every test case against the submission in a single sandbox invocation
+
+    Returns:
+        (execution_result, test_results) where execution_result summarizes
+        the run: the first test's stdout, the first failure's stderr and
+        exit code, and the whole run's time and resource usage (the limit
+        and usage of the first test that hit a sandbox limit, if any)
+    """
+    harness = build_harness(code, test_cases, language)
+    exec_result = await executor.execute(
+        harness.code,
+        language,
+        timeout=harness.timeout,
+        max_output=harness.max_output,
+        cacheable=cacheable,
+        user_id=user_id
+    )
+    harness_result = ExecutionResult(**exec_result)
+
+    frames = parse_frames(harness_result.stdout)
+    test_results = validate_test_frames(frames, test_cases, harness_result, language)
+
+    ordered = [frames[test_id] for test_id in harness.test_ids if test_id in frames]
+    failed = next((frame for frame in ordered if frame.exit_code != 0), None)
+    if not ordered:
+        # The harness itself failed before reporting any test
+        return harness_result, test_results
+
+    # The harness exits normally when a test hits a limit; the test's frame says which
+    limited = next(((frame, frame_limit(frame)) for frame in ordered if frame_limit(frame)), None)
+
+    execution_result = ExecutionResult(**{
+        **harness_result.dict(),
+        "stdout": ordered[0].stdout,
+        "stderr": failed.stderr if failed else ordered[0].stderr,
+        "exit_code": failed.exit_code if failed else 0,
+    })
+    if limited and not execution_result.limit_hit:
+        frame, execution_result.limit_hit = limited
+        # The limited test's own usage, when the harness reports it
+        if frame.peak_rss_kb:
+            execution_result.cpu_user = frame.cpu_user
+            execution_result.cpu_sys = frame.cpu_sys
+            execution_result.peak_rss_kb = frame.peak_rss_kb
+    if len(ordered) < len(harness.test_ids) and harness_result.exit_code != 0:
+        execution_result.exit_code = harness_result.exit_code
+        execution_result.stderr = harness_result.stderr
+    return execution_result, test_results
+
+
+async def run_single(
+    code: str,
+    test_cases: list,
+    language: str,
+    cacheable: bool = False,
+    user_id: str = None
+) -> Tuple[ExecutionResult, List[TestResult]]:
+    """
+    Run the submission once and validate every test case against that output
+    """
+    # If there are validation scripts, append them to call the user's functions
+    complete_code = code
+    if test_cases and test_cases[0].get("validation_script"):
+        validation_script = test_cases[0].get("validation_script")
+        complete_code = f"{code}\n\n# Test execution\n{validation_script}"
+
+    # Execute code in sandbox (off the event loop)
+    exec_result = await executor.execute(complete_code, language, cacheable=cacheable, user_id=user_id)
+
+    execution_result = ExecutionResult(**exec_result)
+    test_results = validate_test_cases(execution_result, test_cases, language)
+    return execution_result, test_results
+
+
+LIMIT_DESCRIPTIONS = {
+    "time": "time limit",
+    "memory": "memory limit",
+    "output": "output limit",
+    "file_size": "file size limit",
+}
+
+
 def generate_feedback(
     test_results: list[TestResult],
     score: int,
-    passed: bool
+    passed: bool,
+    execution_result: ExecutionResult = None
 ) -> str:
     """Generate human-readable feedback"""
 
+    if execution_result and execution_result.syntax_error:
+        error = execution_result.syntax_error
+        where = f" on line {error.line}" if error.line else ""
+        where += f", column {error.column}" if error.line and error.column else ""
+        return (
+            f"❌ Your code has a syntax error{where}: {error.message}\n\n"
+            "It could not run, so none of the tests were checked. "
+            "Fix the error and submit again."
+        )
+
     total_tests = len(test_results)
     passed_tests = sum(1 for tr in test_results if tr.passed)
 
@@ -123,4 +237,17 @@ def generate_feedback(
                 feedback += f"- {tr.test_id}: {tr.error_message}\n"
         feedback += "\nYou're close! Review the failed test cases and try again."
 
+    if not passed and execution_result and execution_result.limit_hit:
+        usage = []
+        if execution_result.cpu_user is not None and execution_result.cpu_sys is not None:
+            usage.append(f"CPU time: {execution_result.cpu_user + execution_result.cpu_sys:.2f}s")
+        if execution_result.peak_rss_kb is not None:
+            usage.append(f"peak memory: {execution_result.peak_rss_kb // 1024} MB")
+        usage.append(f"output: {execution_result.bytes_written} bytes")
+        feedback += (
+            f"\n\n⏱️ Your program hit the sandbox's "
+            f"{LIMIT_DESCRIPTIONS.get(execution_result.limit_hit, execution_result.limit_hit)} "
+            f"({', '.join(usage)})."
+        )
+
     return feedback
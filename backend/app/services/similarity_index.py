@@ -0,0 +1,324 @@
+"""
+Near-duplicate submission detection (MinHash + LSH)
+
+Most attempts on a beginner exercise are close variants of a few canonical
+solutions. Each graded submission is reduced to a MinHash signature over
+token shingles; similar submissions share at least one LSH band with high
+probability, so a lookup only compares signatures that share a band.
+
+    tokens      Python tokenizer (comments and blank lines dropped), or
+                words and symbols for other languages
+    shingles    SHINGLE_SIZE consecutive tokens
+    signature   NUM_PERM minimums of universal hashes over the shingles (numpy)
+    bands       BANDS x ROWS slices of the signature, hashed to band keys
+
+With 16 bands of 8 rows, pairs at Jaccard similarity 0.9 become candidates
+with probability > 0.999, at 0.8 with ~0.95 and at 0.5 with ~0.06. Candidates are then kept
+only if their estimated similarity reaches the threshold.
+
+Signatures are persisted per exercise in the `submission_signatures`
+collection, with a multikey index on (exercise_id, bands).
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import io
+import re
+import tokenize as py_tokenize
+import zlib
+
+import numpy as np
+from bson import Binary
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from app.config import get_settings
+
+settings = get_settings()
+
+COLLECTION = "submission_signatures"
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Mersenne prime for the universal hashes; products stay below 2**62
+_PRIME = (1 << 31) - 1
+
+_WORD_OR_SYMBOL = re.compile(r"\w+|[^\w\s]")
+
+_SKIPPED_TOKENS = {
+    py_tokenize.COMMENT,
+    py_tokenize.NL,
+    py_tokenize.ENCODING,
+    py_tokenize.ENDMARKER,
+}
+
+
+def tokenize_code(code: str, language: str) -> List[str]:
+    """
+    Split code into tokens, ignoring comments and formatting
+
+    Args:
+        code: Submitted code
+        language: Programming language
+
+    Returns:
+        Token strings (indentation is kept for Python, as INDENT/DEDENT)
+    """
+    if language == "python":
+        try:
+            tokens = []
+            for token in py_tokenize.generate_tokens(io.StringIO(code).readline):
+                if token.type in _SKIPPED_TOKENS:
+                    continue
+                if token.type == py_tokenize.INDENT:
+                    tokens.append("<INDENT>")
+                elif token.type == py_tokenize.DEDENT:
+                    tokens.append("<DEDENT>")
+                elif token.type == py_tokenize.NEWLINE:
+                    tokens.append("<NEWLINE>")
+                else:
+                    tokens.append(token.string)
+            return tokens
+        except (py_tokenize.TokenError, IndentationError, SyntaxError):
+            pass
+
+    lines = (line for line in code.splitlines() if not line.lstrip().startswith(("#", "//")))
+    return _WORD_OR_SYMBOL.findall("\n".join(lines))
+
+
+class MinHasher:
+    """MinHash signatures over token shingles"""
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        """
+        Args:
+            num_perm: Hash functions (signature length)
+            shingle_size: Tokens per shingle
+            seed: Seed of the hash functions; signatures are only comparable
+                between hashers with the same seed
+        """
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def shingles(self, tokens: List[str]) -> np.ndarray:
+        """Distinct shingle hashes (uint64 below the prime)"""
+        k = min(self.shingle_size, len(tokens))
+        hashes = {
+            zlib.crc32("\x1f".join(tokens[i:i + k]).encode("utf-8")) % _PRIME
+            for i in range(len(tokens) - k + 1)
+        } if tokens else set()
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+    def signature(self, tokens: List[str]) -> np.ndarray:
+        """
+        MinHash signature of a token list
+
+        Returns:
+            uint32 array of num_perm values (all _PRIME for empty input)
+        """
+        shingles = self.shingles(tokens)
+        if shingles.size == 0:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint32)
+        hashed = (self.a * shingles[np.newaxis, :] + self.b) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray, bands: int = BANDS) -> List[str]:
+    """LSH band keys of a signature ("<band>:<hash of its rows>")"""
+    rows = len(signature) // bands
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(bands)
+    ]
+
+
+def estimate_similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """
+    Estimated Jaccard similarity of one signature against many
+
+    Args:
+        signature: (num_perm,) signature
+        others: (n, num_perm) signatures
+
+    Returns:
+        (n,) similarities in [0, 1]
+    """
+    return (others == signature[np.newaxis, :]).mean(axis=1)
+
+
+class LSHIndex:
+    """In-memory LSH index (one exercise); see SubmissionSimilarityIndex for the persisted one"""
+
+    def __init__(self, bands: int = BANDS):
+        self.bands = bands
+        self.buckets: Dict[str, List[int]] = {}
+        self.keys: List[str] = []
+        self.signatures: List[np.ndarray] = []
+
+    def add(self, key: str, signature: np.ndarray):
+        position = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(signature)
+        for band_key in band_keys(signature, self.bands):
+            self.buckets.setdefault(band_key, []).append(position)
+
+    def candidates(self, signature: np.ndarray) -> List[int]:
+        """Positions sharing at least one band with the signature"""
+        found = set()
+        for band_key in band_keys(signature, self.bands):
+            found.update(self.buckets.get(band_key, ()))
+        return list(found)
+
+    def query(self, signature: np.ndarray, threshold: float) -> List[Tuple[str, float]]:
+        """Keys with estimated similarity >= threshold, most similar first"""
+        positions = self.candidates(signature)
+        if not positions:
+            return []
+        similarities = estimate_similarity(signature, np.stack([self.signatures[p] for p in positions]))
+        matches = [
+            (self.keys[p], float(s)) for p, s in zip(positions, similarities) if s >= threshold
+        ]
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+
+# Signatures are only comparable when made by the same hash functions
+hasher = MinHasher()
+
+
+@dataclass
+class SimilarSubmission:
+    """A prior submission similar to the one looked up"""
+    attempt_id: str
+    similarity: float
+
+
+class SubmissionSimilarityIndex:
+    """Per-exercise MinHash/LSH index of graded submissions, persisted in MongoDB"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, threshold: float, max_candidates: int):
+        """
+        Args:
+            db: Database instance
+            threshold: Minimum estimated similarity of a match
+            max_candidates: Candidate signatures compared per lookup
+        """
+        self.collection = db[COLLECTION]
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+
+    def signature(self, code: str, language: str) -> np.ndarray:
+        return hasher.signature(tokenize_code(code, language))
+
+    async def add(self, exercise_id: str, attempt_id: str, code: str, language: str, passed: bool):
+        """
+        Index a graded submission
+
+        Args:
+            exercise_id: Exercise ID
+            attempt_id: Attempt whose grading can be reused
+            code: Submitted code
+            language: Programming language
+            passed: Whether the submission passed (matches are only reused
+                for submissions with the same outcome)
+        """
+        signature = self.signature(code, language)
+        try:
+            await self.collection.update_one(
+                {"attempt_id": attempt_id},
+                {
+                    "$set": {
+                        "exercise_id": exercise_id,
+                        "language": language,
+                        "passed": passed,
+                        "signature": Binary(signature.astype("<u4").tobytes()),
+                        "bands": band_keys(signature),
+                        "created_at": datetime.utcnow()
+                    }
+                },
+                upsert=True
+            )
+        except PyMongoError as e:
+            print(f"⚠️ Failed to index submission {attempt_id}: {e}")
+
+    async def find_similar(
+        self,
+        exercise_id: str,
+        code: str,
+        language: str,
+        passed: Optional[bool] = None,
+        limit: int = 5
+    ) -> List[SimilarSubmission]:
+        """
+        Find indexed submissions to the same exercise similar to code
+
+        Args:
+            exercise_id: Exercise ID
+            code: Submitted code
+            language: Programming language
+            passed: Only submissions with this outcome, if given
+            limit: Maximum matches returned
+
+        Returns:
+            Matches at or above the threshold, most similar first
+        """
+        signature = self.signature(code, language)
+        bands = band_keys(signature)
+        query = {"exercise_id": exercise_id, "language": language, "bands": {"$in": bands}}
+        if passed is not None:
+            query["passed"] = passed
+
+        # Candidates sharing the most bands are the most similar ones; keep
+        # those when a popular exercise has more than max_candidates
+        pipeline = [
+            {"$match": query},
+            {"$project": {
+                "attempt_id": 1,
+                "signature": 1,
+                "shared_bands": {"$size": {"$setIntersection": ["$bands", bands]}},
+            }},
+            {"$sort": {"shared_bands": -1, "_id": -1}},
+            {"$limit": self.max_candidates},
+        ]
+        try:
+            docs = await self.collection.aggregate(pipeline).to_list(length=self.max_candidates)
+        except PyMongoError as e:
+            print(f"⚠️ Similarity index unavailable: {e}")
+            return []
+        if not docs:
+            return []
+
+        others = np.stack([np.frombuffer(doc["signature"], dtype="<u4") for doc in docs])
+        similarities = estimate_similarity(signature, others)
+        order = np.argsort(-similarities)
+        return [
+            SimilarSubmission(attempt_id=docs[i]["attempt_id"], similarity=float(similarities[i]))
+            for i in order[:limit]
+            if similarities[i] >= self.threshold
+        ]
+
+
+def get_similarity_index(db: AsyncIOMotorDatabase) -> Optional[SubmissionSimilarityIndex]:
+    """Similarity index on the given database, or None when disabled"""
+    if not settings.SIMILARITY_INDEX_ENABLED:
+        return None
+    return SubmissionSimilarityIndex(
+        db,
+        threshold=settings.SIMILARITY_THRESHOLD,
+        max_candidates=settings.SIMILARITY_MAX_CANDIDATES,
+    )
+
+
+async def create_similarity_indexes(db: AsyncIOMotorDatabase):
+    """Indexes for the submission_signatures collection"""
+    try:
+        await db[COLLECTION].create_index([("exercise_id", 1), ("bands", 1)])
+        await db[COLLECTION].create_index("attempt_id", unique=True)
+    except PyMongoError as e:
+        print(f"⚠️ Failed to create similarity indexes: {e}")
@@ -0,0 +1,435 @@
+"""
+Exercise submission pipeline
+
+Submitting only persists the attempt (status "grading") and acknowledges it;
+everything else runs in the background:
+
+    grade       tiered grading (tiered_grading_service), retried while the
+                sandbox queue is full
+    then, concurrently:
+    rubric      Sonnet rubric review of test-graded attempts
+    feedback    weak points and stats on the user profile, then the Learning
+                Orchestrator's feedback turn in chat
+
+Each step updates the attempt and publishes an event on the submission's
+Redis channel (`submission:events:<id>`), which /result/{id}/events relays
+as Server-Sent Events; /result/{id} can be polled instead.
+
+Background tasks die with their process. A sweep (started with the app)
+marks attempts failed once they have been unfinished for longer than
+SUBMISSION_GRADING_DEADLINE, so no attempt stays "grading" forever.
+
+    graded      score, passed, test_results, feedback, graded_by, rubric_status
+    rubric      rubric_status, grading_cache, grading_breakdown, ai_comments
+    feedback    feedback_status, session_id
+    failed      error (grading did not complete)
+    done        every step has finished
+"""
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+
+from app.config import get_settings
+from app.db.redis import redis_client
+from app.sandbox.job_queue import SandboxBusyError
+from app.services.tiered_grading_service import attach_rubric_review, grade_submission
+
+settings = get_settings()
+
+CHANNEL_PREFIX = "submission:events:"
+
+# Events after which a submission's stream has nothing more to send
+FINAL_EVENTS = ("done", "failed")
+
+# Most recent exercises kept per weak point
+MAX_EXERCISES_FAILED = 20
+
+
+def submission_channel(submission_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{submission_id}"
+
+
+def submission_finished(attempt: Dict) -> bool:
+    """Whether every pipeline step has finished for an attempt document"""
+    if attempt.get("status") == "failed":
+        return True
+    return (
+        attempt.get("graded_at") is not None
+        and attempt.get("rubric_status", "completed") != "pending"
+        and attempt.get("feedback_status", "completed") != "pending"
+    )
+
+
+async def publish_event(submission_id: str, event: str, data: Dict):
+    """Publish a pipeline event to the submission's channel (best effort)"""
+    if redis_client.client is None:
+        return
+    try:
+        await redis_client.client.publish(
+            submission_channel(submission_id),
+            json.dumps({"event": event, "data": data}, default=str)
+        )
+    except RedisError as e:
+        print(f"⚠️ Failed to publish {event} for submission {submission_id}: {e}")
+
+
+async def subscribe_submission_events(redis: Redis, submission_id: str) -> PubSub:
+    """
+    Subscribe to a submission's events
+
+    Subscribe before reading the attempt so no event published in between
+    is missed.
+    """
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(submission_channel(submission_id))
+    return pubsub
+
+
+async def read_submission_events(
+    pubsub: PubSub,
+    timeout: float,
+    keepalive: float
+) -> AsyncIterator[Optional[Dict]]:
+    """
+    Yield {"event", "data"} dicts until a final event or the timeout
+
+    Yields None after `keepalive` seconds without an event, so the caller
+    can keep the connection alive. The pubsub is closed when done.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while loop.time() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=min(keepalive, max(deadline - loop.time(), 0))
+            )
+            if message is None:
+                yield None
+                continue
+            event = json.loads(message["data"])
+            yield event
+            if event["event"] in FINAL_EVENTS:
+                return
+    finally:
+        await pubsub.aclose()
+
+
+def detect_weak_points(code: str, passed: bool) -> List[str]:
+    """Topics a submission suggests the learner struggles with"""
+    weak_points = []
+    code_lower = code.lower()
+
+    if 'def ' not in code_lower and 'function ' not in code_lower:
+        weak_points.append("function_declaration")
+    if 'for ' not in code_lower and 'while ' not in code_lower:
+        weak_points.append("loops")
+    if 'if ' not in code_lower:
+        weak_points.append("conditionals")
+    if 'class ' in code_lower and 'def __init__' not in code_lower:
+        weak_points.append("class_initialization")
+    if not passed:
+        weak_points.append("algorithmic_thinking")
+
+    return weak_points
+
+
+def profile_update_ops(
+    user_id: str,
+    exercise_id: str,
+    passed: bool,
+    weak_points: List[str]
+) -> List[UpdateOne]:
+    """
+    Writes recording a graded submission on the user profile, in order
+
+    The stats upsert comes first so the profile exists for the rest. Each
+    weak point is then incremented where present, and pushed where absent
+    (the `$ne` filter makes the push a no-op when the increment matched).
+
+    Args:
+        user_id: Submitting user
+        exercise_id: Exercise ID
+        passed: Whether the submission passed
+        weak_points: Topics from detect_weak_points
+
+    Returns:
+        Operations for an ordered bulk_write on user_profiles
+    """
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"user_id": user_id},
+            {
+                "$inc": {
+                    "total_exercises_completed": 1,
+                    "total_exercises_failed": 0 if passed else 1
+                },
+                "$set": {"last_active": now}
+            },
+            upsert=True
+        )
+    ]
+
+    for wp in weak_points:
+        ops.append(UpdateOne(
+            {"user_id": user_id, "weak_points.topic": wp},
+            {
+                "$inc": {"weak_points.$.occurrences": 1},
+                "$push": {
+                    "weak_points.$.exercises_failed": {
+                        "$each": [exercise_id],
+                        "$slice": -MAX_EXERCISES_FAILED
+                    }
+                },
+                "$set": {"weak_points.$.last_seen": now}
+            }
+        ))
+        ops.append(UpdateOne(
+            {"user_id": user_id, "weak_points.topic": {"$ne": wp}},
+            {
+                "$push": {
+                    "weak_points": {
+                        "topic": wp,
+                        "description": f"Struggles with {wp.replace('_', ' ')}",
+                        "identified_at": now,
+                        "occurrences": 1,
+                        "exercises_failed": [exercise_id],
+                        "last_seen": now
+                    }
+                }
+            }
+        ))
+
+    return ops
+
+
+async def update_user_profile(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    exercise_id: str,
+    passed: bool,
+    weak_points: List[str]
+):
+    """Record a graded submission's weak points and stats on the user profile (one round trip)"""
+    await db.user_profiles.bulk_write(
+        profile_update_ops(user_id, exercise_id, passed, weak_points), ordered=True
+    )
+
+
+async def process_submission(
+    db: AsyncIOMotorDatabase,
+    submission_id: str,
+    exercise: Dict,
+    code: str,
+    language: str,
+    user_id: str
+):
+    """
+    Grade a persisted attempt and run its follow-up steps
+
+    Meant to run in the background after the submission is acknowledged.
+
+    Args:
+        db: Database instance
+        submission_id: Attempt ID (status "grading")
+        exercise: Exercise document
+        code: Submitted code
+        language: Programming language
+        user_id: Submitting user
+    """
+    print(f"🎓 Grading submission for exercise: {exercise['title']}")
+    try:
+        grading_result = await _grade(db, submission_id, exercise, code, language, user_id)
+    except BaseException as e:
+        # Cancellation (shutdown) too: the attempt must not stay "grading"
+        print(f"❌ Grading failed for submission {submission_id}: {e!r}")
+        error = "The sandbox is busy, please submit again" if isinstance(e, SandboxBusyError) else "Grading failed"
+        await _fail(db, submission_id, error)
+        if not isinstance(e, Exception):
+            raise
+        return
+
+    score = grading_result["score"]
+    passed = grading_result["passed"]
+    print(f"📊 Score: {score}/100 ({'PASSED' if passed else 'NEEDS WORK'}, graded by {grading_result['graded_by']})")
+
+    await db.exercise_attempts.update_one({"_id": ObjectId(submission_id)}, {"$set": {"status": "graded"}})
+    await publish_event(submission_id, "graded", grading_result)
+
+    test_results = {
+        "score": score,
+        "passed": passed,
+        "test_results": grading_result["test_results"]
+    }
+
+    steps = [_send_feedback(db, submission_id, exercise["exercise_id"], code, test_results, user_id)]
+    if grading_result["rubric_status"] == "pending":
+        steps.append(_review(db, submission_id, exercise, code, language, passed, user_id))
+    await asyncio.gather(*steps)
+
+    await publish_event(submission_id, "done", {"submission_id": submission_id})
+
+
+async def _fail(db: AsyncIOMotorDatabase, submission_id: str, error: str, query: Optional[Dict] = None) -> bool:
+    """
+    Mark an attempt failed and publish its "failed" event
+
+    Args:
+        query: Extra conditions the attempt must still meet
+
+    Returns:
+        Whether the attempt was updated
+    """
+    result = await db.exercise_attempts.update_one(
+        {"_id": ObjectId(submission_id), **(query or {})},
+        {"$set": {"status": "failed", "feedback_status": "skipped", "error": error}}
+    )
+    if result.modified_count:
+        await publish_event(submission_id, "failed", {"error": error})
+    return bool(result.modified_count)
+
+
+async def fail_stale_submissions(db: AsyncIOMotorDatabase) -> int:
+    """
+    Finish attempts whose pipeline died with its process
+
+    Attempts still ungraded after SUBMISSION_GRADING_DEADLINE are marked
+    failed; graded ones whose rubric review or feedback is still pending get
+    that step marked failed. The updates are conditional, so several API
+    processes can sweep at once.
+
+    Returns:
+        Number of attempts marked failed
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.SUBMISSION_GRADING_DEADLINE)
+    stale = {"status": "grading", "graded_at": None, "submitted_at": {"$lt": cutoff}}
+
+    failed = 0
+    async for attempt in db.exercise_attempts.find(stale, {"_id": 1}):
+        if await _fail(db, str(attempt["_id"]), "Grading did not complete, please submit again", stale):
+            failed += 1
+
+    for step in ("rubric_status", "feedback_status"):
+        await db.exercise_attempts.update_many(
+            {step: "pending", "submitted_at": {"$lt": cutoff}},
+            {"$set": {step: "failed"}}
+        )
+
+    if failed:
+        print(f"🧹 Marked {failed} stale submissions failed")
+    return failed
+
+
+async def sweep_stale_submissions(db: AsyncIOMotorDatabase):
+    """Run fail_stale_submissions now and then every half deadline, until cancelled"""
+    while True:
+        try:
+            await fail_stale_submissions(db)
+        except PyMongoError as e:
+            print(f"⚠️ Stale submission sweep failed: {e}")
+        await asyncio.sleep(settings.SUBMISSION_GRADING_DEADLINE / 2)
+
+
+async def create_submission_indexes(db: AsyncIOMotorDatabase):
+    """Indexes for the stale submission sweep on exercise_attempts"""
+    try:
+        for field in ("status", "rubric_status", "feedback_status"):
+            await db.exercise_attempts.create_index([(field, 1), ("submitted_at", 1)])
+    except PyMongoError as e:
+        print(f"⚠️ Failed to create submission indexes: {e}")
+
+
+async def _grade(
+    db: AsyncIOMotorDatabase,
+    submission_id: str,
+    exercise: Dict,
+    code: str,
+    language: str,
+    user_id: str
+) -> Dict:
+    """grade_submission, waiting out a full sandbox queue a few times"""
+    for retry in range(settings.SUBMISSION_BUSY_RETRIES + 1):
+        try:
+            return await grade_submission(db, submission_id, exercise, code, language, user_id=user_id)
+        except SandboxBusyError as e:
+            if retry == settings.SUBMISSION_BUSY_RETRIES:
+                raise
+            print(f"⏳ Sandbox busy, retrying submission {submission_id} in {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+
+
+async def _review(
+    db: AsyncIOMotorDatabase,
+    submission_id: str,
+    exercise: Dict,
+    code: str,
+    language: str,
+    passed: bool,
+    user_id: str
+):
+    """Sonnet rubric review step"""
+    try:
+        await attach_rubric_review(db, submission_id, exercise, code, language, passed, user_id)
+    except Exception as e:
+        print(f"⚠️ Rubric review failed for submission {submission_id}: {e}")
+        await db.exercise_attempts.update_one(
+            {"_id": ObjectId(submission_id)}, {"$set": {"rubric_status": "failed"}}
+        )
+
+    attempt = await db.exercise_attempts.find_one(
+        {"_id": ObjectId(submission_id)},
+        {"rubric_status": 1, "grading_cache": 1, "grading_breakdown": 1, "ai_comments": 1}
+    )
+    await publish_event(submission_id, "rubric", {
+        "rubric_status": attempt.get("rubric_status"),
+        "grading_cache": attempt.get("grading_cache"),
+        "grading_breakdown": attempt.get("grading_breakdown"),
+        "ai_comments": attempt.get("ai_comments")
+    })
+
+
+async def _send_feedback(
+    db: AsyncIOMotorDatabase,
+    submission_id: str,
+    exercise_id: str,
+    code: str,
+    test_results: Dict,
+    user_id: str
+):
+    """Profile update, then the Learning Orchestrator's feedback turn in chat"""
+    from app.ai.agents.learning_orchestrator import LearningOrchestrator
+
+    weak_points = detect_weak_points(code, test_results["passed"])
+    session_id = None
+    try:
+        # Before the orchestrator turn, whose context includes the profile
+        await update_user_profile(db, user_id, exercise_id, test_results["passed"], weak_points)
+        response = await LearningOrchestrator(db).handle_exercise_submission(
+            user_id=user_id,
+            exercise_id=exercise_id,
+            code=code,
+            test_results=test_results
+        )
+        session_id = response.get("session_id")
+        feedback_status = "failed" if response.get("error") else "completed"
+        print(f"✅ Sent submission to AI orchestrator for interactive feedback")
+        if weak_points:
+            print(f"📊 Identified weak points: {', '.join(weak_points)}")
+    except Exception as e:
+        print(f"⚠️ AI orchestrator feedback failed: {e}")
+        feedback_status = "failed"
+
+    await db.exercise_attempts.update_one(
+        {"_id": ObjectId(submission_id)}, {"$set": {"feedback_status": feedback_status}}
+    )
+    await publish_event(submission_id, "feedback", {"feedback_status": feedback_status, "session_id": session_id})
@@ -0,0 +1,208 @@
+"""
+Tiered exercise grading
+
+Tier 1: the exercise's test cases run in the sandbox (grading_service). When
+they are conclusive, their score is the grade and the learner gets it at
+sandbox latency.
+
+Tier 2: Claude Sonnet (ai_grading_service). With conclusive tests it only
+adds the rubric review (quality breakdown, strengths, improvements), in the
+background, attached to the attempt once ready. Without them (no test
+cases or only placeholder ones, a language the sandbox does not run, or a
+sandbox failure) Sonnet grades the submission itself, as before.
+
+Sonnet grades go through the grade cache (grade_cache.py); attempts record
+the cache outcome in `grading_cache`. Rubric reviews are also reused from
+near-duplicate submissions with the same test outcome (similarity_index.py,
+`grading_cache: "similar"` plus `similar_to`).
+"""
+from datetime import datetime
+from typing import Dict, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.config import get_settings
+from app.db.redis import redis_client
+from app.models.exercise import ExecutionResult
+from app.sandbox.validators.test_validator import has_checking_tests
+from app.services.grade_cache import get_grade_cache, grade_with_cache
+from app.services.grading_service import grade_exercise as run_tests
+from app.services.similarity_index import get_similarity_index
+
+settings = get_settings()
+
+
+def tests_are_conclusive(result: Dict) -> bool:
+    """
+    Whether a sandbox grading result reflects the code rather than the sandbox
+
+    Infrastructure failures (sandbox unavailable or busy, runner not
+    responding) report no execution time; syntax errors are caught before
+    running and are conclusive.
+    """
+    if result.get("error") or not result.get("test_results"):
+        return False
+    execution: ExecutionResult = result["execution_result"]
+    return execution.syntax_error is not None or execution.execution_time > 0
+
+
+async def grade_submission(
+    db: AsyncIOMotorDatabase,
+    submission_id: str,
+    exercise: Dict,
+    code: str,
+    language: str,
+    user_id: Optional[str] = None
+) -> Dict:
+    """
+    Grade a submission with tests where possible, Sonnet otherwise
+
+    The attempt document must already exist; it is updated with the grade.
+
+    Args:
+        db: Database instance
+        submission_id: Attempt ID
+        exercise: Exercise document
+        code: Submitted code
+        language: Programming language
+        user_id: Submitting user
+
+    Returns:
+        Dict with score, passed, test_results (dicts), feedback, graded_by
+        and rubric_status ("pending" when the rubric review still has to run
+        via attach_rubric_review, "completed" when Sonnet graded directly)
+    """
+    # Placeholder tests (no expected output, no real validation script) pass
+    # any code that runs, so they cannot grade on their own
+    if has_checking_tests(exercise.get("test_cases") or []) and language in settings.SANDBOX_LANGUAGE_CONCURRENCY:
+        result = await run_tests(
+            db, submission_id, exercise["exercise_id"], code, language, user_id, exercise=exercise
+        )
+        if tests_are_conclusive(result):
+            await db.exercise_attempts.update_one(
+                {"_id": ObjectId(submission_id)},
+                {"$set": {"graded_by": "tests", "rubric_status": "pending"}}
+            )
+            return {
+                "score": result["score"],
+                "passed": result["passed"],
+                "test_results": [tr.dict() for tr in result["test_results"]],
+                "feedback": result["feedback"],
+                "graded_by": "tests",
+                "rubric_status": "pending"
+            }
+        print(f"⚠️ Tests inconclusive for {exercise['exercise_id']}, grading with Sonnet")
+
+    grading_result, cache_outcome = await grade_with_cache(
+        get_grade_cache(db, redis_client.client), exercise, code, language, user_id
+    )
+    test_results = [{
+        "test_id": "ai_assessment",
+        "passed": grading_result["passed"],
+        "error_message": "" if grading_result["passed"] else "Code needs improvement"
+    }]
+
+    await db.exercise_attempts.update_one(
+        {"_id": ObjectId(submission_id)},
+        {
+            "$set": {
+                "execution_result": {"status": "ai_graded", "grader": grading_result.get("graded_by", "ai_sonnet")},
+                "test_results": test_results,
+                "score": grading_result["score"],
+                "feedback": grading_result["feedback"]["summary"],
+                **_rubric_fields(grading_result),
+                "graded_by": grading_result.get("graded_by", "ai_sonnet"),
+                "rubric_status": "completed",
+                "grading_cache": cache_outcome,
+                "graded_at": datetime.utcnow()
+            }
+        }
+    )
+
+    return {
+        "score": grading_result["score"],
+        "passed": grading_result["passed"],
+        "test_results": test_results,
+        "feedback": grading_result["feedback"]["summary"],
+        "graded_by": grading_result.get("graded_by", "ai_sonnet"),
+        "rubric_status": "completed"
+    }
+
+
+async def attach_rubric_review(
+    db: AsyncIOMotorDatabase,
+    submission_id: str,
+    exercise: Dict,
+    code: str,
+    language: str,
+    passed: bool,
+    user_id: Optional[str] = None
+):
+    """
+    Run the Sonnet rubric review for a test-graded attempt and attach it
+
+    Meant to run in the background; the attempt's score is not changed. A
+    near-duplicate submission's review is reused when there is one.
+    """
+    exercise_id = exercise["exercise_id"]
+    similarity_index = get_similarity_index(db)
+
+    if similarity_index is not None:
+        for match in await similarity_index.find_similar(exercise_id, code, language, passed=passed):
+            similar = await db.exercise_attempts.find_one(
+                {"_id": ObjectId(match.attempt_id), "rubric_status": "completed"},
+                {"ai_comments": 1, "grading_breakdown": 1}
+            )
+            if similar is None:
+                continue
+            await db.exercise_attempts.update_one(
+                {"_id": ObjectId(submission_id)},
+                {
+                    "$set": {
+                        # Specific issues point at the other learner's lines and names
+                        "ai_comments": {**similar["ai_comments"], "specific_issues": []},
+                        "grading_breakdown": similar["grading_breakdown"],
+                        "rubric_status": "completed",
+                        "grading_cache": "similar",
+                        "similar_to": {"attempt_id": match.attempt_id, "similarity": match.similarity},
+                        "rubric_graded_at": datetime.utcnow()
+                    }
+                }
+            )
+            print(f"✅ Rubric review reused for submission {submission_id} ({match.similarity:.2f} similar)")
+            return
+
+    review, cache_outcome = await grade_with_cache(
+        get_grade_cache(db, redis_client.client), exercise, code, language, user_id
+    )
+
+    if review.get("graded_by") != "ai_sonnet":
+        # Heuristic fallback: nothing worth attaching
+        update = {"rubric_status": "failed"}
+    else:
+        update = {
+            **_rubric_fields(review),
+            "rubric_status": "completed",
+            "grading_cache": cache_outcome,
+            "rubric_graded_at": datetime.utcnow()
+        }
+
+    await db.exercise_attempts.update_one({"_id": ObjectId(submission_id)}, {"$set": update})
+    print(f"✅ Rubric review {update['rubric_status']} for submission {submission_id}")
+
+    # Fresh reviews only, so reuse never chains from one near-duplicate to the next
+    if similarity_index is not None and update["rubric_status"] == "completed" and cache_outcome in ("miss", "bypass"):
+        await similarity_index.add(exercise_id, submission_id, code, language, passed)
+
+
+def _rubric_fields(grading_result: Dict) -> Dict:
+    """Attempt fields holding Sonnet's rubric review"""
+    return {
+        "ai_comments": {
+            "summary": grading_result["feedback"]["summary"],
+            "strengths": grading_result["feedback"]["strengths"],
+            "improvements": grading_result["feedback"]["improvements"],
+            "specific_issues": grading_result["feedback"].get("specific_issues", []),
+            "next_steps": grading_result["next_steps"]
+        },
+        "grading_breakdown": grading_result["breakdown"]
+    }
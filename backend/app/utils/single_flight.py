@@ -0,0 +1,128 @@
+"""
+Request coalescing (single-flight) backed by Redis
+
+Identical concurrent requests (double-clicks, frontend retries) share one
+execution: the first request to take the Redis lock runs the work and
+publishes its JSON result; followers, in any uvicorn worker, wait for that
+result instead of running their own LLM loop.
+"""
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+
+# Delete the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_message(text: Optional[str]) -> str:
+    """Normalize user text so trivially different copies share a key"""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def flight_key(*parts: Any) -> str:
+    """Build a single-flight key from request parts (user, session, message...)"""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8"))
+    return f"singleflight:{digest.hexdigest()}"
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls across processes"""
+
+    def __init__(
+        self,
+        redis: Optional[Redis],
+        lock_ttl: float = 180.0,
+        result_ttl: int = 5,
+        poll_interval: float = 0.05,
+    ):
+        """
+        Args:
+            redis: Redis client (None disables coalescing)
+            lock_ttl: Seconds before a crashed leader's lock expires
+            result_ttl: Seconds a finished result stays available to followers
+            poll_interval: Seconds between follower checks for the result
+        """
+        self.redis = redis
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        The leader's return value must be JSON serializable; followers receive
+        the decoded JSON. If the leader fails, waiting followers retry and one
+        of them becomes the new leader. When Redis is unavailable, callers run
+        fn uncoalesced.
+        """
+        if self.redis is None:
+            return await fn()
+
+        lock_key = f"{key}:lock"
+        result_key = f"{key}:result"
+        deadline = time.monotonic() + self.lock_ttl
+
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                cached = await self.redis.get(result_key)
+                if cached is not None:
+                    print(f"🔁 Coalesced duplicate request ({key[-12:]})")
+                    return json.loads(cached)
+                leader = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            except RedisError as e:
+                print(f"⚠️ Single-flight unavailable, running uncoalesced: {e}")
+                return await fn()
+
+            if leader:
+                try:
+                    result = await fn()
+                    # Stored before the lock is released, so followers find it;
+                    # best effort, a failed store must not lose the result
+                    try:
+                        await self.redis.set(
+                            result_key, json.dumps(result, default=str), ex=self.result_ttl
+                        )
+                    except RedisError as e:
+                        print(f"⚠️ Failed to share coalesced result: {e}")
+                    return result
+                finally:
+                    await self._release(lock_key, token)
+
+            # Follower: wait until the leader publishes a result or gives up the lock
+            try:
+                while await self.redis.exists(lock_key) and not await self.redis.exists(result_key):
+                    if time.monotonic() > deadline:
+                        return await fn()
+                    await asyncio.sleep(self.poll_interval)
+            except RedisError as e:
+                print(f"⚠️ Single-flight unavailable, running uncoalesced: {e}")
+                return await fn()
+
+    async def _release(self, lock_key: str, token: str):
+        """Delete the lock if we still own it (it expires on its own otherwise)"""
+        try:
+            await self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+        except RedisError as e:
+            print(f"⚠️ Failed to release single-flight lock: {e}")
+
+
+async def coalesce(
+    redis: Optional[Redis],
+    key_parts: Iterable[Any],
+    fn: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Convenience wrapper: run fn under a single-flight key built from key_parts"""
+    return await SingleFlight(redis).run(flight_key(*key_parts), fn)
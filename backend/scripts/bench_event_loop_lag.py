@@ -0,0 +1,94 @@
+"""
+Event loop lag under concurrent sandbox submissions
+
+Runs N submissions concurrently while a ticker task measures how late the
+event loop wakes it up (every 10 ms). Compares:
+
+    blocking  subprocess.run called from async code (the old sandbox path)
+    async     SubprocessSandbox.execute_code_async
+
+With blocking runs the loop is frozen for the whole run of each submission,
+so every other request in the worker stalls; with async runs the lag stays
+near zero.
+
+Usage (from backend/):
+    python -m scripts.bench_event_loop_lag --concurrency 8 --work 0.5
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from app.sandbox.subprocess_runner import sandbox
+
+TICK = 0.01
+
+
+def submission_code(work: float) -> str:
+    """CPU-bound student-like code that runs for about `work` seconds"""
+    return (
+        "import time\n"
+        f"end = time.time() + {work}\n"
+        "n = 0\n"
+        "while time.time() < end:\n"
+        "    n += 1\n"
+        "print(n)\n"
+    )
+
+
+async def run_blocking(code: str, timeout: int):
+    """Old behaviour: blocking subprocess.run inside a coroutine"""
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
+        f.write(code)
+    try:
+        subprocess.run(["python3", f.name], capture_output=True, timeout=timeout, text=True)
+    finally:
+        os.unlink(f.name)
+
+
+async def run_async(code: str, timeout: int):
+    await sandbox.execute_code_async(code, "python", timeout)
+
+
+async def measure(runner, concurrency: int, work: float, timeout: int):
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 5)
+
+    code = submission_code(work)
+    started = time.perf_counter()
+    await asyncio.gather(*(runner(code, timeout) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await tick_task
+    return elapsed, np.array(lags) * 1000
+
+
+async def main(args):
+    print(f"{args.concurrency} concurrent submissions of ~{args.work}s each\n")
+    print(f"{'mode':<10} {'wall s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for name, runner in (("blocking", run_blocking), ("async", run_async)):
+        elapsed, lags = await measure(runner, args.concurrency, args.work, args.timeout)
+        p50, p99 = np.percentile(lags, [50, 99])
+        print(f"{name:<10} {elapsed:>8.2f} {p50:>11.1f} {p99:>11.1f} {lags.max():>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--work", type=float, default=0.5, help="Seconds of CPU work per submission")
+    parser.add_argument("--timeout", type=int, default=30)
+    asyncio.run(main(parser.parse_args()))
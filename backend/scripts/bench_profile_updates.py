@@ -0,0 +1,129 @@
+"""
+MongoDB round trips and latency of the per-submission profile update
+
+    sequential  an update_one per weak point, a second upserting update_one
+                for each new one, then the stats update (the previous code)
+    bulk        one ordered bulk_write (submission_pipeline.update_user_profile)
+
+Replays --submissions submissions from --users users against MONGODB_URL,
+in a scratch database that is dropped afterwards. Round trips are counted
+with a pymongo CommandListener.
+
+Usage (from backend/):
+    python -m scripts.bench_profile_updates --submissions 500
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.config import get_settings
+from app.services.submission_pipeline import update_user_profile
+
+TOPICS = ["function_declaration", "loops", "conditionals", "class_initialization", "algorithmic_thinking"]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server, by name"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def started(self, event):
+        self.counts[event.command_name] = self.counts.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def update_sequential(db, user_id, exercise_id, passed, weak_points):
+    for wp in weak_points:
+        result = await db.user_profiles.update_one(
+            {"user_id": user_id, "weak_points.topic": wp},
+            {
+                "$inc": {"weak_points.$.occurrences": 1},
+                "$push": {"weak_points.$.exercises_failed": exercise_id},
+                "$set": {"weak_points.$.last_seen": datetime.utcnow()}
+            }
+        )
+        if result.matched_count == 0:
+            await db.user_profiles.update_one(
+                {"user_id": user_id},
+                {
+                    "$push": {
+                        "weak_points": {
+                            "topic": wp,
+                            "description": f"Struggles with {wp.replace('_', ' ')}",
+                            "identified_at": datetime.utcnow(),
+                            "occurrences": 1,
+                            "exercises_failed": [exercise_id],
+                            "last_seen": datetime.utcnow()
+                        }
+                    }
+                },
+                upsert=True
+            )
+
+    await db.user_profiles.update_one(
+        {"user_id": user_id},
+        {
+            "$inc": {"total_exercises_completed": 1, "total_exercises_failed": 0 if passed else 1},
+            "$set": {"last_active": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+
+async def main(args):
+    settings = get_settings()
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[counter])
+    db = client[f"{settings.MONGODB_DB_NAME}_bench_profile"]
+
+    rng = random.Random(args.seed)
+    submissions = [
+        (
+            f"user-{rng.randrange(args.users)}",
+            f"exercise-{rng.randrange(50)}",
+            rng.random() < 0.6,
+            rng.sample(TOPICS, rng.randint(0, len(TOPICS))),
+        )
+        for _ in range(args.submissions)
+    ]
+
+    print(f"{args.submissions} submissions from {args.users} users\n")
+    print(f"{'mode':<11} {'trips/sub':>9} {'max':>5} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    try:
+        for mode, update in (("sequential", update_sequential), ("bulk", update_user_profile)):
+            await db.user_profiles.drop()
+            await db.user_profiles.create_index("user_id", unique=True)
+
+            latencies, trips = [], []
+            for user_id, exercise_id, passed, weak_points in submissions:
+                counter.counts.clear()
+                started = time.perf_counter()
+                await update(db, user_id, exercise_id, passed, weak_points)
+                latencies.append((time.perf_counter() - started) * 1000)
+                trips.append(sum(counter.counts.values()))
+
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"{mode:<11} {np.mean(trips):>9.2f} {max(trips):>5} {p50:>8.2f} {p95:>8.2f} {np.mean(latencies):>8.2f}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=500)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
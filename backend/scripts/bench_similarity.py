@@ -0,0 +1,127 @@
+"""
+Near-duplicate detection (MinHash + LSH) on a synthetic submission corpus
+
+Builds --size submissions spread over --exercises exercises, each a mutated
+variant of one of a few canonical solutions (renamed variables, changed
+constants, added comments and blank lines, extra statements), then:
+
+    - signature throughput (tokenize + MinHash)
+    - replay time and LSH lookup latency (per-exercise indexes)
+    - recall / precision of the LSH lookup against brute-force exact
+      Jaccard similarity of the shingle sets, on --sample queries
+    - grading calls saved: submissions replayed in order, each either
+      reusing a prior review (match at --threshold) or needing a new one
+
+Usage (from backend/):
+    python -m scripts.bench_similarity --size 100000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.similarity_index import LSHIndex, MinHasher, tokenize_code
+
+CANONICAL = [
+    "def {f}({a}):\n    {t} = 0\n    for {i} in {a}:\n        {t} += {i}\n    return {t}\n\nprint({f}([{n}, 2, 3]))\n",
+    "def {f}({a}):\n    return sum({a})\n\nprint({f}([{n}, 2, 3]))\n",
+    "def {f}({a}):\n    {t} = 0\n    {i} = 0\n    while {i} < len({a}):\n        {t} = {t} + {a}[{i}]\n        {i} += 1\n    return {t}\n\nprint({f}([{n}, 2, 3]))\n",
+    "def {f}({a}):\n    if not {a}:\n        return 0\n    return {a}[0] + {f}({a}[1:])\n\nprint({f}([{n}, 2, 3]))\n",
+    "from functools import reduce\n\ndef {f}({a}):\n    return reduce(lambda {t}, {i}: {t} + {i}, {a}, 0)\n\nprint({f}([{n}, 2, 3]))\n",
+    "def {f}({a}):\n    {t} = {{}}\n    for {i} in {a}:\n        {t}[{i}] = {t}.get({i}, 0) + 1\n    return max({t}, key={t}.get)\n\nprint({f}([{n}, 2, 2]))\n",
+]
+
+NAMES = {
+    "f": ["total", "sum_list", "add_all", "list_sum", "compute", "solve"],
+    "a": ["numbers", "nums", "items", "values", "lst", "data", "arr"],
+    "t": ["total", "result", "acc", "s", "count", "answer"],
+    "i": ["n", "x", "item", "value", "num", "v"],
+}
+
+COMMENTS = ["# compute the result", "# loop over the list", "# TODO: tidy up", "# my solution"]
+EXTRA = ["print('done')", "assert True", "pass", "x = 1"]
+
+
+def make_submission(rng: random.Random) -> str:
+    template = rng.choice(CANONICAL)
+    code = template.format(n=rng.randint(1, 9), **{key: rng.choice(values) for key, values in NAMES.items()})
+    lines = code.splitlines()
+    for _ in range(rng.randint(0, 2)):
+        lines.insert(rng.randint(0, len(lines)), rng.choice(COMMENTS))
+    if rng.random() < 0.3:
+        lines.append(rng.choice(EXTRA))
+    if rng.random() < 0.3:
+        lines.insert(rng.randint(0, len(lines)), "")
+    return "\n".join(lines) + "\n"
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    hasher = MinHasher()
+
+    corpus = [(rng.randrange(args.exercises), make_submission(rng)) for _ in range(args.size)]
+    print(f"{args.size} submissions over {args.exercises} exercises, threshold {args.threshold}\n")
+
+    started = time.perf_counter()
+    tokens = [tokenize_code(code, "python") for _, code in corpus]
+    signatures = [hasher.signature(t) for t in tokens]
+    elapsed = time.perf_counter() - started
+    print(f"signatures      {elapsed:6.2f}s  ({elapsed / args.size * 1e6:.0f} µs per submission)")
+
+    # Replay in submission order: reuse a match if there is one, else grade and index
+    indexes = {exercise: LSHIndex() for exercise in range(args.exercises)}
+    latencies = []
+    reused = 0
+    started = time.perf_counter()
+    for position, ((exercise, _), signature) in enumerate(zip(corpus, signatures)):
+        lookup_started = time.perf_counter()
+        matches = indexes[exercise].query(signature, args.threshold)
+        latencies.append((time.perf_counter() - lookup_started) * 1e6)
+        if matches:
+            reused += 1
+        else:
+            indexes[exercise].add(str(position), signature)
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    indexed = sum(len(index.keys) for index in indexes.values())
+    print(f"replay          {elapsed:6.2f}s  lookup p50 {p50:.0f} µs, p95 {p95:.0f} µs, p99 {p99:.0f} µs")
+    print(f"grading calls   {indexed} of {args.size} ({reused / args.size:.1%} served by a near-duplicate)")
+
+    # Accuracy against exact Jaccard over everything indexed for the exercise
+    full = {exercise: LSHIndex() for exercise in range(args.exercises)}
+    shingle_sets = [set(hasher.shingles(t).tolist()) for t in tokens]
+    for position, ((exercise, _), signature) in enumerate(zip(corpus, signatures)):
+        full[exercise].add(str(position), signature)
+
+    found = relevant = true_positives = 0
+    for position in rng.sample(range(args.size), args.sample):
+        exercise = corpus[position][0]
+        predicted = {
+            int(key) for key, _ in full[exercise].query(signatures[position], args.threshold)
+        } - {position}
+        actual = {
+            int(key) for key in full[exercise].keys
+            if int(key) != position and jaccard(shingle_sets[position], shingle_sets[int(key)]) >= args.threshold
+        }
+        found += len(predicted)
+        relevant += len(actual)
+        true_positives += len(predicted & actual)
+    print(
+        f"accuracy        recall {true_positives / max(relevant, 1):.3f}, "
+        f"precision {true_positives / max(found, 1):.3f} ({args.sample} queries vs exact Jaccard)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--exercises", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
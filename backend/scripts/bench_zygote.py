@@ -0,0 +1,73 @@
+"""
+Cold vs warm startup latency of the subprocess sandbox
+
+    cold  a fresh `python3` per run (SubprocessSandbox default)
+    warm  a child forked from the preloaded zygote (SANDBOX_ZYGOTE_ENABLED)
+
+Runs typical beginner snippets sequentially and reports end-to-end latency
+per run, as seen by the API process.
+
+Usage (from backend/):
+    python -m scripts.bench_zygote --runs 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.sandbox.subprocess_runner import sandbox
+from app.sandbox.zygote import ZygoteClient
+
+SNIPPETS = {
+    "hello": "print('Hello, World!')\n",
+    "loop": "total = 0\nfor i in range(1000):\n    total += i\nprint(total)\n",
+    "imports": (
+        "import json, re, collections, datetime\n"
+        "counts = collections.Counter(re.findall(r'\\w+', 'a b a c'))\n"
+        "print(json.dumps(counts), datetime.date(2024, 1, 1))\n"
+    ),
+}
+
+
+async def run_cold(code: str):
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
+        f.write(code)
+    try:
+        result = await sandbox._run_process(["python3", f.name], 10)
+    finally:
+        os.unlink(f.name)
+    assert result["exit_code"] == 0, result["stderr"]
+
+
+async def main(args):
+    zygote = ZygoteClient(os.path.join(tempfile.gettempdir(), f"bench-zygote-{os.getpid()}.sock"))
+    await zygote.start()
+
+    async def run_warm(code: str):
+        result = await zygote.execute(code, 10)
+        assert result["exit_code"] == 0, result["stderr"]
+
+    print(f"{args.runs} sequential runs per snippet\n")
+    print(f"{'snippet':<10} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    try:
+        for name, code in SNIPPETS.items():
+            for mode, runner in (("cold", run_cold), ("warm", run_warm)):
+                await runner(code)  # Warm-up
+                latencies = []
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    await runner(code)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                p50, p95 = np.percentile(latencies, [50, 95])
+                print(f"{name:<10} {mode:<6} {p50:>8.1f} {p95:>8.1f} {np.mean(latencies):>8.1f}")
+    finally:
+        await zygote.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
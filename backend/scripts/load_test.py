@@ -0,0 +1,215 @@
+"""
+Load generator for the chat, exercise submission and learning session APIs
+
+Sends requests at a target rate (open loop: arrivals do not wait for earlier
+responses) from a pool of test users, then reports per-scenario latency
+percentiles, error counts and throughput.
+
+Run against an API whose ANTHROPIC_BASE_URL points at the mock server so
+runs are free and repeatable:
+
+    python -m scripts.mock_anthropic_server --port 8100 &
+    ANTHROPIC_BASE_URL=http://localhost:8100 uvicorn app.main:app --port 8000 &
+    python -m scripts.load_test --rps 10 --duration 60 --users 20 \\
+        --exercise-id ex_123 --node-id node_abc --mix chat=6,submit=2,session=2
+
+Scenarios:
+    chat     POST /v1/chat/message
+    submit   POST /v1/exercises/{exercise_id}/submit    (needs --exercise-id)
+    session  POST /v1/learning-session/start/{node_id}, then /continue
+             (needs --node-id)
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+CHAT_MESSAGES = [
+    "What is a list comprehension?",
+    "Why does my loop never stop?",
+    "Can you give me a practice exercise on dictionaries?",
+    "Explain the difference between a tuple and a list",
+    "Quiz me on functions",
+    "How do I read a file line by line in Python?",
+    "Next exercise please",
+    "I get a KeyError when I access my dict, what does it mean?",
+]
+
+SUBMISSIONS = [
+    "def add(a, b):\n    return a + b\n",
+    "def fizzbuzz(n):\n    for i in range(1, n + 1):\n        print(i)\n",
+    "numbers = [1, 2, 3]\nprint(sum(numbers))\n",
+]
+
+
+class Recorder:
+    """Collects request latencies and outcomes per scenario"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, scenario: str, latency: float, status: str):
+        self.latencies[scenario].append(latency)
+        self.statuses[scenario][status] += 1
+
+    def report(self, elapsed: float):
+        print(f"\n{'scenario':<10} {'count':>6} {'ok':>6} {'err':>5} {'rps':>7} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for scenario in sorted(self.latencies):
+            latencies = np.array(self.latencies[scenario]) * 1000
+            statuses = self.statuses[scenario]
+            ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(
+                f"{scenario:<10} {len(latencies):>6} {ok:>6} {len(latencies) - ok:>5} "
+                f"{ok / elapsed:>7.2f} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f} {latencies.max():>8.0f}"
+            )
+        for scenario in sorted(self.statuses):
+            print(f"  {scenario} statuses: {dict(self.statuses[scenario])}")
+
+
+async def login_users(client: httpx.AsyncClient, count: int, password: str) -> List[str]:
+    """Register (if needed) and log in the test users, returning their tokens"""
+    tokens = []
+    for i in range(count):
+        email = f"loadtest{i}@example.com"
+        await client.post("/v1/auth/register", json={
+            "email": email, "full_name": f"Load Test {i}", "password": password,
+        })
+        response = await client.post("/v1/auth/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+class Scenarios:
+    """One function per scenario; each returns the HTTP status it ended with"""
+
+    def __init__(self, client: httpx.AsyncClient, exercise_id: Optional[str], node_id: Optional[str]):
+        self.client = client
+        self.exercise_id = exercise_id
+        self.node_id = node_id
+
+    async def chat(self, headers: Dict) -> int:
+        response = await self.client.post("/v1/chat/message", headers=headers, json={
+            "message": random.choice(CHAT_MESSAGES),
+            "context_type": "general",
+        })
+        return response.status_code
+
+    async def submit(self, headers: Dict) -> int:
+        response = await self.client.post(
+            f"/v1/exercises/{self.exercise_id}/submit",
+            headers=headers,
+            json={"code": random.choice(SUBMISSIONS), "language": "python"},
+        )
+        return response.status_code
+
+    async def session(self, headers: Dict) -> int:
+        response = await self.client.post(
+            f"/v1/learning-session/start/{self.node_id}", headers=headers
+        )
+        if response.status_code != 200:
+            return response.status_code
+        response = await self.client.post("/v1/learning-session/continue", headers=headers, json={
+            "session_id": response.json()["session_id"],
+            "message": random.choice(CHAT_MESSAGES),
+        })
+        return response.status_code
+
+
+def parse_mix(spec: str, scenarios: Scenarios) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name == "submit" and not scenarios.exercise_id:
+            print("⚠️ Skipping submit scenario: no --exercise-id")
+            continue
+        if name == "session" and not scenarios.node_id:
+            print("⚠️ Skipping session scenario: no --node-id")
+            continue
+        mix[name] = float(weight or 1)
+    if not mix:
+        raise SystemExit("No runnable scenarios in --mix")
+    return mix
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = await login_users(client, args.users, args.password)
+        scenarios = Scenarios(client, args.exercise_id, args.node_id)
+        mix = parse_mix(args.mix, scenarios)
+        names, weights = list(mix), list(mix.values())
+
+        recorder = Recorder()
+        in_flight = asyncio.Semaphore(args.max_in_flight)
+        tasks = set()
+        dropped = 0
+
+        async def fire(name: str, token: str):
+            started = time.perf_counter()
+            try:
+                status = str(await getattr(scenarios, name)({"Authorization": f"Bearer {token}"}))
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            finally:
+                in_flight.release()
+            recorder.record(name, time.perf_counter() - started, status)
+
+        print(f"🚀 {args.rps} req/s for {args.duration}s, {args.users} users, mix={mix}")
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < args.duration:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if in_flight.locked():
+                dropped += 1  # Client-side cap reached: count instead of queueing
+            else:
+                await in_flight.acquire()
+                name = random.choices(names, weights)[0]
+                task = asyncio.create_task(fire(name, random.choice(tokens)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            gap = random.expovariate(args.rps) if args.poisson else 1.0 / args.rps
+            next_at += gap
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    recorder.report(elapsed)
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    print(f"\nSent {total} requests in {elapsed:.1f}s ({total / elapsed:.2f} req/s), "
+          f"dropped {dropped} at the client in-flight cap")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=5.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--users", type=int, default=10, help="Test users to spread load across")
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument("--mix", default="chat=6,submit=2,session=2", help="Scenario weights")
+    parser.add_argument("--exercise-id")
+    parser.add_argument("--node-id")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
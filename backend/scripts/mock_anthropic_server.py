@@ -0,0 +1,390 @@
+"""
+Local stand-in for the Anthropic Messages API, for benchmarks and load tests
+
+Serves POST /v1/messages in the API's response shape, including SSE
+streaming, with configurable latency and scripted behaviour:
+
+- tool_use responses for the tools sent in the request (the ToolRegistry
+  tools), with inputs generated from each tool's input_schema or taken from
+  a script file
+- end_turn and max_tokens stop reasons
+- JSON answers for the prompts that expect JSON (intent routing, grading,
+  error analysis)
+- prompt cache usage: the first request with a given cached prefix reports a
+  cache write, later ones a cache read
+
+Usage (from backend/):
+    python -m scripts.mock_anthropic_server --port 8100 --latency lognormal:800:0.5
+    ANTHROPIC_BASE_URL=http://localhost:8100 uvicorn app.main:app
+
+Latency specs (milliseconds): fixed:MS, uniform:LOW:HIGH, normal:MEAN:STD,
+lognormal:MEDIAN:SIGMA. The sampled latency is spent before the first byte;
+--ms-per-token adds generation time per output token.
+
+A script file is JSON like:
+    {
+      "tool_inputs": {"generate_exercise": {"title": "FizzBuzz", ...}},
+      "tool_sequence": [["display_learning_content"], ["generate_exercise"]]
+    }
+tool_sequence gives the tools to call on each tool loop iteration (by the
+number of tool_result turns already in the conversation); after the last
+entry the mock ends the turn.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LOREM = (
+    "Great question! Let's break this down step by step. A variable is a name "
+    "that refers to a value, and functions let you reuse logic. Try changing "
+    "the input and see how the output changes. When you are ready, we can move "
+    "on to a short exercise to practice what you just learned."
+).split()
+
+
+class LatencyModel:
+    """Samples response latency in seconds from a spec like lognormal:800:0.5"""
+
+    def __init__(self, spec: str, ms_per_token: float = 0.0):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.ms_per_token = ms_per_token
+
+    def first_byte(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = random.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            ms = p[0] * random.lognormvariate(0.0, p[1])
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+        return max(ms, 0.0) / 1000
+
+    def per_token(self) -> float:
+        return self.ms_per_token / 1000
+
+
+class MockBehaviour:
+    """Decides what the mock answers for a request"""
+
+    def __init__(
+        self,
+        tool_use_rate: float,
+        max_tokens_rate: float,
+        max_tool_calls: int,
+        max_iterations: int,
+        script: Optional[Dict] = None,
+    ):
+        self.tool_use_rate = tool_use_rate
+        self.max_tokens_rate = max_tokens_rate
+        self.max_tool_calls = max_tool_calls
+        self.max_iterations = max_iterations
+        self.tool_inputs = (script or {}).get("tool_inputs", {})
+        self.tool_sequence = (script or {}).get("tool_sequence")
+        self.seen_prefixes = set()
+
+    def respond(self, body: Dict) -> Dict:
+        """Build a full Messages API response for a request body"""
+        messages = body.get("messages", [])
+        prompt = _text_of(messages[-1]["content"]) if messages else ""
+        tools = {tool["name"]: tool for tool in body.get("tools") or []}
+        iteration = sum(
+            1 for msg in messages
+            if msg["role"] == "user" and _has_block(msg["content"], "tool_result")
+        )
+
+        content: List[Dict] = []
+        stop_reason = "end_turn"
+
+        tool_names = self._pick_tools(tools, iteration)
+        if tool_names:
+            content.append({"type": "text", "text": "Let me set that up for you."})
+            for name in tool_names:
+                content.append({
+                    "type": "tool_use",
+                    "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                    "name": name,
+                    "input": self.tool_inputs.get(name)
+                    or _example_from_schema(tools[name].get("input_schema", {}), name),
+                })
+            stop_reason = "tool_use"
+        else:
+            text = _json_answer(prompt) or _prose(random.randint(40, 160))
+            if random.random() < self.max_tokens_rate:
+                words = text.split()
+                text = " ".join(words[: max(1, len(words) // 2)])
+                stop_reason = "max_tokens"
+            content.append({"type": "text", "text": text})
+
+        output_tokens = _estimate_tokens(json.dumps(content))
+        if stop_reason == "max_tokens":
+            output_tokens = body.get("max_tokens", output_tokens)
+
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "mock"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {**self._input_usage(body), "output_tokens": output_tokens},
+        }
+
+    def _pick_tools(self, tools: Dict, iteration: int) -> List[str]:
+        if not tools:
+            return []
+        if self.tool_sequence is not None:
+            if iteration >= len(self.tool_sequence):
+                return []
+            return [name for name in self.tool_sequence[iteration] if name in tools]
+        if iteration >= self.max_iterations or random.random() >= self.tool_use_rate:
+            return []
+        count = random.randint(1, min(self.max_tool_calls, len(tools)))
+        return random.sample(sorted(tools), count)
+
+    def _input_usage(self, body: Dict) -> Dict:
+        """Input token usage, simulating prompt caching of the static prefix"""
+        tools = body.get("tools") or []
+        system = body.get("system") or []
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+
+        cached_prefix = [tool for tool in tools if "cache_control" in tool]
+        cached_prefix = list(tools) if cached_prefix else []
+        cached_prefix += [block for block in system if "cache_control" in block]
+        prefix_tokens = _estimate_tokens(json.dumps(cached_prefix)) if cached_prefix else 0
+        total_tokens = _estimate_tokens(
+            json.dumps([tools, system, body.get("messages", [])], default=str)
+        )
+
+        usage = {
+            "input_tokens": total_tokens - prefix_tokens,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        }
+        if prefix_tokens:
+            digest = hashlib.sha256(json.dumps(cached_prefix, sort_keys=True).encode()).hexdigest()
+            if digest in self.seen_prefixes:
+                usage["cache_read_input_tokens"] = prefix_tokens
+            else:
+                self.seen_prefixes.add(digest)
+                usage["cache_creation_input_tokens"] = prefix_tokens
+        return usage
+
+
+def _text_of(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def _has_block(content, block_type: str) -> bool:
+    return isinstance(content, list) and any(
+        isinstance(block, dict) and block.get("type") == block_type for block in content
+    )
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _prose(words: int) -> str:
+    return " ".join(LOREM[i % len(LOREM)] for i in range(words))
+
+
+def _json_answer(prompt: str) -> Optional[str]:
+    """Answers in the JSON formats the app's single-shot prompts ask for"""
+    if '"requires_tools"' in prompt:
+        return json.dumps({"requires_tools": random.random() < 0.5, "intent": "mock intent"})
+    if '"error_category"' in prompt:
+        return json.dumps({
+            "error_category": random.choice(["syntax", "logic", "conceptual"]),
+            "specific_issue": "Off-by-one error in the loop bounds",
+            "concept_gap": "range() end is exclusive",
+            "severity": "medium",
+            "suggested_intervention": "hint",
+        })
+    if "## Grading Rubric" in prompt:
+        score = random.randint(40, 100)
+        return json.dumps({
+            "score": score,
+            "breakdown": {
+                "correctness": score,
+                "quality": score,
+                "efficiency": score,
+                "best_practices": score,
+            },
+            "feedback": {
+                "summary": "Mock assessment of the submission.",
+                "strengths": ["Readable code"],
+                "improvements": ["Handle edge cases"],
+                "specific_issues": [],
+            },
+            "next_steps": "Move on" if score >= 70 else "Revise",
+        })
+    return None
+
+
+def _example_from_schema(schema: Dict, name: str = ""):
+    """Generate a plausible value for a JSON schema"""
+    if "enum" in schema:
+        return random.choice(schema["enum"])
+
+    kind = schema.get("type", "string")
+    if kind == "object":
+        return {
+            prop: _example_from_schema(prop_schema, prop)
+            for prop, prop_schema in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [_example_from_schema(schema.get("items", {}), name) for _ in range(2)]
+    if kind == "integer":
+        return random.randint(schema.get("minimum", 1), schema.get("maximum", 5))
+    if kind == "number":
+        return round(random.uniform(schema.get("minimum", 0), schema.get("maximum", 1)), 2)
+    if kind == "boolean":
+        return random.random() < 0.5
+    if name == "code":
+        return "print('hello from the mock API')"
+    if name == "language":
+        return "python"
+    return f"mock {name or 'value'}"
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_events(message: Dict, latency: LatencyModel):
+    """Replay a complete message as Messages API stream events"""
+    start = {**message, "content": [], "stop_reason": None}
+    start["usage"] = {**message["usage"], "output_tokens": 1}
+    yield _sse("message_start", {"type": "message_start", "message": start})
+
+    for index, block in enumerate(message["content"]):
+        if block["type"] == "text":
+            yield _sse("content_block_start", {
+                "type": "content_block_start", "index": index,
+                "content_block": {"type": "text", "text": ""},
+            })
+            words = block["text"].split(" ")
+            for i in range(0, len(words), 4):
+                chunk = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+                await asyncio.sleep(latency.per_token() * 4)
+                yield _sse("content_block_delta", {
+                    "type": "content_block_delta", "index": index,
+                    "delta": {"type": "text_delta", "text": chunk},
+                })
+        else:
+            yield _sse("content_block_start", {
+                "type": "content_block_start", "index": index,
+                "content_block": {**block, "input": {}},
+            })
+            yield _sse("content_block_delta", {
+                "type": "content_block_delta", "index": index,
+                "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])},
+            })
+        yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+
+    yield _sse("message_delta", {
+        "type": "message_delta",
+        "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+        "usage": {"output_tokens": message["usage"]["output_tokens"]},
+    })
+    yield _sse("message_stop", {"type": "message_stop"})
+
+
+def create_app(behaviour: MockBehaviour, latency: LatencyModel) -> FastAPI:
+    app = FastAPI(title="Mock Anthropic API")
+    stats = {"requests": 0, "by_stop_reason": {}}
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        message = behaviour.respond(body)
+        stats["requests"] += 1
+        reason = message["stop_reason"]
+        stats["by_stop_reason"][reason] = stats["by_stop_reason"].get(reason, 0) + 1
+
+        await asyncio.sleep(latency.first_byte())
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_events(message, latency), media_type="text/event-stream"
+            )
+
+        await asyncio.sleep(latency.per_token() * message["usage"]["output_tokens"])
+        return JSONResponse(message, headers={"request-id": f"req_mock_{int(time.time() * 1000)}"})
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="lognormal:800:0.5", help="First-byte latency distribution (ms)")
+    parser.add_argument("--ms-per-token", type=float, default=5.0, help="Generation time per output token")
+    parser.add_argument("--tool-use-rate", type=float, default=0.5, help="Chance of tool_use when tools are sent")
+    parser.add_argument("--max-tokens-rate", type=float, default=0.02, help="Chance of a max_tokens stop")
+    parser.add_argument("--max-tool-calls", type=int, default=2, help="Tool calls per tool_use turn")
+    parser.add_argument("--max-iterations", type=int, default=2, help="Tool loop iterations before end_turn")
+    parser.add_argument("--script", help="JSON file with tool_inputs / tool_sequence")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+        _check_tool_names(script)
+
+    behaviour = MockBehaviour(
+        tool_use_rate=args.tool_use_rate,
+        max_tokens_rate=args.max_tokens_rate,
+        max_tool_calls=args.max_tool_calls,
+        max_iterations=args.max_iterations,
+        script=script,
+    )
+    latency = LatencyModel(args.latency, args.ms_per_token)
+
+    print(f"🧪 Mock Anthropic API on http://{args.host}:{args.port} (latency={args.latency})")
+    uvicorn.run(create_app(behaviour, latency), host=args.host, port=args.port, log_level="warning")
+
+
+def _check_tool_names(script: Dict):
+    """Fail fast on scripted tool names the app does not register"""
+    from app.ai.tool_registry import ToolRegistry
+
+    known = {tool["name"] for tool in ToolRegistry(None, "mock").get_tool_definitions()}
+    scripted = set(script.get("tool_inputs", {}))
+    for step in script.get("tool_sequence") or []:
+        scripted.update(step)
+    unknown = scripted - known
+    if unknown:
+        raise SystemExit(f"Unknown tool names in script: {sorted(unknown)} (known: {sorted(known)})")
+
+
+if __name__ == "__main__":
+    main()
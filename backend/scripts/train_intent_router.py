@@ -0,0 +1,148 @@
+"""
+Offline training and evaluation for the local intent router
+
+Trains the hashed n-gram LinearIntentModel from logged routing decisions
+(routing_decisions collection). By default only decisions labeled by the
+Claude Haiku classifier (source="llm") are used as training labels, since
+rule/model decisions would just teach the model its own output.
+
+Usage (from backend/):
+    python -m scripts.train_intent_router --mongo
+    python -m scripts.train_intent_router --input decisions.jsonl --output data/intent_router.npz
+    python -m scripts.train_intent_router --mongo --eval-only
+
+A JSONL export needs one {"message": ..., "requires_tools": ...} object per line
+(e.g. mongoexport --collection routing_decisions --type json).
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.ai.intent_router import IntentRouter, LinearIntentModel
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def load_from_mongo(sources):
+    from pymongo import MongoClient
+
+    client = MongoClient(settings.MONGODB_URL)
+    collection = client[settings.MONGODB_DB_NAME].routing_decisions
+    cursor = collection.find(
+        {"source": {"$in": sources}},
+        {"message": 1, "requires_tools": 1, "context_type": 1},
+    )
+    return [doc for doc in cursor if doc.get("message")]
+
+
+def load_from_jsonl(path, sources):
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("source", "llm") in sources and record.get("message"):
+                records.append(record)
+    return records
+
+
+def evaluate(model, texts, labels, threshold):
+    """Accuracy overall, and coverage/accuracy of confident predictions"""
+    probabilities = np.array([model.predict_proba(text) for text in texts])
+    labels = np.asarray(labels, dtype=bool)
+    predictions = probabilities >= 0.5
+    confident = np.maximum(probabilities, 1 - probabilities) >= threshold
+
+    return {
+        "samples": len(labels),
+        "accuracy": float((predictions == labels).mean()) if len(labels) else 0.0,
+        "coverage": float(confident.mean()) if len(labels) else 0.0,
+        "confident_accuracy": float((predictions[confident] == labels[confident]).mean()) if confident.any() else 0.0,
+    }
+
+
+def evaluate_router(router, records):
+    """End-to-end: how often rules+model answer locally and how often they agree with the LLM"""
+    local, agree = 0, 0
+    for record in records:
+        decision = router.route(record["message"], record.get("context_type", "general"))
+        if decision is not None:
+            local += 1
+            agree += decision.requires_tools == bool(record["requires_tools"])
+    return {
+        "local_rate": local / len(records) if records else 0.0,
+        "local_agreement": agree / local if local else 0.0,
+        "llm_fallback_rate": 1 - local / len(records) if records else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train/evaluate the local intent router")
+    parser.add_argument("--mongo", action="store_true", help="Read routing_decisions from MongoDB")
+    parser.add_argument("--input", help="Read decisions from a JSONL file")
+    parser.add_argument("--output", default=settings.INTENT_ROUTER_MODEL_PATH)
+    parser.add_argument("--sources", default="llm", help="Comma-separated decision sources used as labels")
+    parser.add_argument("--threshold", type=float, default=settings.INTENT_ROUTER_CONFIDENCE)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--eval-only", action="store_true", help="Evaluate the existing model at --output")
+    args = parser.parse_args()
+
+    sources = args.sources.split(",")
+    if args.mongo:
+        records = load_from_mongo(sources)
+    elif args.input:
+        records = load_from_jsonl(args.input, sources)
+    else:
+        parser.error("Pass --mongo or --input")
+
+    if not records:
+        print("No routing decisions found")
+        return
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(records))
+    split = int(len(records) * (1 - args.test_fraction))
+    train = [records[i] for i in order[:split]]
+    test = [records[i] for i in order[split:]]
+    print(f"📚 {len(records)} decisions: {len(train)} train / {len(test)} test")
+
+    if args.eval_only:
+        model = LinearIntentModel.load(args.output)
+        test = records
+    else:
+        started = time.perf_counter()
+        model = LinearIntentModel().fit(
+            [r["message"] for r in train],
+            [bool(r["requires_tools"]) for r in train],
+            epochs=args.epochs,
+        )
+        print(f"✅ Trained in {time.perf_counter() - started:.1f}s")
+        model.save(args.output)
+        print(f"💾 Saved model to {args.output}")
+
+    metrics = evaluate(
+        model,
+        [r["message"] for r in test],
+        [bool(r["requires_tools"]) for r in test],
+        args.threshold,
+    )
+    print(f"📊 Model: {json.dumps(metrics, indent=2)}")
+
+    router = IntentRouter(model=model, threshold=args.threshold)
+    print(f"📊 Router: {json.dumps(evaluate_router(router, test), indent=2)}")
+
+    started = time.perf_counter()
+    for record in test:
+        router.route(record["message"], "general")
+    per_call = (time.perf_counter() - started) / max(len(test), 1)
+    print(f"⏱️  Local routing latency: {per_call * 1e6:.0f} µs/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,12 +13,16 @@ interface ExerciseState {
   loadExercise: (exerciseId: string) => Promise<void>;
   setEditorCode: (code: string) => void;
   submitCode: (exerciseId: string, code: string, language: string) => Promise<void>;
-  checkResult: (exerciseId: string, submissionId: string) => Promise<void>;
+  checkResult: (exerciseId: string, submissionId: string, pollingSince?: number) => Promise<void>;
   requestHint: (exerciseId: string, hintNumber: number) => Promise<string>;
   reset: () => void;
   clearError: () => void;
 }
 
+const RESULT_POLL_INTERVAL_MS = 1000;
+// Past the backend's stale-attempt sweep (SUBMISSION_GRADING_DEADLINE plus one sweep interval)
+const RESULT_POLL_TIMEOUT_MS = 15 * 60 * 1000;
+
 export const useExerciseStore = create<ExerciseState>((set, get) => ({
   currentExercise: null,
   editorCode: '',
@@ -53,18 +57,12 @@ export const useExerciseStore = create<ExerciseState>((set, get) => ({
     try {
       const data = await api.submitExercise(exerciseId, code, language);
 
-      // AI assessment is instant - check results immediately
-      if (data.status === 'completed') {
-        // Get results right away
-        const result = await api.getExerciseResult(exerciseId, data.submission_id);
-        set({ results: result, submissionStatus: 'completed' });
-      } else {
-        // Fallback: poll if needed (for old sandbox grading)
-        set({ submissionStatus: 'grading' });
-        setTimeout(() => {
-          get().checkResult(exerciseId, data.submission_id);
-        }, 1000);
-      }
+      // Grading runs in the background - poll for the result
+      set({ submissionStatus: 'grading' });
+      const pollingSince = Date.now();
+      setTimeout(() => {
+        get().checkResult(exerciseId, data.submission_id, pollingSince);
+      }, RESULT_POLL_INTERVAL_MS);
     } catch (error: any) {
       set({
         error: error.response?.data?.detail || 'Failed to submit exercise',
@@ -73,16 +71,20 @@ export const useExerciseStore = create<ExerciseState>((set, get) => ({
     }
   },
 
-  checkResult: async (exerciseId, submissionId) => {
+  checkResult: async (exerciseId, submissionId, pollingSince = Date.now()) => {
     try {
       const result = await api.getExerciseResult(exerciseId, submissionId);
       if (result.status === 'completed') {
         set({ results: result, submissionStatus: 'completed' });
+      } else if (result.status === 'failed') {
+        set({ error: result.error || 'Grading failed', submissionStatus: 'idle' });
+      } else if (Date.now() - pollingSince >= RESULT_POLL_TIMEOUT_MS) {
+        set({ error: 'Grading is taking too long, please submit again', submissionStatus: 'idle' });
       } else {
-        // Keep polling (should rarely happen with AI assessment)
+        // Keep polling while grading runs in the background
         setTimeout(() => {
-          get().checkResult(exerciseId, submissionId);
-        }, 2000);
+          get().checkResult(exerciseId, submissionId, pollingSince);
+        }, RESULT_POLL_INTERVAL_MS);
       }
     } catch (error: any) {
       set({
@@ -24,6 +24,7 @@ export interface TestResult {
 export interface ExerciseResult {
   submission_id: string;
   status: 'grading' | 'completed' | 'failed';
+  error?: string | null;
   score: number;
   passed: boolean;
   test_results: TestResult[];